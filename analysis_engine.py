@@ -0,0 +1,496 @@
+import argparse
+import datetime
+import json
+
+from progress_log import load_progress_data
+from journal_model import (PARSERS, EXTRACTOR_VERSION, load_journal_model, find_cached_model,
+                           get_journal_parser, parse_save_stream, read_save_source, source_blob,
+                           lesson_statuses)
+from parse_cache import ParseCache, CACHE_PATH, content_hash
+from analysis_pool import run_parallel, default_workers
+from grade_matrix import GradeMatrix, chain_rule_results, grade_rule_results
+from rule_engine import RULES, RuleSet, load_rule_config
+from analysis_state import AnalysisState, STATE_PATH, settings_signature
+from catalog import Catalog, save_ref
+from run_index import RunIndex
+from check_journal_chain import has_three_consecutive_twos_with_types
+from chesk import check_student_grades_count, check_final_grade_correctness, check_last_grade_before_final
+
+# Единый проход анализа сохраненных журналов: каждый снимок разбирается один раз
+# в модель журнала (journal_model.py), и по ней за один запуск строятся все отчеты:
+#   chain    - цепочки двоек (как check_journal_chain.py)
+#   grades   - количество оценок и итоговые оценки (как chesk.py)
+#   statuses - статусы уроков (как che.py)
+#   runs     - серии одинаковых оценок подряд с диапазонами уроков (run_index.py),
+#              строится только по запросу (--report runs)
+
+REPORTS = ("chain", "grades", "statuses")
+ALL_REPORTS = REPORTS + ("runs",)
+# Серии какой оценки и какой минимальной длины попадают в отчет runs
+RUN_QUERY = ("2", 3)
+# Отчеты, которые строятся по правилам проверки оценок
+RULE_REPORTS = ("chain", "grades")
+
+
+def check_chain_rules(model):
+    """Цепочки из трех двоек. Возвращает (типы нарушений, количество)"""
+    violations = {}
+    count = 0
+    for student in model['students']:
+        for violation_type in has_three_consecutive_twos_with_types(student['grades_details']):
+            violations[violation_type] = True
+            count += 1
+    return list(violations), count
+
+
+def check_grade_rules(model, journal_name):
+    """Количество оценок, итоговая оценка и последняя оценка перед итоговой. Возвращает (типы, количество)"""
+    min_grades_required = min_grades_for(model)
+    violations = {}
+    count = 0
+
+    for student in model['students']:
+        final_grade = student.get('final_grade', '')
+
+        # Если итоговая оценка "б/о" - пропускаем все проверки
+        if final_grade and final_grade.lower() in ['б/о', 'бо']:
+            continue
+
+        has_az = final_grade and final_grade.lower() in ['а/з', 'аз']
+        found = [check_student_grades_count(student, min_grades_required, has_az_final_grade=has_az)]
+        if not has_az:
+            found.append(check_final_grade_correctness(student, journal_name))
+        found.append(check_last_grade_before_final(student))
+
+        for violation in found:
+            if violation:
+                violations[violation] = True
+                count += 1
+
+    return list(violations), count
+
+
+def min_grades_for(model):
+    """Сколько оценок требуется: 5, если уроков больше 15, иначе 3"""
+    return 5 if model['lesson_count'] > 15 else 3
+
+
+class LegacyRules:
+    """Проверки функциями из check_journal_chain.py и chesk.py"""
+
+    def evaluate(self, model, journal_name, reports):
+        result = {}
+        if "chain" in reports:
+            result["chain"] = check_chain_rules(model)
+        if "grades" in reports:
+            result["grades"] = check_grade_rules(model, journal_name)
+        return result
+
+
+class MatrixRules:
+    """Проверки по компактной матрице оценок (grade_matrix.py)"""
+
+    def evaluate(self, model, journal_name, reports):
+        result = {}
+        if not reports:
+            return result
+        grades = GradeMatrix.from_model(model)
+        if "chain" in reports:
+            result["chain"] = chain_rule_results(grades)
+        if "grades" in reports:
+            result["grades"] = grade_rule_results(grades, journal_name, min_grades_for(model))
+        return result
+
+
+def create_rules(kind="legacy", names=None, config_path=None):
+    """
+    Способ проверки оценок: legacy - функции анализаторов, matrix - матрица оценок,
+    compiled - набор правил rule_engine.py за один проход (names - включенные правила,
+    config_path - JSON с порогами)
+    """
+    if kind == "matrix":
+        return MatrixRules()
+    if kind == "compiled":
+        return RuleSet(names, load_rule_config(config_path))
+    return LegacyRules()
+
+
+def analyze_model(model, journal_name, reports=REPORTS, rules=None, run_query=RUN_QUERY):
+    """
+    Результаты всех выбранных проверок для одной модели журнала.
+    rules - способ проверки оценок (см. create_rules), по умолчанию функции анализаторов,
+    run_query - (оценка, минимальная длина) для отчета runs
+    """
+    rules = rules or LegacyRules()
+    result = rules.evaluate(model, journal_name, [report for report in RULE_REPORTS if report in reports])
+    if "statuses" in reports:
+        result["statuses"] = lesson_statuses(model)
+    if "runs" in reports:
+        result["runs"] = RunIndex(model).runs(*run_query)
+    return result
+
+
+def analyze_save(save, journal_name, reports=REPORTS, parser="bs4", cache=None, rules=None,
+                 run_query=RUN_QUERY):
+    """
+    Читает и разбирает снимок одного сохранения (способом parser: bs4, lxml, stream или api,
+    с кэшем разбора cache) и прогоняет по нему проверки.
+    None, если снимка нет или на странице нет таблицы
+    """
+    model = load_journal_model(save, parser, cache)
+    if model is None:
+        return None
+    return analyze_model(model, journal_name, reports, rules, run_query)
+
+
+def iter_journal_saves(data):
+    """Перебирает (класс, журнал, сохранения без ошибок) по данным data.json"""
+    for class_info in data.get('classes', []):
+        for journal in class_info.get('journals', []):
+            saves = [save for save in journal.get('save', []) if not save.get('error', '')]
+            yield class_info, journal, saves
+
+
+def new_violation_report(base_url):
+    return {
+        'baseURL': base_url,
+        'violations_found': 0,
+        'journals': []
+    }
+
+
+def add_journal_violations(report, journal_id, full_journal_name, results):
+    """Сводит нарушения всех сохранений журнала в запись отчета (если нарушения есть)"""
+    violations = {}
+    count = 0
+    for violation_types, violation_count in results:
+        for violation_type in violation_types:
+            violations[violation_type] = True
+        count += violation_count
+
+    report['violations_found'] += count
+    if violations:
+        report['journals'].append({
+            'journal_id': journal_id,
+            'journal_name': full_journal_name,
+            'violations_count': count,
+            'sequence_twos': list(violations)
+        })
+
+
+class ReportBuilder:
+    """Собирает отчеты всех проверок по результатам analyze_save"""
+
+    def __init__(self, base_url, reports=REPORTS):
+        self.base_url = base_url
+        self.reports = reports
+        self.chain = new_violation_report(base_url)
+        self.grades = new_violation_report(base_url)
+        self.statuses = []
+        self.runs = []
+
+    def add_journal(self, class_info, journal, saves, save_results):
+        """
+        saves - сохранения журнала, save_results - результаты analyze_save для них
+        по порядку (None пропускаются)
+        """
+        class_name = class_info.get('name', 'Неизвестный класс')
+        journal_name = journal.get('name', 'Неизвестный журнал')
+        journal_id = journal.get('ID', 'Без ID')
+        full_journal_name = f"{class_name} - {journal_name}"
+        analyzed = [(save, result) for save, result in zip(saves, save_results) if result is not None]
+        save_results = [result for _, result in analyzed]
+
+        if "chain" in self.reports:
+            add_journal_violations(self.chain, journal_id, full_journal_name,
+                                   [result["chain"] for result in save_results])
+        if "grades" in self.reports:
+            add_journal_violations(self.grades, journal_id, full_journal_name,
+                                   [result["grades"] for result in save_results])
+        if "statuses" in self.reports and save_results:
+            # Статусы уроков - только по первому сохранению с таблицей
+            self.statuses.append({
+                'full_journal_name': full_journal_name,
+                'journal_url': f"{self.base_url}{journal_id}" if self.base_url and journal_id else "",
+                'journal_statuses': save_results[0]["statuses"]
+            })
+        if "runs" in self.reports:
+            # Серия ссылается на свое сохранение: дата и снимок (ID в хранилище или путь к файлу)
+            runs = [dict(run, date=save.get('date'), snapshot=save_ref(save))
+                    for save, result in analyzed for run in result["runs"]]
+            if runs:
+                self.runs.append({
+                    'journal_id': journal_id,
+                    'journal_name': full_journal_name,
+                    'journal_url': f"{self.base_url}{journal_id}" if self.base_url and journal_id else "",
+                    'runs': runs
+                })
+
+    def write(self):
+        """Сохраняет отчеты в те же файлы, что и отдельные анализаторы"""
+        output_files = {}
+        if "chain" in self.reports:
+            output_files["chain"] = f"violations_chain_report_{datetime.date.today()}.json"
+            write_report(output_files["chain"], self.chain)
+        if "grades" in self.reports:
+            output_files["grades"] = "all_violations_report.json"
+            write_report(output_files["grades"], self.grades)
+        if "statuses" in self.reports:
+            output_files["statuses"] = "all_journals_statuses.json"
+            write_report(output_files["statuses"], self.statuses)
+        if "runs" in self.reports:
+            output_files["runs"] = f"runs_report_{datetime.date.today()}.json"
+            write_report(output_files["runs"], self.runs)
+        return output_files
+
+
+def write_report(output_file, report):
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def analyze_journal(journal_name, saves, reports=REPORTS, parser="bs4", cache=None, rules=None,
+                    run_query=RUN_QUERY):
+    """Результаты analyze_save по всем сохранениям журнала, по порядку (None - снимок не разобран)"""
+    results = []
+    for save in saves:
+        file_path = save.get('file') or save.get('blob', '')
+        try:
+            results.append(analyze_save(save, journal_name, reports, parser, cache, rules, run_query))
+        except Exception as e:
+            print(f"    Ошибка при чтении файла {file_path}: {e}")
+            results.append(None)
+    return results
+
+
+def parse_and_analyze(save, html_content, journal_name, reports, parser, return_model, rules=None,
+                      run_query=RUN_QUERY):
+    """
+    Задание пула процессов: разбор одного снимка и проверки.
+    html_content - уже прочитанный HTML снимка или None.
+    Возвращает (хэш снимка, модель - если return_model, результат analyze_model)
+    """
+    file_path = save.get('file') or save.get('blob', '')
+    try:
+        if html_content is None and parser == 'stream':
+            # Потоковый разбор читает снимок сам и только до конца таблицы
+            model = parse_save_stream(save)
+            snapshot_hash = save.get('blob')
+        else:
+            if html_content is None:
+                html_content = read_save_source(save, parser)
+                if html_content is None:
+                    return None, None, None
+            model = get_journal_parser(parser)(html_content)
+            snapshot_hash = source_blob(save, parser) or content_hash(html_content)
+        
+        if model is None:
+            return None, None, None
+        
+        result = analyze_model(model, journal_name, reports, rules, run_query)
+        if not return_model or snapshot_hash is None:
+            return None, None, result
+        return snapshot_hash, model, result
+    except Exception as e:
+        print(f"    Ошибка при чтении файла {file_path}: {e}")
+        return None, None, None
+
+
+def analyze_journals_parallel(journals, reports, parser, cache, workers, chunksize=None, rules=None,
+                              run_query=RUN_QUERY):
+    """
+    Результаты analyze_save для сохранений всех журналов, разобранных в пуле процессов.
+    Найденные в кэше модели проверяются сразу, новые модели попадают в кэш.
+    Результаты идут в том же порядке, что и при последовательном разборе
+    """
+    results = [[None] * len(saves) for _, _, saves in journals]
+    tasks = []
+    slots = []
+    
+    for journal_idx, (_, journal, saves) in enumerate(journals):
+        journal_name = journal.get('name', 'Неизвестный журнал')
+        for save_idx, save in enumerate(saves):
+            html_content = None
+            if cache:
+                model, _, html_content = find_cached_model(save, parser, cache)
+                if model is not None:
+                    results[journal_idx][save_idx] = analyze_model(model, journal_name, reports, rules, run_query)
+                    continue
+            tasks.append((save, html_content, journal_name, reports, parser, cache is not None, rules, run_query))
+            slots.append((journal_idx, save_idx))
+    
+    parsed = run_parallel(parse_and_analyze, tasks, workers, chunksize)
+    for (journal_idx, save_idx), (snapshot_hash, model, result) in zip(slots, parsed):
+        if cache and model is not None:
+            cache.put(snapshot_hash, parser, model)
+        results[journal_idx][save_idx] = result
+    return results
+
+
+def merge_save_results(journal, saves, new_results, parser, state):
+    """
+    Результаты всех сохранений журнала по порядку: для неизменившихся - из состояния,
+    для остальных - из new_results (результаты новых сохранений по порядку)
+    """
+    journal_id = journal.get('ID')
+    new_results = iter(new_results)
+    save_results = []
+    for save in saves:
+        is_known, result = state.lookup(journal_id, save, parser)
+        if not is_known:
+            result = next(new_results)
+        state.record(journal_id, save, parser, result, reused=is_known)
+        save_results.append(result)
+    return save_results
+
+
+def run_analysis(json_file_path="data.json", reports=REPORTS, parser="bs4", cache=None,
+                 workers=1, chunksize=None, rules=None, run_query=RUN_QUERY, state=None, catalog=None):
+    """
+    Строит все выбранные отчеты за один проход по сохраненным журналам.
+    cache - кэш разобранных снимков (ParseCache) или None,
+    workers > 1 - снимки разбираются в пуле процессов,
+    rules - способ проверки оценок (см. create_rules),
+    run_query - (оценка, минимальная длина) для отчета runs,
+    state - состояние инкрементального анализа (AnalysisState): анализируются только
+    новые и изменившиеся сохранения, отчеты собираются из вкладов всех сохранений,
+    catalog - каталог (Catalog): сохранения выбираются из него (после пересборки, если
+    json_file_path изменился), туда же записываются результаты каждого сохранения
+    """
+    if catalog:
+        if catalog.sync_file(json_file_path):
+            print(f"Каталог собран заново из {json_file_path}")
+        builder = ReportBuilder(catalog.base_url(), reports)
+        journals = list(catalog.iter_journal_saves())
+    else:
+        data = load_progress_data(json_file_path)
+        builder = ReportBuilder(data.get('baseURL', ''), reports)
+        journals = list(iter_journal_saves(data))
+    
+    pending = journals
+    if state:
+        pending = [
+            (class_info, journal, [save for save in saves if not state.lookup(journal.get('ID'), save, parser)[0]])
+            for class_info, journal, saves in journals
+        ]
+
+    if workers > 1:
+        journal_results = analyze_journals_parallel(pending, reports, parser, cache, workers, chunksize, rules,
+                                                    run_query)
+    else:
+        journal_results = (
+            analyze_journal(journal.get('name', 'Неизвестный журнал'), saves, reports, parser, cache, rules,
+                            run_query)
+            for _, journal, saves in pending
+        )
+
+    for (class_info, journal, saves), save_results in zip(journals, journal_results):
+        if state:
+            save_results = merge_save_results(journal, saves, save_results, parser, state)
+        if catalog:
+            for save, result in zip(saves, save_results):
+                if result is not None:
+                    catalog.put_results(journal.get('ID'), save, result)
+        builder.add_journal(class_info, journal, saves, save_results)
+
+    output_files = builder.write()
+    print_report_summary(builder, output_files)
+    if cache:
+        print(f"Кэш разбора: найдено {cache.hits}, разобрано заново {cache.misses}")
+    if state:
+        state.write()
+        print(f"Инкрементальный анализ: новых и измененных сохранений {state.analyzed}, "
+              f"без изменений {state.reused}")
+    return builder
+
+
+def print_report_summary(builder, output_files):
+    for name, output_file in output_files.items():
+        print(f"Отчет {name} сохранен в файл: {output_file}")
+    if "chain" in builder.reports:
+        print(f"Цепочки двоек: журналов с нарушениями {len(builder.chain['journals'])}, "
+              f"нарушений {builder.chain['violations_found']}")
+    if "grades" in builder.reports:
+        print(f"Оценки: журналов с нарушениями {len(builder.grades['journals'])}, "
+              f"нарушений {builder.grades['violations_found']}")
+    if "statuses" in builder.reports:
+        print(f"Статусы уроков: журналов {len(builder.statuses)}")
+    if "runs" in builder.reports:
+        print(f"Серии оценок: журналов {len(builder.runs)}, "
+              f"серий {sum(len(journal['runs']) for journal in builder.runs)}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Все проверки сохраненных журналов за один проход")
+    parser.add_argument("--data", default="data.json", help="файл с данными журналов")
+    parser.add_argument("--report", action="append", choices=ALL_REPORTS, default=None,
+                        help="какие отчеты строить (можно указать несколько раз, по умолчанию все, кроме runs)")
+    parser.add_argument("--run-grade", default=RUN_QUERY[0], help="оценка для отчета runs")
+    parser.add_argument("--run-length", type=int, default=RUN_QUERY[1],
+                        help="минимальная длина серии для отчета runs")
+    parser.add_argument("--parser", choices=sorted(PARSERS), default="bs4",
+                        help="способ разбора снимков: bs4 - BeautifulSoup, lxml - быстрее, "
+                             "stream - потоково, только таблица журнала, api - по _api.json без HTML "
+                             "(средний балл считается по оценкам, проверки итоговых оценок "
+                             "могут отличаться от разбора HTML)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="не использовать кэш разобранных снимков")
+    parser.add_argument("--rebuild-cache", action="store_true",
+                        help="очистить кэш разобранных снимков и заполнить его заново")
+    parser.add_argument("--cache-path", default=CACHE_PATH, help="файл кэша разобранных снимков")
+    parser.add_argument("--cache-size-mb", type=float, default=200,
+                        help="максимальный размер кэша в мегабайтах")
+    parser.add_argument("--workers", type=int, default=1,
+                        help=f"количество процессов разбора (1 - без пула, на этой машине ядер: {default_workers()})")
+    parser.add_argument("--rules", choices=["legacy", "matrix", "compiled"], default=None,
+                        help="способ проверки оценок: legacy - функции анализаторов, matrix - матрица оценок "
+                             "(с numpy - векторно), compiled - набор правил за один проход по строке ученика")
+    parser.add_argument("--matrix", action="store_true", help="то же, что --rules matrix")
+    parser.add_argument("--rule", action="append", choices=list(RULES), default=None,
+                        help="включить только указанное правило (для --rules compiled, можно указать несколько раз)")
+    parser.add_argument("--rules-config", default=None,
+                        help="JSON с порогами правил, например {\"chain\": {\"length\": 4}} (для --rules compiled)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="анализировать только новые и изменившиеся сохранения, "
+                             "остальные результаты взять из прошлого запуска")
+    parser.add_argument("--state-path", default=STATE_PATH, help="файл состояния инкрементального анализа")
+    parser.add_argument("--catalog", default=None,
+                        help="выбирать сохранения из каталога SQLite (catalog.py) и записывать в него "
+                             "результаты проверок")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="сколько снимков отдавать процессу за раз")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    
+    # Пороги и выбор правил есть только у набора правил rule_engine.py
+    rules_kind = args.rules or ("matrix" if args.matrix else None)
+    if rules_kind is None:
+        rules_kind = "compiled" if args.rule or args.rules_config else "legacy"
+    rules = create_rules(rules_kind, args.rule, args.rules_config)
+    
+    cache = None
+    if not args.no_cache:
+        cache = ParseCache(args.cache_path, version=EXTRACTOR_VERSION, max_size_mb=args.cache_size_mb)
+        if args.rebuild_cache:
+            cache.clear()
+    
+    reports = tuple(args.report) if args.report else REPORTS
+    run_query = (args.run_grade, args.run_length)
+    state = None
+    if args.incremental:
+        state = AnalysisState(args.state_path,
+                              settings_signature(args.parser, reports, rules, run_query, EXTRACTOR_VERSION))
+    
+    catalog = Catalog(args.catalog) if args.catalog else None
+    
+    try:
+        run_analysis(args.data, reports, args.parser, cache, workers=args.workers, chunksize=args.chunksize,
+                     rules=rules, run_query=run_query, state=state, catalog=catalog)
+    finally:
+        if cache:
+            cache.close()
+        if catalog:
+            catalog.close()
@@ -0,0 +1,29 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Параллельный анализ сохраненных журналов: разбор HTML упирается в процессор,
+# поэтому сохранения раздаются пулу процессов пачками. Результаты возвращаются
+# в порядке заданий, так что отчеты совпадают с последовательным запуском
+
+
+def default_workers():
+    """Количество процессов по умолчанию - по числу ядер"""
+    return os.cpu_count() or 1
+
+
+def run_parallel(func, tasks, workers=1, chunksize=None):
+    """
+    Вызывает func(*args) для каждого набора аргументов из tasks.
+    workers > 1 - в пуле процессов (func должна быть функцией уровня модуля).
+    Возвращает результаты в порядке tasks
+    """
+    tasks = list(tasks)
+    if workers <= 1 or len(tasks) <= 1:
+        return [func(*args) for args in tasks]
+
+    if chunksize is None:
+        # Несколько пачек на процесс, чтобы процессы не простаивали в конце
+        chunksize = max(1, len(tasks) // (workers * 4))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, *zip(*tasks), chunksize=chunksize))
@@ -0,0 +1,109 @@
+import json
+import os
+
+# Состояние инкрементального анализа: для каждого журнала - по каким сохранениям
+# построены отчеты и что дало каждое сохранение. При повторном запуске заново
+# разбираются только новые или изменившиеся сохранения, а отчеты собираются из
+# вкладов всех сохранений, поэтому violations_found остаются точными.
+#
+# Сохранение узнается по ссылке на снимок (blob или file) и отпечатку: ID снимка
+# в хранилище уже хэш содержимого, для файла - размер и время изменения.
+# Сохранения без результата (снимок не найден или не разобран) в состоянии не
+# остаются и разбираются заново при каждом запуске.
+# Если изменились настройки анализа (способ разбора, отчеты, правила, версия
+# разбора), состояние сбрасывается и все сохранения анализируются заново
+
+STATE_PATH = os.path.join("save", "analysis_state.json")
+
+
+def settings_signature(parser, reports, rules, run_query, version):
+    """Настройки анализа, от которых зависят результаты сохранений"""
+    return {
+        'parser': parser,
+        'reports': sorted(reports),
+        'rules': type(rules).__name__ if rules is not None else 'LegacyRules',
+        'rule_names': [rule.name for rule in getattr(rules, 'rules', [])],
+        'rule_config': getattr(rules, 'config', None),
+        'run_query': list(run_query),
+        'version': version
+    }
+
+
+def save_reference(save, parser):
+    """(ключ сохранения, путь к файлу или None) для снимка, который разбирает parser"""
+    if parser == 'api':
+        blob_id, file_path = save.get('api_blob'), save.get('api_file')
+    else:
+        blob_id, file_path = save.get('blob'), save.get('file')
+    if blob_id:
+        return blob_id, None
+    return file_path, file_path
+
+
+def save_fingerprint(save, parser):
+    key, file_path = save_reference(save, parser)
+    if not file_path:
+        return key
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class AnalysisState:
+    """Вклады сохранений в отчеты по журналам, с записью в JSON-файл"""
+
+    def __init__(self, path=STATE_PATH, settings=None):
+        self.path = path
+        self.settings = settings
+        self.journals = {}
+        self.reused = 0
+        self.analyzed = 0
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠ Не удалось прочитать состояние анализа {path}: {e}")
+                state = {}
+            if state.get('settings') == settings:
+                self.journals = state.get('journals', {})
+            elif state:
+                print("⚠ Настройки анализа изменились - все сохранения будут проанализированы заново")
+        # Новое состояние содержит только сохранения текущего запуска
+        self._next = {}
+
+    def lookup(self, journal_id, save, parser):
+        """(найдено ли, результат analyze_save) для неизменившегося сохранения"""
+        key, _ = save_reference(save, parser)
+        entry = self.journals.get(str(journal_id), {}).get(key or '')
+        fingerprint = save_fingerprint(save, parser)
+        if entry is None or fingerprint is None or entry['fingerprint'] != fingerprint:
+            return False, None
+        return True, entry['result']
+
+    def record(self, journal_id, save, parser, result, reused=False):
+        """
+        Запоминает результат сохранения. Пустой результат (снимка нет, ошибка чтения
+        или разбора) не запоминается - такое сохранение разбирается заново при следующем запуске
+        """
+        key, _ = save_reference(save, parser)
+        fingerprint = save_fingerprint(save, parser)
+        if key and fingerprint is not None and result is not None:
+            self._next.setdefault(str(journal_id), {})[key] = {'fingerprint': fingerprint, 'result': result}
+        if reused:
+            self.reused += 1
+        else:
+            self.analyzed += 1
+
+    def write(self):
+        self.journals = self._next
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'settings': self.settings, 'journals': self.journals}, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,249 @@
+import json
+import re
+from datetime import datetime
+from urllib.parse import urlsplit, urlunsplit, unquote
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Прямая загрузка данных журналов через API authedu без браузера.
+# Шаблоны запросов и заголовки авторизации берутся из _api.json первого журнала,
+# который загружается браузером с внедрённым interceptor.js
+
+# Эндпоинты, которые использует JsonUrlFilter в analise_save.py
+SCHEDULE_PATTERN = r'^https://authedu\.mosreg\.ru/api/ej/plan/teacher/v1/schedule_items'
+HOMEWORK_PATTERN = r'^https://authedu\.mosreg\.ru/api/ej/core/teacher/v1/homeworks'
+GROUPS_PATTERN = r'^https://authedu\.mosreg\.ru/api/ej/plan/teacher/v1/groups/\d+$'
+
+REQUIRED_PATTERNS = {
+    'schedule_items': SCHEDULE_PATTERN,
+    'homeworks': HOMEWORK_PATTERN,
+    'groups': GROUPS_PATTERN,
+}
+
+# Заголовки запроса, которые нельзя переносить между запросами
+SKIPPED_REQUEST_HEADERS = {'content-length', 'host', 'cookie'}
+# Заголовки с учетными данными: в сохраненные ответы API они не попадают
+CREDENTIAL_HEADER_PATTERN = re.compile(r'auth|token|cookie', re.IGNORECASE)
+
+
+def load_api_records(file_path):
+    """Загружает сохранённые ответы API (формат window.apiMonitor)"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def url_to_template(url, journal_id):
+    """
+    Шаблон URL: сегменты пути и значения параметров запроса, равные ID журнала,
+    заменяются на {journal_id}. None, если таких нет (ID только внутри других чисел и строк)
+    """
+    parts = urlsplit(url)
+    found = False
+
+    segments = parts.path.split('/')
+    for index, segment in enumerate(segments):
+        if unquote(segment) == journal_id:
+            segments[index] = '{journal_id}'
+            found = True
+
+    params = parts.query.split('&') if parts.query else []
+    for index, param in enumerate(params):
+        name, separator, value = param.partition('=')
+        if separator and unquote(value.replace('+', ' ')) == journal_id:
+            params[index] = name + '={journal_id}'
+            found = True
+
+    if not found:
+        return None
+    return urlunsplit((parts.scheme, parts.netloc, '/'.join(segments), '&'.join(params), parts.fragment))
+
+
+def build_endpoint_templates(api_records, journal_id):
+    """
+    Строит шаблоны URL по ответам API одного журнала.
+    В шаблон попадают GET-запросы к /api/, где ID журнала - целый сегмент пути
+    или значение параметра запроса; ID заменяется на {journal_id}
+    """
+    templates = []
+    for record in api_records:
+        url = record.get('url', '')
+        if record.get('method', 'GET') != 'GET' or '/api/' not in url:
+            continue
+        if record.get('status') != 200:
+            continue
+
+        template = url_to_template(url, journal_id)
+        if template and template not in templates:
+            templates.append(template)
+
+    # Предупреждаем, если какой-то из нужных анализаторам эндпоинтов не удалось привязать к журналу
+    for name, pattern in REQUIRED_PATTERNS.items():
+        if not any(re.match(pattern, template) for template in templates):
+            print(f"⚠ Для эндпоинта {name} не найден запрос с ID журнала {journal_id}")
+
+    return templates
+
+
+def collect_request_headers(api_records):
+    """Собирает заголовки запросов (авторизация, профиль), перехваченные interceptor.js"""
+    headers = {}
+    for record in api_records:
+        for name, value in (record.get('request_headers') or {}).items():
+            if name.lower() not in SKIPPED_REQUEST_HEADERS:
+                headers[name] = value
+    return headers
+
+
+def strip_credential_headers(headers):
+    """Заголовки без авторизации, cookies и токенов"""
+    return {name: value for name, value in (headers or {}).items() if not CREDENTIAL_HEADER_PATTERN.search(name)}
+
+
+def pop_request_headers(api_records):
+    """
+    Убирает из записей API заголовки запросов и учетные данные из заголовков ответов,
+    чтобы они не попали в <ID>_api.json. Возвращает заголовки запросов
+    (collect_request_headers) - они остаются только в памяти
+    """
+    headers = collect_request_headers(api_records)
+    for record in api_records:
+        record.pop('request_headers', None)
+        if 'headers' in record:
+            record['headers'] = strip_credential_headers(record['headers'])
+    return headers
+
+
+def create_api_session(cookies, headers=None, user_agent=None, pool_size=10):
+    """
+    Создает requests.Session с пулом соединений и cookies авторизованного браузера
+    """
+    session = requests.Session()
+
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504],
+                  allowed_methods=['GET'])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    for cookie in cookies:
+        session.cookies.set(
+            cookie['name'], cookie['value'],
+            domain=cookie.get('domain'), path=cookie.get('path', '/')
+        )
+
+    session.headers.update({'Accept': 'application/json'})
+    if user_agent:
+        session.headers['User-Agent'] = user_agent
+    if headers:
+        session.headers.update(headers)
+
+    return session
+
+
+def fetch_journal_api(session, templates, journal_id, timeout=30, rate_limiter=None):
+    """
+    Запрашивает все эндпоинты журнала.
+    rate_limiter (TokenBucket) - перед каждым запросом забирается один токен.
+    Возвращает список записей в том же формате, что и window.apiMonitor
+    """
+    records = []
+    for template in templates:
+        url = template.replace('{journal_id}', journal_id)
+        if rate_limiter:
+            rate_limiter.wait()
+        response = session.get(url, timeout=timeout)
+
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text
+
+        records.append({
+            'id': f"{journal_id}-{len(records)}",
+            'url': url,
+            'method': 'GET',
+            'timestamp': datetime.now().isoformat(),
+            'response': body,
+            'status': response.status_code,
+            'headers': strip_credential_headers(response.headers)
+        })
+    return records
+
+
+
+# Форматы дат в ответах API: ISO и "ДД.ММ.ГГГГ ЧЧ:ММ" (как в homeworks)
+TIMESTAMP_FORMATS = ['%d.%m.%Y %H:%M', '%d.%m.%Y %H:%M:%S', '%d.%m.%Y']
+
+
+def normalize_timestamp(value):
+    """Приводит дату из ответа API к ISO-строке, чтобы даты можно было сравнивать. None, если не распознана"""
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None).isoformat()
+    except ValueError:
+        pass
+    for date_format in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def is_probe_url(url):
+    """Запросы, по которым определяется изменение журнала: schedule_items и homeworks"""
+    return bool(re.match(SCHEDULE_PATTERN, url) or re.match(HOMEWORK_PATTERN, url))
+
+
+def select_probe_templates(templates):
+    """Шаблоны легких запросов для проверки изменений журнала"""
+    return [template for template in templates if is_probe_url(template)]
+
+
+def select_fingerprint_records(api_records, journal_id, templates=None):
+    """
+    Ответы, по которым считается отпечаток: {шаблон: последний успешный ответ}.
+    Повторные запросы к одному URL учитываются один раз. Если переданы templates -
+    только запросы по этим шаблонам (как при легкой проверке), иначе все schedule_items и homeworks
+    """
+    selected = {}
+    for record in api_records:
+        url = record.get('url', '')
+        if record.get('status', 200) != 200 or not is_probe_url(url):
+            continue
+        template = url_to_template(url, journal_id) or url
+        if templates is not None and template not in templates:
+            continue
+        selected[template] = record
+    return selected
+
+
+def compute_api_fingerprint(api_records, journal_id, templates=None):
+    """
+    Отпечаток состояния журнала по ответам schedule_items и homeworks:
+    самое позднее updated_at, количество записей и шаблоны запросов, по которым они посчитаны.
+    Отпечатки сравнимы, только если посчитаны по одним и тем же шаблонам.
+    None, если в ответах нет ни одного updated_at
+    """
+    latest = None
+    items = 0
+
+    selected = select_fingerprint_records(api_records, journal_id, templates)
+    for record in selected.values():
+        response = record.get('response')
+        if not isinstance(response, list):
+            continue
+
+        for item in response:
+            if not isinstance(item, dict):
+                continue
+            items += 1
+            updated_at = normalize_timestamp(item.get('updated_at'))
+            if updated_at and (latest is None or updated_at > latest):
+                latest = updated_at
+
+    if latest is None:
+        return None
+    return {'updated_at': latest, 'items': items, 'templates': sorted(selected)}
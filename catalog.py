@@ -0,0 +1,405 @@
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import threading
+
+from progress_log import get_log_path, load_progress_data, write_json_atomic
+
+# Каталог классов, журналов и сохранений в SQLite. data.json остается основным
+# форматом, а каталог - его индексированная копия: поиск сохранений журнала,
+# журналов без сохранения за дату и т.п. идет по индексам, а не обходом всего
+# дерева. Импорт и экспорт сохраняют структуру data.json без потерь: исходные
+# записи хранятся целиком (столбец entry), отдельные столбцы нужны только для
+# индексов. Сохранения привязаны к месту журнала в дереве (индексы класса и
+# журнала), а не к его ID: ID журналов в data.json могут повторяться или
+# отсутствовать. Результаты анализа сохранений хранятся в таблице results и при
+# повторном импорте не удаляются.
+#
+# Каталог помнит, с какого состояния data.json и журнала прогресса он собран
+# (время изменения и размер файлов), и пересобирается, только если они изменились.
+# Загрузчик (--catalog) дописывает в него новые сохранения по ходу работы и
+# ищет в нем необработанные журналы и последний снимок журнала, анализатор
+# (analysis_engine.py --catalog) выбирает из него сохранения для проверки.
+#
+#   python catalog.py --import data.json     - собрать каталог из data.json
+#   python catalog.py --export data.json     - записать data.json из каталога
+#   python catalog.py --journal 2314390      - все сохранения журнала
+#   python catalog.py --missing 2025-12-11   - журналы без успешного сохранения за дату
+
+CATALOG_PATH = os.path.join("save", "catalog.sqlite")
+# Версия схемы (PRAGMA user_version): при несовпадении таблицы дерева пересоздаются
+SCHEMA_VERSION = 3
+TREE_TABLES = ("meta", "classes", "journals", "saves")
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS classes (
+        class_idx INTEGER PRIMARY KEY,
+        name TEXT,
+        entry TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS journals (
+        journal_id TEXT,
+        class_idx INTEGER NOT NULL,
+        journal_idx INTEGER NOT NULL,
+        name TEXT,
+        entry TEXT NOT NULL,
+        PRIMARY KEY (class_idx, journal_idx)
+    );
+    CREATE INDEX IF NOT EXISTS journals_id ON journals (journal_id);
+    CREATE TABLE IF NOT EXISTS saves (
+        class_idx INTEGER NOT NULL,
+        journal_idx INTEGER NOT NULL,
+        save_idx INTEGER NOT NULL,
+        journal_id TEXT,
+        date TEXT,
+        ref TEXT,
+        file TEXT,
+        blob TEXT,
+        api_file TEXT,
+        api_blob TEXT,
+        screenshot TEXT,
+        error TEXT,
+        unchanged INTEGER NOT NULL,
+        entry TEXT NOT NULL,
+        PRIMARY KEY (class_idx, journal_idx, save_idx)
+    );
+    CREATE INDEX IF NOT EXISTS saves_journal ON saves (journal_id);
+    CREATE INDEX IF NOT EXISTS saves_date ON saves (date, class_idx, journal_idx);
+    CREATE INDEX IF NOT EXISTS saves_ref ON saves (journal_id, ref);
+    CREATE TABLE IF NOT EXISTS results (
+        journal_id TEXT NOT NULL,
+        ref TEXT NOT NULL,
+        report TEXT NOT NULL,
+        result TEXT NOT NULL,
+        PRIMARY KEY (journal_id, ref, report)
+    );
+"""
+
+
+def to_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def day_range(date):
+    """Границы дня YYYY-MM-DD для сравнения с датами сохранений ('%Y-%m-%d %H:%M:%S') по индексу"""
+    next_day = datetime.date.fromisoformat(date) + datetime.timedelta(days=1)
+    return date, next_day.isoformat()
+
+
+def without_children(item, children_key):
+    """Запись без вложенного списка: сам список заменяется пустым, чтобы сохранить порядок ключей"""
+    return {key: ([] if key == children_key else value) for key, value in item.items()}
+
+
+def journal_key(journal):
+    """ID журнала строкой для индекса (None, если ID нет)"""
+    journal_id = journal.get("ID")
+    return None if journal_id is None else str(journal_id)
+
+
+def source_stamp(data_path):
+    """Состояние data.json и его журнала прогресса: время изменения и размер файлов"""
+    stamps = []
+    for path in (data_path, get_log_path(data_path)):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            stamps.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+        else:
+            stamps.append("-")
+    return "|".join(stamps)
+
+
+def save_ref(save):
+    """Ссылка на снимок сохранения: ID в хранилище, путь к файлу или дата"""
+    for key in ("blob", "file", "api_blob", "api_file"):
+        if save.get(key):
+            return save[key]
+    return save.get("date")
+
+
+def save_row(class_idx, journal_idx, save_idx, journal, save):
+    """Строка таблицы saves для сохранения журнала"""
+    return (class_idx, journal_idx, save_idx, journal_key(journal), save.get("date"), save_ref(save),
+            save.get("file") or None, save.get("blob") or None,
+            save.get("api_file") or None, save.get("api_blob") or None,
+            save.get("screenshot"), save.get("error") or None, int(bool(save.get("unchanged"))),
+            to_json(save))
+
+
+class Catalog:
+    """
+    Каталог data.json в SQLite с индексами по ID журнала и дате сохранения.
+    Журналы дерева в памяти сопоставляются строкам каталога по месту в дереве (см. track)
+    """
+
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Загрузчик пишет в каталог и читает из него из нескольких потоков
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._positions = {}
+        if self._scalar("PRAGMA user_version") != SCHEMA_VERSION:
+            # Дерево - копия data.json, после смены схемы его нужно импортировать заново
+            for table in TREE_TABLES:
+                self._connection.execute(f"DROP TABLE IF EXISTS {table}")
+            self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._connection.executescript(SCHEMA)
+        self._connection.commit()
+
+    def import_data(self, data):
+        """Заменяет классы, журналы и сохранения каталога данными data.json (результаты анализа остаются)"""
+        connection = self._connection
+        with connection:
+            connection.execute("DELETE FROM meta")
+            connection.execute("DELETE FROM classes")
+            connection.execute("DELETE FROM journals")
+            connection.execute("DELETE FROM saves")
+
+            connection.execute("INSERT INTO meta VALUES ('data', ?)",
+                               (to_json(without_children(data, "classes")),))
+            for class_idx, class_item in enumerate(data.get("classes", [])):
+                connection.execute(
+                    "INSERT INTO classes VALUES (?, ?, ?)",
+                    (class_idx, class_item.get("name"),
+                     to_json(without_children(class_item, "journals")))
+                )
+                for journal_idx, journal in enumerate(class_item.get("journals", [])):
+                    connection.execute(
+                        "INSERT INTO journals VALUES (?, ?, ?, ?, ?)",
+                        (journal_key(journal), class_idx, journal_idx, journal.get("name"),
+                         to_json(without_children(journal, "save")))
+                    )
+                    connection.executemany(
+                        "INSERT INTO saves VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [save_row(class_idx, journal_idx, save_idx, journal, save)
+                         for save_idx, save in enumerate(journal.get("save") or [])]
+                    )
+        self.track(data)
+
+    def import_file(self, data_path="data.json"):
+        """Импорт data.json вместе с хвостом журнала прогресса"""
+        stamp = source_stamp(data_path)
+        data = load_progress_data(data_path)
+        self.import_data(data)
+        self._set_source(stamp)
+        return data
+
+    def is_synced(self, data_path="data.json"):
+        """Собран ли каталог из текущего состояния data.json и журнала прогресса"""
+        return self._scalar("SELECT value FROM meta WHERE key = 'source'") == source_stamp(data_path)
+
+    def sync_file(self, data_path="data.json"):
+        """Пересобирает каталог, если data.json или журнал прогресса изменились. True, если пересобран"""
+        if self.is_synced(data_path):
+            return False
+        self.import_file(data_path)
+        return True
+
+    def sync_data(self, data, data_path="data.json"):
+        """
+        То же для уже загруженного дерева data (data.json с хвостом журнала прогресса).
+        Если каталог актуален, дерево только сопоставляется строкам каталога
+        """
+        if self.is_synced(data_path):
+            self.track(data)
+            return False
+        stamp = source_stamp(data_path)
+        self.import_data(data)
+        self._set_source(stamp)
+        return True
+
+    def mark_synced(self, data_path="data.json"):
+        """Запоминает, что каталог соответствует текущему data.json (после его пересборки загрузчиком)"""
+        self._set_source(source_stamp(data_path))
+
+    def _set_source(self, stamp):
+        with self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)", (stamp,))
+
+    def track(self, data):
+        """Запоминает место каждого журнала дерева data (индексы класса и журнала)"""
+        self._positions = {
+            id(journal): (class_idx, journal_idx)
+            for class_idx, class_item in enumerate(data.get("classes", []))
+            for journal_idx, journal in enumerate(class_item.get("journals", []))
+        }
+
+    def position(self, journal):
+        """(индекс класса, индекс журнала) журнала из дерева, переданного в track"""
+        return self._positions[id(journal)]
+
+    def add_save(self, journal, save_idx, save):
+        """Добавляет сохранение журнала (save_idx - номер в списке save журнала)"""
+        class_idx, journal_idx = self.position(journal)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO saves VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                save_row(class_idx, journal_idx, save_idx, journal, save)
+            )
+
+    def last_snapshot(self, journal):
+        """
+        Последнее успешное сохранение журнала со снимком страницы или ответов API
+        (без записей "без изменений") или None
+        """
+        class_idx, journal_idx = self.position(journal)
+        with self._lock:
+            row = self._connection.execute("""
+                SELECT entry FROM saves
+                WHERE class_idx = ? AND journal_idx = ? AND error IS NULL AND unchanged = 0
+                  AND COALESCE(file, blob, api_file, api_blob) IS NOT NULL
+                ORDER BY save_idx DESC LIMIT 1
+            """, (class_idx, journal_idx)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter_journal_saves(self):
+        """
+        Перебирает (класс, журнал, сохранения без ошибок) в порядке дерева, как
+        iter_journal_saves в analysis_engine.py, но по индексу каталога.
+        У класса и журнала нет вложенных списков (journals, save)
+        """
+        saves = {}
+        for class_idx, journal_idx, entry in self._connection.execute(
+                "SELECT class_idx, journal_idx, entry FROM saves WHERE error IS NULL "
+                "ORDER BY class_idx, journal_idx, save_idx"):
+            saves.setdefault((class_idx, journal_idx), []).append(json.loads(entry))
+
+        classes = [json.loads(entry) for entry, in self._connection.execute(
+            "SELECT entry FROM classes ORDER BY class_idx")]
+        for class_idx, journal_idx, entry in self._connection.execute(
+                "SELECT class_idx, journal_idx, entry FROM journals ORDER BY class_idx, journal_idx"):
+            yield classes[class_idx], json.loads(entry), saves.get((class_idx, journal_idx), [])
+
+    def base_url(self):
+        """baseURL из data.json"""
+        return json.loads(self._scalar("SELECT value FROM meta WHERE key = 'data'") or "{}").get("baseURL", "")
+
+    def export_data(self):
+        """Дерево в формате data.json"""
+        data = json.loads(self._scalar("SELECT value FROM meta WHERE key = 'data'") or "{}")
+        saves = {}
+        for class_idx, journal_idx, entry in self._connection.execute(
+                "SELECT class_idx, journal_idx, entry FROM saves ORDER BY class_idx, journal_idx, save_idx"):
+            saves.setdefault((class_idx, journal_idx), []).append(json.loads(entry))
+
+        classes = [json.loads(entry) for entry, in self._connection.execute(
+            "SELECT entry FROM classes ORDER BY class_idx")]
+        for class_idx, journal_idx, entry in self._connection.execute(
+                "SELECT class_idx, journal_idx, entry FROM journals ORDER BY class_idx, journal_idx"):
+            journal = json.loads(entry)
+            if "save" in journal or (class_idx, journal_idx) in saves:
+                journal["save"] = saves.get((class_idx, journal_idx), [])
+            classes[class_idx].setdefault("journals", []).append(journal)
+        data["classes"] = classes
+        return data
+
+    def export_file(self, data_path="data.json"):
+        write_json_atomic(data_path, self.export_data())
+
+    def _scalar(self, query, params=()):
+        row = self._connection.execute(query, params).fetchone()
+        return row[0] if row else None
+
+    def journal_saves(self, journal_id):
+        """Все сохранения журнала (всех журналов с этим ID) по порядку"""
+        return [json.loads(entry) for entry, in self._connection.execute(
+            "SELECT entry FROM saves WHERE journal_id = ? ORDER BY class_idx, journal_idx, save_idx",
+            (str(journal_id),))]
+
+    def saves_on(self, date):
+        """(ID журнала, сохранение) всех сохранений за дату (YYYY-MM-DD)"""
+        return [(journal_id, json.loads(entry)) for journal_id, entry in self._connection.execute(
+            "SELECT journal_id, entry FROM saves WHERE date >= ? AND date < ? ORDER BY date", day_range(date))]
+
+    def journals_without_save(self, date, successful=True):
+        """
+        Журналы без сохранения за дату: (индекс класса, индекс журнала, ID, название).
+        successful=True - не считаются сохранения с ошибкой
+        """
+        condition = "AND (s.error IS NULL OR s.error = '')" if successful else ""
+        return self._connection.execute(f"""
+            SELECT j.class_idx, j.journal_idx, j.journal_id, j.name FROM journals j
+            WHERE NOT EXISTS (
+                SELECT 1 FROM saves s
+                WHERE s.class_idx = j.class_idx AND s.journal_idx = j.journal_idx
+                  AND s.date >= ? AND s.date < ? {condition}
+            )
+            ORDER BY j.class_idx, j.journal_idx
+        """, day_range(date)).fetchall()
+
+    def pending_journals(self, run_date=None):
+        """
+        (индекс класса, индекс журнала) необработанных журналов в порядке обхода,
+        те же, что находит collect_pending_journals в download_journals_from_json.py
+        """
+        if run_date is not None:
+            return [(class_idx, journal_idx) for class_idx, journal_idx, _, _
+                    in self.journals_without_save(run_date, successful=False)]
+        return self._connection.execute("""
+            SELECT j.class_idx, j.journal_idx FROM journals j
+            WHERE NOT EXISTS (
+                SELECT 1 FROM saves s WHERE s.class_idx = j.class_idx AND s.journal_idx = j.journal_idx
+            )
+            ORDER BY j.class_idx, j.journal_idx
+        """).fetchall()
+
+    def put_results(self, journal_id, save, results):
+        """Результаты проверок сохранения журнала: {отчет: результат}"""
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                [(str(journal_id), save_ref(save), report, to_json(result)) for report, result in results.items()]
+            )
+
+    def journal_results(self, journal_id):
+        """{ссылка на снимок: {отчет: результат}} для сохранений журнала"""
+        results = {}
+        for ref, report, result in self._connection.execute(
+                "SELECT ref, report, result FROM results WHERE journal_id = ?", (str(journal_id),)):
+            results.setdefault(ref, {})[report] = json.loads(result)
+        return results
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Каталог классов, журналов и сохранений в SQLite")
+    parser.add_argument("--catalog", default=CATALOG_PATH, help="файл каталога")
+    parser.add_argument("--import", dest="import_path", default=None, help="собрать каталог из data.json")
+    parser.add_argument("--export", dest="export_path", default=None, help="записать data.json из каталога")
+    parser.add_argument("--journal", default=None, help="показать сохранения журнала с указанным ID")
+    parser.add_argument("--missing", default=None, metavar="ДАТА",
+                        help="показать журналы без успешного сохранения за дату (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    catalog = Catalog(args.catalog)
+    try:
+        if args.import_path:
+            data = catalog.import_file(args.import_path)
+            journals = sum(len(class_item.get("journals", [])) for class_item in data.get("classes", []))
+            print(f"✓ Импортировано классов: {len(data.get('classes', []))}, журналов: {journals}")
+        if args.journal:
+            for save in catalog.journal_saves(args.journal):
+                status = f"✗ {save['error']}" if save.get("error") else "✓"
+                print(f"{save.get('date')} {status} {save_ref(save)}")
+        if args.missing:
+            missing = catalog.journals_without_save(args.missing)
+            for _, _, journal_id, name in missing:
+                print(f"{journal_id} {name}")
+            print(f"Журналов без успешного сохранения за {args.missing}: {len(missing)}")
+        if args.export_path:
+            catalog.export_file(args.export_path)
+            print(f"✓ Каталог записан в {args.export_path}")
+    finally:
+        catalog.close()
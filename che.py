@@ -1,6 +1,7 @@
 import json
-import os
 from bs4 import BeautifulSoup
+from progress_log import load_progress_data
+from snapshot_store import read_save_html
 import re
 
 def extract_lesson_statuses(soup):
@@ -33,8 +34,8 @@ def process_journals(json_file_path):
         journals_data = []
         
         # Читаем JSON файл
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # Читаем data.json вместе с хвостом журнала прогресса загрузчика
+        data = load_progress_data(json_file_path)
         base_url = data.get('baseURL', '')
         classes = data.get('classes', [])
         
@@ -53,38 +54,36 @@ def process_journals(json_file_path):
                 
                 # Обрабатываем все сохранения для этого журнала
                 for save in saves:
-                    file_path = save.get('file', '')
+                    file_path = save.get('file') or save.get('blob', '')
                     error = save.get('error', '')
                     
                     if error:
                         continue
                     
-                    # Проверяем существование файла
-                    if not os.path.exists(file_path):
-                        continue
-                    
                     try:
-                        # Читаем HTML файл
-                        with open(file_path, 'r', encoding='utf-8') as html_file:
-                            html_content = html_file.read()
-                            soup = BeautifulSoup(html_content, 'html.parser')
-                            first_table = soup.find('table')
+                        # Читаем HTML из файла или хранилища снимков
+                        html_content = read_save_html(save)
+                        if html_content is None:
+                            continue
+                        
+                        soup = BeautifulSoup(html_content, 'html.parser')
+                        first_table = soup.find('table')
+                        
+                        if first_table:
+                            thead = first_table.find('thead')
+                            
+                            # Извлекаем статусы уроков
+                            journal_statuses = extract_lesson_statuses(thead)
+                            
+                            # Создаем объект журнала
+                            journal_obj = {
+                                'full_journal_name': full_journal_name,
+                                'journal_url': journal_url,
+                                'journal_statuses': journal_statuses
+                            }
                             
-                            if first_table:
-                                thead = first_table.find('thead')
-                                
-                                # Извлекаем статусы уроков
-                                journal_statuses = extract_lesson_statuses(thead)
-                                
-                                # Создаем объект журнала
-                                journal_obj = {
-                                    'full_journal_name': full_journal_name,
-                                    'journal_url': journal_url,
-                                    'journal_statuses': journal_statuses
-                                }
-                                
-                                journals_data.append(journal_obj)
-                                break  # Обрабатываем только первый валидный файл для журнала
+                            journals_data.append(journal_obj)
+                            break  # Обрабатываем только первый валидный файл для журнала
                             
                     except Exception as e:
                         print(f"Ошибка при чтении файла {file_path}: {e}")
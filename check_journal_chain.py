@@ -1,6 +1,9 @@
+import argparse
 import json
-import os
 from bs4 import BeautifulSoup
+from progress_log import load_progress_data
+from snapshot_store import read_save_html
+from analysis_pool import run_parallel, default_workers
 import datetime
 
 # Проверяет на цепочки двоек, даёт отчёт в этой же директории. Нужно скормить его генератору отчёта
@@ -124,7 +127,7 @@ def has_three_consecutive_twos_with_types(grades_details):
     """
     Проверяет наличие последовательностей из 3 двоек и возвращает типы нарушений
     """
-    violation_types = set()
+    violation_types = {}  # словарь вместо множества - типы в порядке обнаружения
     count = 0
     sequence_start = -1
     
@@ -139,7 +142,7 @@ def has_three_consecutive_twos_with_types(grades_details):
             if count >= 3:
                 # Нашли последовательность из 3+ двоек
                 violation_type = analyze_sequence(grades_details, sequence_start)
-                violation_types.add(violation_type)
+                violation_types[violation_type] = True
                 # Сбрасываем для поиска следующей последовательности
                 count = 0
                 sequence_start = -1
@@ -154,9 +157,48 @@ def has_three_consecutive_twos_with_types(grades_details):
     
     return list(violation_types)
 
-def process_journals(json_file_path):
+def find_save_violations(save):
     """
-    Читает JSON файл с информацией о журналах и проверяет на нарушения
+    Ищет цепочки двоек в одном сохранении журнала.
+    Возвращает (типы нарушений, количество нарушений)
+    """
+    violation_types = {}
+    violation_count = 0
+    file_path = save.get('file') or save.get('blob', '')
+    
+    try:
+        # Читаем HTML из файла или хранилища снимков
+        html_content = read_save_html(save)
+        if html_content is None:
+            return [], 0
+        
+        # Парсим HTML и ищем элемент table
+        soup = BeautifulSoup(html_content, 'html.parser')
+        table_element = soup.find('table')
+        
+        if table_element:
+            tabBodyRows = table_element.find('tbody').find_all(recursive=False)
+            
+            for row in tabBodyRows[1:]:  # пропускаем первого ребенка
+                student_data = extract_grades(row)
+                grades_details = student_data["grades_details"]
+                
+                # Ищем нарушения для этого студента
+                violations = has_three_consecutive_twos_with_types(grades_details)
+                
+                for violation_type in violations:
+                    violation_types[violation_type] = True
+                    violation_count += 1
+        
+    except Exception as e:
+        print(f"    Ошибка при чтении файла {file_path}: {e}")
+    
+    return list(violation_types), violation_count
+
+def process_journals(json_file_path, workers=1, chunksize=None):
+    """
+    Читает JSON файл с информацией о журналах и проверяет на нарушения.
+    workers > 1 - сохранения разбираются параллельно в пуле процессов
     """
     results = {
         'baseURL': '',
@@ -166,8 +208,8 @@ def process_journals(json_file_path):
     
     try:
         # Читаем JSON файл
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # Читаем data.json вместе с хвостом журнала прогресса загрузчика
+        data = load_progress_data(json_file_path)
         
         base_url = data.get('baseURL', '')
         results['baseURL'] = base_url
@@ -176,6 +218,16 @@ def process_journals(json_file_path):
         print(f"Найдено классов: {len(classes)}")
         print(f"Base URL: {base_url}\n")
         
+        # Разбираем все сохранения без ошибок (при workers > 1 - параллельно)
+        tasks = [
+            (save,)
+            for class_info in classes
+            for journal in class_info.get('journals', [])
+            for save in journal.get('save', [])
+            if not save.get('error', '')
+        ]
+        save_results = iter(run_parallel(find_save_violations, tasks, workers, chunksize))
+        
         # Перебираем все классы
         for class_info in classes:
             class_name = class_info.get('name', 'Неизвестный класс')
@@ -193,48 +245,20 @@ def process_journals(json_file_path):
                 # Формируем полное название журнала: класс + предмет
                 full_journal_name = f"{class_name} - {journal_name}"
                 
-                journal_violations = set()
+                journal_violations = []
                 violation_count = 0
                 
-                # Обрабатываем все сохранения для этого журнала
+                # Сводим результаты всех сохранений этого журнала (в порядке заданий)
                 for save in saves:
-                    file_path = save.get('file', '')
-                    error = save.get('error', '')
-                    
-                    if error:
-                        continue
-                    
-                    # Проверяем существование файла
-                    if not os.path.exists(file_path):
+                    if save.get('error', ''):
                         continue
                     
-                    try:
-                        # Читаем HTML файл
-                        with open(file_path, 'r', encoding='utf-8') as html_file:
-                            html_content = html_file.read()
-                        
-                        # Парсим HTML и ищем элемент table
-                        soup = BeautifulSoup(html_content, 'html.parser')
-                        table_element = soup.find('table')
-                        
-                        if table_element:
-                            tabBodyRows = table_element.find('tbody').find_all(recursive=False)
-                            
-                            for row in tabBodyRows[1:]:  # пропускаем первого ребенка
-                                student_data = extract_grades(row)
-                                grades_details = student_data["grades_details"]
-                                
-                                # Ищем нарушения для этого студента
-                                violations = has_three_consecutive_twos_with_types(grades_details)
-                                
-                                if violations:
-                                    for violation_type in violations:
-                                        journal_violations.add(violation_type)
-                                        violation_count += 1
-                                        results['violations_found'] += 1
-                        
-                    except Exception as e:
-                        print(f"    Ошибка при чтении файла {file_path}: {e}")
+                    violation_types, save_violation_count = next(save_results)
+                    for violation_type in violation_types:
+                        if violation_type not in journal_violations:
+                            journal_violations.append(violation_type)
+                    violation_count += save_violation_count
+                    results['violations_found'] += save_violation_count
                 
                 # Если в журнале найдены нарушения, добавляем в результаты
                 if journal_violations:
@@ -242,9 +266,9 @@ def process_journals(json_file_path):
                         'journal_id': journal_id,
                         'journal_name': full_journal_name,
                         'violations_count': violation_count,
-                        'sequence_twos': list(journal_violations)
+                        'sequence_twos': journal_violations
                     })
-                    print(f"    ✓ Нарушения в журнале {journal_name}: {list(journal_violations)} (количество: {violation_count})")
+                    print(f"    ✓ Нарушения в журнале {journal_name}: {journal_violations} (количество: {violation_count})")
             
             print(f"\n{'='*50}")
 
@@ -269,5 +293,13 @@ def process_journals(json_file_path):
 
 # Основная часть программы
 if __name__ == "__main__":
-    json_file_path = "data.json"
-    results = process_journals(json_file_path)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Проверка журналов на цепочки двоек")
+    parser.add_argument("--data", default="data.json", help="файл с данными журналов")
+    parser.add_argument("--workers", type=int, default=1,
+                        help=f"количество процессов разбора (1 - без пула, на этой машине ядер: {default_workers()})")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="сколько сохранений отдавать процессу за раз")
+    args = parser.parse_args()
+    
+    json_file_path = args.data
+    results = process_journals(json_file_path, workers=args.workers, chunksize=args.chunksize)
\ No newline at end of file
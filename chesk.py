@@ -1,6 +1,9 @@
+import argparse
 import json
-import os
 from bs4 import BeautifulSoup
+from progress_log import load_progress_data
+from snapshot_store import read_save_html
+from analysis_pool import run_parallel, default_workers
 import re
 
 def extract_grades(tr_element):
@@ -61,7 +64,8 @@ def extract_grades(tr_element):
                     # Добавляем детальную информацию
                     grade_detail = {
                         'value': grade_value,
-                        'multiple_grades': has_multiple_grades
+                        'multiple_grades': has_multiple_grades,
+                        'column': i  # номер столбца урока (без столбца с именем)
                     }
                     result['grades_details'].append(grade_detail)
                     
@@ -74,7 +78,8 @@ def extract_grades(tr_element):
                     result['all_grades'].append(None)
                     result['grades_details'].append({
                         'value': None,
-                        'multiple_grades': False
+                        'multiple_grades': False,
+                        'column': i
                     })
         
         # Определяем последнюю оценку перед итоговой
@@ -264,9 +269,73 @@ def check_last_grade_before_final(student_data):
     
     return None
 
-def process_journals(json_file_path):
+def find_save_violations(save, journal_name):
     """
-    Читает JSON файл с информацией о журналах и проверяет на нарушения по количеству оценок и итоговым оценкам
+    Проверяет одно сохранение журнала по количеству оценок и итоговым оценкам.
+    Возвращает (типы нарушений, количество нарушений, много ли уроков)
+    или None, если снимок недоступен
+    """
+    violation_types = {}
+    violation_count = 0
+    many_lessons = None
+    file_path = save.get('file') or save.get('blob', '')
+    
+    try:
+        # Читаем HTML из файла или хранилища снимков
+        html_content = read_save_html(save)
+        if html_content is None:
+            return None
+        
+        # Проверяем количество уроков в журнале
+        many_lessons = has_many_lessons(html_content)
+        min_grades_required = 5 if many_lessons else 3
+        
+        # Парсим HTML и ищем элемент table
+        soup = BeautifulSoup(html_content, 'html.parser')
+        table_element = soup.find('table')
+        
+        if table_element:
+            tabBodyRows = table_element.find('tbody').find_all(recursive=False)
+            
+            for row in tabBodyRows[1:]:  # пропускаем первого ребенка
+                student_data = extract_grades(row)
+                final_grade = student_data.get('final_grade', '')
+                
+                # Если итоговая оценка "б/о" - пропускаем все проверки
+                if final_grade and final_grade.lower() in ['б/о', 'бо']:
+                    continue
+                
+                # Проверяем количество оценок у студента
+                has_az = final_grade and final_grade.lower() in ['а/з', 'аз']
+                count_violation = check_student_grades_count(
+                    student_data, min_grades_required, has_az_final_grade=has_az
+                )
+                if count_violation:
+                    violation_types[count_violation] = True
+                    violation_count += 1
+                
+                # Проверяем правильность итоговой оценки (только если не "а/з" и не "б/о")
+                if not has_az:
+                    final_grade_violation = check_final_grade_correctness(student_data, journal_name)
+                    if final_grade_violation:
+                        violation_types[final_grade_violation] = True
+                        violation_count += 1
+                
+                # Проверяем последнюю оценку перед итоговой
+                last_grade_violation = check_last_grade_before_final(student_data)
+                if last_grade_violation:
+                    violation_types[last_grade_violation] = True
+                    violation_count += 1
+        
+    except Exception as e:
+        print(f"    Ошибка при чтении файла {file_path}: {e}")
+    
+    return list(violation_types), violation_count, many_lessons
+
+def process_journals(json_file_path, workers=1, chunksize=None):
+    """
+    Читает JSON файл с информацией о журналах и проверяет на нарушения по количеству оценок и итоговым оценкам.
+    workers > 1 - сохранения разбираются параллельно в пуле процессов
     """
     results = {
         'baseURL': '',
@@ -276,8 +345,8 @@ def process_journals(json_file_path):
     
     try:
         # Читаем JSON файл
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # Читаем data.json вместе с хвостом журнала прогресса загрузчика
+        data = load_progress_data(json_file_path)
         
         base_url = data.get('baseURL', '')
         results['baseURL'] = base_url
@@ -286,6 +355,16 @@ def process_journals(json_file_path):
         print(f"Найдено классов: {len(classes)}")
         print(f"Base URL: {base_url}\n")
         
+        # Разбираем все сохранения без ошибок (при workers > 1 - параллельно)
+        tasks = [
+            (save, journal.get('name', 'Неизвестный журнал'))
+            for class_info in classes
+            for journal in class_info.get('journals', [])
+            for save in journal.get('save', [])
+            if not save.get('error', '')
+        ]
+        save_results = iter(run_parallel(find_save_violations, tasks, workers, chunksize))
+        
         # Перебираем все классы
         for class_info in classes:
             class_name = class_info.get('name', 'Неизвестный класс')
@@ -303,74 +382,28 @@ def process_journals(json_file_path):
                 # Формируем полное название журнала: класс + предмет
                 full_journal_name = f"{class_name} - {journal_name}"
                 
-                journal_violations = set()
+                journal_violations = []
                 violation_count = 0
                 
-                # Обрабатываем все сохранения для этого журнала
+                # Сводим результаты всех сохранений этого журнала (в порядке заданий)
                 for save in saves:
-                    file_path = save.get('file', '')
-                    error = save.get('error', '')
-                    
-                    if error:
+                    if save.get('error', ''):
                         continue
                     
-                    # Проверяем существование файла
-                    if not os.path.exists(file_path):
+                    save_result = next(save_results)
+                    if save_result is None:
                         continue
                     
-                    try:
-                        # Читаем HTML файл
-                        with open(file_path, 'r', encoding='utf-8') as html_file:
-                            html_content = html_file.read()
-                        
-                        # Проверяем количество уроков в журнале
-                        many_lessons = has_many_lessons(html_content)
+                    violation_types, save_violation_count, many_lessons = save_result
+                    if many_lessons is not None:
                         min_grades_required = 5 if many_lessons else 3
-                        
                         print(f"    Журнал {journal_name}: уроков много - {many_lessons}, требуется оценок - {min_grades_required}")
-                        
-                        # Парсим HTML и ищем элемент table
-                        soup = BeautifulSoup(html_content, 'html.parser')
-                        table_element = soup.find('table')
-                        
-                        if table_element:
-                            tabBodyRows = table_element.find('tbody').find_all(recursive=False)
-                            
-                            for row in tabBodyRows[1:]:  # пропускаем первого ребенка
-                                student_data = extract_grades(row)
-                                final_grade = student_data.get('final_grade', '')
-                                
-                                # Если итоговая оценка "б/о" - пропускаем все проверки
-                                if final_grade and final_grade.lower() in ['б/о', 'бо']:
-                                    continue
-                                
-                                # Проверяем количество оценок у студента
-                                has_az = final_grade and final_grade.lower() in ['а/з', 'аз']
-                                count_violation = check_student_grades_count(
-                                    student_data, min_grades_required, has_az_final_grade=has_az
-                                )
-                                if count_violation:
-                                    journal_violations.add(count_violation)
-                                    violation_count += 1
-                                    results['violations_found'] += 1
-                                
-                                # Проверяем правильность итоговой оценки (только если не "а/з" и не "б/о")
-                                if not has_az:
-                                    final_grade_violation = check_final_grade_correctness(student_data, journal_name)
-                                    if final_grade_violation:
-                                        journal_violations.add(final_grade_violation)
-                                        violation_count += 1
-                                        results['violations_found'] += 1
-                                
-                                # Проверяем последнюю оценку перед итоговой
-                                last_grade_violation = check_last_grade_before_final(student_data)
-                                if last_grade_violation:
-                                    journal_violations.add(last_grade_violation)
-                                    violation_count += 1
-                                    results['violations_found'] += 1
-                        
-                    except Exception as e:
-                        print(f"    Ошибка при чтении файла {file_path}: {e}")
+                    
+                    for violation_type in violation_types:
+                        if violation_type not in journal_violations:
+                            journal_violations.append(violation_type)
+                    violation_count += save_violation_count
+                    results['violations_found'] += save_violation_count
                 
                 # Если в журнале найдены нарушения, добавляем в результаты
                 if journal_violations:
@@ -378,9 +411,9 @@ def process_journals(json_file_path):
                         'journal_id': journal_id,
                         'journal_name': full_journal_name,
                         'violations_count': violation_count,
-                        'sequence_twos': list(journal_violations)
+                        'sequence_twos': journal_violations
                     })
-                    print(f"    ✓ Нарушения в журнале {journal_name}: {list(journal_violations)} (количество: {violation_count})")
+                    print(f"    ✓ Нарушения в журнале {journal_name}: {journal_violations} (количество: {violation_count})")
             
             print(f"\n{'='*50}")
         
@@ -404,5 +437,13 @@ def process_journals(json_file_path):
 
 # Основная часть программы
 if __name__ == "__main__":
-    json_file_path = "data.json"
-    results = process_journals(json_file_path)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Проверка журналов по количеству оценок и итоговым оценкам")
+    parser.add_argument("--data", default="data.json", help="файл с данными журналов")
+    parser.add_argument("--workers", type=int, default=1,
+                        help=f"количество процессов разбора (1 - без пула, на этой машине ядер: {default_workers()})")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="сколько сохранений отдавать процессу за раз")
+    args = parser.parse_args()
+    
+    json_file_path = args.data
+    results = process_journals(json_file_path, workers=args.workers, chunksize=args.chunksize)
\ No newline at end of file
@@ -0,0 +1,142 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Замеры времени загрузки журналов по этапам: переход на страницу, внедрение
+# скрипта, ожидание готовности, выгрузка ответов API, скриншот, запись HTML,
+# запись в журнал прогресса. По итогам запуска печатается сводка p50/p95/max
+# по каждому этапу - по ней видно, что тормозит: сайт, браузер или диск.
+# Первый журнал загружается вручную (авторизация, ожидание Enter) - он пишется
+# в файл замеров, но в сводку и в расчет журналов в минуту не входит
+
+# Порядок этапов в сводке (этапы не из списка печатаются после них)
+STAGES = [
+    "change_check",
+    "navigation",
+    "script_injection",
+    "readiness_wait",
+    "api_extraction",
+    "api_fetch",
+    "screenshot",
+    "html_capture",
+    "html_write",
+    "api_write",
+    "progress_save",
+]
+
+
+class StageTimer:
+    """Время этапов загрузки одного журнала"""
+
+    def __init__(self):
+        self.timings = {}
+        self.started = time.monotonic()
+
+    @contextmanager
+    def stage(self, name):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.monotonic() - started
+
+    def rounded(self):
+        """Время этапов в секундах, округленное до миллисекунд (для записи save)"""
+        return {name: round(seconds, 3) for name, seconds in self.timings.items()}
+
+    def total(self):
+        return time.monotonic() - self.started
+
+
+def percentile(sorted_values, fraction):
+    """Перцентиль по отсортированному списку (ближайшее значение)"""
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class CrawlMetrics:
+    """
+    Сбор замеров всех журналов запуска.
+    Если задан file_path, каждый журнал дописывается строкой в JSONL-файл
+    """
+
+    def __init__(self, file_path=None):
+        self.file_path = file_path
+        self.records = []
+        self.started = None  # начало первого автоматически загруженного журнала
+        self._lock = threading.Lock()
+        self._file = open(file_path, 'a', encoding='utf-8') if file_path else None
+
+    def record(self, journal_id, timer, success, manual=False, **fields):
+        """Учитывает замеры одного журнала. manual=True - журнал с ручными действиями, в сводку не входит"""
+        record = {
+            "journal": journal_id,
+            "success": success,
+            "total": round(timer.total(), 3),
+            "timings": timer.rounded(),
+            **fields
+        }
+        if manual:
+            record["manual"] = True
+        with self._lock:
+            if not manual:
+                self.records.append(record)
+                if self.started is None or timer.started < self.started:
+                    self.started = timer.started
+            if self._file:
+                self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self._file.flush()
+
+    def summary(self):
+        """
+        Сводка запуска: p50/p95/max по этапам и общему времени журнала
+        и количество журналов в минуту
+        """
+        with self._lock:
+            records = list(self.records)
+            elapsed = time.monotonic() - self.started if self.started is not None else 0.0
+
+        values = {}
+        for record in records:
+            for name, seconds in record["timings"].items():
+                values.setdefault(name, []).append(seconds)
+            values.setdefault("total", []).append(record["total"])
+
+        order = [name for name in STAGES if name in values]
+        order += sorted(name for name in values if name not in STAGES and name != "total")
+        if "total" in values:
+            order.append("total")
+
+        stages = {}
+        for name in order:
+            stage_values = sorted(values[name])
+            stages[name] = {
+                "count": len(stage_values),
+                "p50": percentile(stage_values, 0.5),
+                "p95": percentile(stage_values, 0.95),
+                "max": stage_values[-1]
+            }
+
+        return {
+            "journals": len(records),
+            "elapsed": elapsed,
+            "journals_per_minute": len(records) / elapsed * 60 if elapsed > 0 else 0.0,
+            "stages": stages
+        }
+
+    def print_summary(self):
+        summary = self.summary()
+        if not summary["journals"]:
+            return summary
+
+        print(f"Время по этапам (журналов: {summary['journals']}, "
+              f"{summary['journals_per_minute']:.1f} в минуту):")
+        print(f"  {'этап':<18}{'p50':>8}{'p95':>8}{'max':>8}")
+        for name, stage in summary["stages"].items():
+            print(f"  {name:<18}{stage['p50']:>8.2f}{stage['p95']:>8.2f}{stage['max']:>8.2f}")
+        return summary
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Асинхронная оркестровка загрузки журналов: страницы загружаются драйверами в
+# потоках исполнителя, а частоту обращений к authedu.mosreg.ru ограничивает общий
+# для всех драйверов "ведро токенов". Если в перехваченных ответах API
+# встречаются 429 или 5xx, ведро на время перестает выдавать токены
+
+# Статусы ответов, по которым сервер просит снизить нагрузку
+THROTTLE_STATUSES = {429}
+
+
+def find_throttle_status(api_records):
+    """Первый статус 429 или 5xx в ответах API (формат window.apiMonitor) или None"""
+    for record in api_records or []:
+        status = record.get('status')
+        if not isinstance(status, int):
+            continue
+        if status in THROTTLE_STATUSES or status >= 500:
+            return status
+    return None
+
+
+def get_retry_after(api_records):
+    """Значение заголовка Retry-After (в секундах) из ответов API или None"""
+    for record in api_records or []:
+        for name, value in (record.get('headers') or {}).items():
+            if name.lower() != 'retry-after':
+                continue
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+class TokenBucket:
+    """
+    Потокобезопасное ведро токенов: rate токенов в секунду, не больше burst подряд.
+
+    Один токен - одна загрузка страницы журнала или один запрос к API.
+    acquire() - для корутин, wait() - для потоков.
+    observe() разбирает ответы API журнала: при 429/5xx выдача токенов
+    приостанавливается на base_backoff * 2^(n-1) секунд (n - сколько журналов
+    подряд получили такие ответы, не больше max_backoff) или на Retry-After
+    """
+
+    def __init__(self, rate, burst=1, base_backoff=5.0, max_backoff=300.0):
+        if rate <= 0:
+            raise ValueError("Частота запросов должна быть больше нуля")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._throttled = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Забирает токен. Возвращает, сколько секунд нужно подождать
+        перед запросом (0 - можно сразу)
+        """
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._paused_until)
+            if start > self._updated:
+                self._tokens = min(self.burst, self._tokens + (start - self._updated) * self.rate)
+                self._updated = start
+
+            # Токен может уйти в долг: следующий запрос подождет, пока он восполнится
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return start - now
+            return start - now + (-self._tokens) / self.rate
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def backoff(self, status, retry_after=None):
+        """Приостанавливает выдачу токенов после ответа status"""
+        with self._lock:
+            self._throttled += 1
+            delay = retry_after or min(self.max_backoff, self.base_backoff * 2 ** (self._throttled - 1))
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        print(f"  ⚠ Сервер ответил {status}, пауза загрузки {delay:.0f} с")
+
+    def observe(self, api_records):
+        """Учитывает ответы API загруженного журнала"""
+        status = find_throttle_status(api_records)
+        if status is None:
+            with self._lock:
+                self._throttled = 0
+            return
+        self.backoff(status, get_retry_after(api_records))
+
+
+class CrawlOrchestrator:
+    """
+    Асинхронная загрузка журналов несколькими драйверами.
+
+    Каждый драйвер обслуживает отдельная корутина: она берет журнал из очереди
+    работы, ждет токен у общего ограничителя и выполняет загрузку страницы
+    (process_journal) в своем потоке исполнителя
+    """
+
+    def __init__(self, ctx, drivers, limiter, process_journal):
+        self.ctx = ctx
+        self.drivers = drivers
+        self.limiter = limiter
+        self.process_journal = process_journal
+        self._executor = ThreadPoolExecutor(max_workers=len(drivers), thread_name_prefix="crawl")
+        # Ожидание очереди работы не должно занимать потоки загрузки страниц
+        self._queue_executor = ThreadPoolExecutor(max_workers=len(drivers), thread_name_prefix="queue")
+
+    async def _driver_loop(self, driver, work, get_journal):
+        loop = asyncio.get_running_loop()
+        while True:
+            task = await loop.run_in_executor(self._queue_executor, work.get)
+            if task is None:
+                break
+
+            key, item = task
+            success = False
+            try:
+                await self.limiter.acquire()
+                _, journal = get_journal(self.ctx.data, item)
+                success = await loop.run_in_executor(
+                    self._executor, self.process_journal, driver, self.ctx, journal
+                )
+            except Exception as e:
+                print(f"  ✗ Ошибка при обработке журнала {key}: {e}")
+            finally:
+                work.task_done(key, item, success)
+
+            if success:
+                self.ctx.count_processed()
+
+            if self.ctx.pause:
+                await asyncio.sleep(self.ctx.pause)
+
+    async def _run(self, work, get_journal):
+        await asyncio.gather(*(
+            self._driver_loop(driver, work, get_journal) for driver in self.drivers
+        ))
+
+    def run(self, work, get_journal):
+        """Обрабатывает все журналы очереди работы"""
+        try:
+            asyncio.run(self._run(work, get_journal))
+        finally:
+            self._executor.shutdown(wait=True)
+            self._queue_executor.shutdown(wait=True)
@@ -2,20 +2,58 @@ from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
 from selenium.common.exceptions import TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
 import json
 import time
 import os
 import tempfile
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlparse
 from datetime import datetime
 import requests
+from api_fetcher import (
+    build_endpoint_templates, collect_request_headers, pop_request_headers, create_api_session,
+    fetch_journal_api, select_probe_templates, compute_api_fingerprint
+)
+from progress_log import ProgressLog, replay_progress_log
+from catalog import Catalog
+from snapshot_store import SnapshotStore, read_save_api
+from screenshot_writer import ScreenshotWriter, POLICIES as SCREENSHOT_POLICIES
+from retry_queue import RetryQueue
+from crawl_orchestrator import CrawlOrchestrator, TokenBucket
+from crawl_metrics import CrawlMetrics, StageTimer
+from network_capture import NetworkCapture, enable_performance_logging, DEFAULT_URL_ALLOWLIST
 
 
-def setup_driver():
-    """Настройка Chrome драйвера"""
+# Ресурсы, которые не нужны для сохранения журнала: картинки, шрифты, медиа и
+# сторонние счетчики. Запросы к /api/ authedu под эти шаблоны не попадают
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.png?*", "*.jpg", "*.jpg?*", "*.jpeg", "*.jpeg?*", "*.gif", "*.gif?*",
+    "*.webp", "*.webp?*", "*.ico", "*.ico?*",
+    "*.woff", "*.woff?*", "*.woff2", "*.woff2?*", "*.ttf", "*.ttf?*", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3", "*.ogg", "*.wav",
+    "*://mc.yandex.ru/*", "*://mc.yandex.com/*", "*://yandex.ru/metrika/*",
+    "*://*.google-analytics.com/*", "*://*.googletagmanager.com/*",
+    "*://top-fwz1.mail.ru/*", "*://*.sentry.io/*",
+]
+
+
+def setup_driver(profile_name="chrome_profile", headless=False, block_resources=False,
+                 blocked_urls=None, capture_network=False):
+    """Настройка Chrome драйвера
+
+    profile_name - имя папки профиля во временной директории. Каждому
+    одновременно работающему драйверу нужен свой профиль.
+    headless - запуск без окна (только для работы после авторизации)
+    block_resources - блокировать через CDP картинки, шрифты, медиа и сторонние счетчики
+    blocked_urls - дополнительные шаблоны блокируемых URL
+    capture_network - включить журнал событий Network для перехвата ответов API через CDP
+    """
     chrome_options = Options()
     
     # Основные опции для стабильной работы
@@ -23,17 +61,44 @@ def setup_driver():
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--disable-gpu")
     
+    if headless:
+        chrome_options.add_argument("--headless=new")
+        # Без окна размер по умолчанию маленький - таблица журнала должна помещаться
+        chrome_options.add_argument("--window-size=1920,1080")
+    
+    if block_resources:
+        # Картинки дополнительно отключаем настройкой профиля
+        chrome_options.add_experimental_option(
+            "prefs", {"profile.managed_default_content_settings.images": 2}
+        )
+    
+    if capture_network:
+        enable_performance_logging(chrome_options)
+    
     # Используем временную директорию для профиля
-    profile_dir = os.path.join(tempfile.gettempdir(), "chrome_profile")
+    profile_dir = os.path.join(tempfile.gettempdir(), profile_name)
     chrome_options.add_argument(f"--user-data-dir={profile_dir}")
     
     try:
         service = Service(ChromeDriverManager().install())
         driver = webdriver.Chrome(service=service, options=chrome_options)
-        return driver
     except Exception as e:
         print(f"Ошибка при создании драйвера: {e}")
         raise
+    
+    if block_resources:
+        block_resources_via_cdp(driver, BLOCKED_URL_PATTERNS + list(blocked_urls or []))
+    return driver
+
+
+def block_resources_via_cdp(driver, patterns):
+    """Блокирует загрузку ресурсов по шаблонам URL через Chrome DevTools Protocol"""
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        print(f"  ✓ Заблокировано шаблонов URL: {len(patterns)}")
+    except Exception as e:
+        print(f"  ⚠ Не удалось включить блокировку ресурсов: {e}")
 
 
 def load_json_data(filename):
@@ -85,27 +150,32 @@ def save_html_to_file(html_content, journal_id, save_dir):
         return None
 
 
-def take_screenshot(driver, journal_id, save_dir):
-    """Создает скриншот страницы без прокрутки"""
+def take_screenshot(driver, journal_id, page_loaded, ctx):
+    """
+    Создает скриншот страницы без прокрутки, если он нужен по политике скриншотов.
+    Перекодирование и запись файла идут в фоне.
+    Возвращает Future с относительным путем к файлу или None, если скриншот не делался
+    """
+    if not ctx.screenshots.should_capture(page_loaded):
+        return None
     try:
-        filename = f"{journal_id}.png"
-        filepath = os.path.join(save_dir, filename)
-        driver.save_screenshot(filepath)
-        
-        # Возвращаем относительный путь для JSON
-        relative_path = os.path.join("save", os.path.basename(save_dir), filename)
-        print(f"  ✓ Скриншот сохранен: {filename}")
-        return relative_path
+        png_data = driver.get_screenshot_as_png()
     except Exception as e:
         print(f"  ✗ Ошибка при создании скриншота: {e}")
         return None
+    return ctx.screenshots.submit(png_data, journal_id, ctx.save_dir)
 
 
-def get_external_script():
-    """Загружает JavaScript код с GitHub"""
+def get_external_script(include_interceptor=True):
+    """
+    Загружает JavaScript код с GitHub.
+    include_interceptor=False - без interceptor.js (ответы API собираются через CDP)
+    """
     script_url = "https://raw.githubusercontent.com/TafinF/Licey24-MySchoolSctiptTM/refs/heads/main/script.js"
-    with open('interceptor.js', 'r', encoding='utf-8') as file:
-        interceptor_code = file.read()
+    interceptor_code = ""
+    if include_interceptor:
+        with open('interceptor.js', 'r', encoding='utf-8') as file:
+            interceptor_code = file.read()
     
     try:
         print("Загружаю внешний JavaScript код...")
@@ -140,21 +210,106 @@ def inject_script_to_page(driver, script_content):
         return False
 
 
-def wait_for_page_load(driver, timeout=15):
+# Таблица журнала отрисована: в tbody первой таблицы есть хотя бы служебная строка
+# (анализаторы ее пропускают). Строк учеников может не быть - в журнале нет учеников,
+# поэтому их отрисовку подтверждает затишье запросов к API, а не число строк
+TABLE_ROWS_CHECK = """
+const table = document.querySelector('table');
+const tbody = table && table.querySelector('tbody');
+if (!tbody || tbody.children.length < 1) {
+    return false;
+}
+"""
+
+TABLE_READY_SCRIPT = TABLE_ROWS_CHECK + "return true;"
+
+# Проверка готовности страницы: таблица журнала отрисована, а запросы к API
+# (по данным window.apiMonitor) завершились и не появлялись quiet_ms миллисекунд.
+# Если монитор не внедрен, затишье проверить нельзя и ждем строку ученика
+PAGE_READY_SCRIPT = """
+const quietMs = arguments[0];
+""" + TABLE_ROWS_CHECK + """
+const monitor = window.apiMonitor;
+if (!monitor || monitor.pending === undefined) {
+    return tbody.children.length >= 2;
+}
+return monitor.pending === 0 && Date.now() - monitor.lastActivity >= quietMs;
+"""
+
+
+class AdaptiveTimeout:
+    """
+    Таймаут ожидания загрузки, подстраивающийся под наблюдаемые задержки.
+    Таймаут = p95 последних задержек * factor, но не меньше min_timeout и не больше max_timeout.
+    Пока наблюдений мало, используется max_timeout
+    """
+
+    def __init__(self, min_timeout=5.0, max_timeout=15.0, factor=2.0, window=50, min_samples=5):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.factor = factor
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        """Запоминает задержку загрузки одного журнала (в секундах)"""
+        with self._lock:
+            self._latencies.append(latency)
+
+    def current(self):
+        """Текущий таймаут в секундах"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.max_timeout
+            latencies = sorted(self._latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return min(self.max_timeout, max(self.min_timeout, p95 * self.factor))
+
+
+# Общие для всех драйверов настройки ожидания (задаются из параметров командной строки)
+page_load_timeout = AdaptiveTimeout()
+API_QUIET_WINDOW = 0.5
+
+
+def is_page_ready(driver, quiet_window, network=None):
+    """
+    Проверка готовности страницы. Активность API берется из window.apiMonitor
+    или, при перехвате через CDP, из событий Network (network)
     """
-    Ожидает загрузки страницы по появлению SVG элементов
+    if network is None:
+        return driver.execute_script(PAGE_READY_SCRIPT, int(quiet_window * 1000))
+    
+    # Заодно дописываем в _api.json уже завершенные ответы
+    network.poll()
+    return network.is_quiet(quiet_window) and driver.execute_script(TABLE_READY_SCRIPT)
+
+
+def wait_for_page_load(driver, timeout=None, quiet_window=None, network=None):
+    """
+    Ожидает готовности страницы: таблица журнала на месте и запросы к API затихли
+    на quiet_window секунд. Без явного timeout используется адаптивный таймаут
     Возвращает True если страница загрузилась, False если таймаут
     """
+    if timeout is None:
+        timeout = page_load_timeout.current()
+    if quiet_window is None:
+        quiet_window = API_QUIET_WINDOW
+    
+    started = time.monotonic()
     try:
         print("  Ожидаю загрузки страницы...")
-        # Ждем появления элементов с указанными классами
-        WebDriverWait(driver, timeout).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, ".MV57GCYYcPhOHkSQsK9F.EoyGTa_NIo_M5boZkXU0"))
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+            lambda d: is_page_ready(d, quiet_window, network)
         )
-        print("  ✓ Страница загружена полностью")
+        latency = time.monotonic() - started
+        page_load_timeout.record(latency)
+        print(f"  ✓ Страница загружена полностью ({latency:.1f} с)")
         return True
     except TimeoutException:
-        print(f"  ✗ Страница не загрузилась за {timeout} секунд")
+        # Таймаут тоже учитываем, чтобы при медленном сайте ожидание росло
+        page_load_timeout.record(timeout)
+        print(f"  ✗ Страница не загрузилась за {timeout:.1f} секунд")
         return False
 
 
@@ -177,34 +332,210 @@ def wait_for_manual_authorization(driver, url, external_script):
     print("Авторизация завершена, продолжаю работу...")
 
 
-def wait_for_first_journal(driver, url, external_script, save_dir):
-    """Ожидание подтверждения для первого журнала"""
-    print(f"Открываю первый журнал: {url}")
-    driver.get(url)
-    
-    
-    # Внедряем скрипт на страницу первого журнала
-    if external_script:
-        inject_script_to_page(driver, external_script)
+class CrawlContext:
+    """Общие для всех драйверов параметры и состояние одного запуска загрузки"""
+
+    def __init__(self, data, external_script, progress, host_limiter=None, store=None, pause=0.0,
+                 incremental=False, screenshots=None, headless=False, block_resources=False,
+                 blocked_urls=None, capture="page", api_capture="monitor", capture_urls=None,
+                 max_attempts=3, retry_delay=30.0, retry_at_end=False, rate_limiter=None,
+                 metrics=None, catalog=None):
+        self.data = data
+        self.external_script = external_script
+        self.progress = progress  # журнал прогресса (ProgressLog)
+        self.host_limiter = host_limiter  # ограничение одновременных загрузок с одного хоста
+        self.store = store  # хранилище снимков (SnapshotStore) или None для обычных файлов
+        self.pause = pause  # пауза между журналами в секундах
+        self.incremental = incremental  # пропускать журналы, не изменившиеся с прошлого снимка
+        self.screenshots = screenshots or ScreenshotWriter()  # политика и фоновая запись скриншотов
+        # Профиль драйверов, работающих после авторизации
+        self.headless = headless
+        self.block_resources = block_resources
+        self.blocked_urls = blocked_urls or []
+        self.capture = capture  # page - вся страница, table - только таблица журнала
+        # monitor - ответы API из window.apiMonitor, cdp - из событий Network драйвера
+        self.api_capture = api_capture
+        self.capture_urls = capture_urls or DEFAULT_URL_ALLOWLIST
+        self._network_captures = {}
+        # Повторы журналов, которые не удалось загрузить
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.retry_at_end = retry_at_end
+        # Общее ограничение частоты загрузок (TokenBucket) - включает асинхронную оркестровку
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics or CrawlMetrics()  # время этапов загрузки журналов
+        # Каталог в SQLite (catalog.py) для поиска необработанных журналов и последних снимков или None
+        self.catalog = catalog
+        self.current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # В инкрементальном режиме журнал считается обработанным, если у него есть сохранение за сегодня
+        self.run_date = self.current_date[:10] if incremental else None
+        # Сессия и шаблоны легких запросов к API для проверки изменений журнала
+        self.probe_session = None
+        self.probe_templates = []
+        # Заголовки запросов браузера к API (авторизация, профиль) - только в памяти
+        self.request_headers = {}
+        self.save_dir = ensure_save_directory()
+        self.stats_lock = threading.Lock()
+        self.processed_count = 0
+
+    def get_network_capture(self, driver):
+        """Сборщик ответов API через CDP для драйвера или None, если используется window.apiMonitor"""
+        if self.api_capture != "cdp":
+            return None
+        with self.stats_lock:
+            if id(driver) not in self._network_captures:
+                self._network_captures[id(driver)] = NetworkCapture(driver, self.capture_urls)
+            return self._network_captures[id(driver)]
+
+    def remember_request_headers(self, headers):
+        if headers:
+            with self.stats_lock:
+                self.request_headers.update(headers)
+
+    def count_processed(self):
+        with self.stats_lock:
+            self.processed_count += 1
+
+
+# Снимок только таблицы журнала: анализаторам нужна лишь первая table страницы.
+# Вокруг нее - минимальный документ с заголовком и адресом страницы
+TABLE_CAPTURE_SCRIPT = """
+const table = document.querySelector('table');
+if (!table) {
+    return null;
+}
+const escape = (text) => text.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/"/g, '&quot;');
+return '<!DOCTYPE html><html><head><meta charset="utf-8">'
+    + '<title>' + escape(document.title) + '</title>'
+    + '<meta name="journal-url" content="' + escape(location.href) + '">'
+    + '</head><body>' + table.outerHTML + '</body></html>';
+"""
+
+
+def capture_page_html(driver, ctx):
+    """
+    Возвращает (HTML для сохранения, что сохранено: "page" или "table"): всю страницу
+    или только таблицу журнала (ctx.capture == "table").
+    Если таблицы на странице нет, сохраняется вся страница - чтобы было видно, что пошло не так
+    """
+    if ctx.capture == "table":
+        table_html = driver.execute_script(TABLE_CAPTURE_SCRIPT)
+        if table_html:
+            return table_html, "table"
+        print("  ⚠ Таблица журнала не найдена, сохраняю страницу целиком")
+    return driver.page_source, "page"
+
+
+def save_snapshot(ctx, content, journal_id, kind):
+    """
+    Сохраняет HTML (kind="html") или ответы API (kind="api") журнала
+    в хранилище снимков либо в save/<дата>/.
+    Возвращает поля записи save со ссылкой на снимок
+    """
+    if ctx.store:
+        key = "blob" if kind == "html" else "api_blob"
+        return {key: ctx.store.put(content)}
     
-    # Ждем загрузки страницы
-    page_loaded = wait_for_page_load(driver)
-    # Ждем полсекунды после внедрения скрипта
-    time.sleep(0.5)
+    if kind == "html":
+        file_path = save_html_to_file(content, journal_id, ctx.save_dir)
+        return {"file": file_path} if file_path else {}
     
-    journal_id = url.split('/')[-1]  # Извлекаем ID журнала из URL
+    filename = journal_id + "_api.json"
+    with open(os.path.join(ctx.save_dir, filename), 'w', encoding='utf-8') as f:
+        f.write(content)
+    return {"api_file": os.path.join("save", os.path.basename(ctx.save_dir), filename)}
+
+
+def save_api_monitor_data(driver, journal_id, ctx):
+    """
+    Забирает ответы API из window.apiMonitor и сохраняет их.
+    Возвращает поля записи save со ссылкой на снимок (пустой словарь, если монитора нет)
+    """
     api_data_json = driver.execute_script("return window.apiMonitor ? window.apiMonitor.getJSON() : 'Monitor not found';")
     if api_data_json == 'Monitor not found':
         print("Ошибка: объект window.apiMonitor не найден на странице.")
+        return {}
+
+    parsed_data = json.loads(api_data_json)
+    # Заголовки авторизации нужны только для сессии API и на диск не пишутся
+    ctx.remember_request_headers(pop_request_headers(parsed_data))
+    if ctx.rate_limiter:
+        ctx.rate_limiter.observe(parsed_data)
+    content = json.dumps(parsed_data, indent=2, ensure_ascii=False)
+    api_ref = save_snapshot(ctx, content, journal_id, "api")
+    
+    # Отпечаток для инкрементального режима: по нему следующий запуск поймет, менялся ли журнал
+    fingerprint = compute_api_fingerprint(parsed_data, journal_id, ctx.probe_templates or None)
+    if fingerprint:
+        api_ref["fingerprint"] = fingerprint
+    return api_ref
+
+
+def save_network_capture_data(network, journal_id, ctx):
+    """
+    Завершает перехват ответов API через CDP. Ответы уже дописаны в <ID>_api.json;
+    при работе с хранилищем снимков файл переносится в хранилище.
+    Возвращает поля записи save со ссылкой на снимок
+    """
+    records = network.finish()
+    ctx.remember_request_headers(network.request_headers)
+    if ctx.rate_limiter:
+        ctx.rate_limiter.observe(records)
+    file_path = os.path.join(ctx.save_dir, journal_id + "_api.json")
+    
+    if ctx.store:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            api_ref = {"api_blob": ctx.store.put(f.read())}
+        os.remove(file_path)
     else:
-        parsed_data = json.loads(api_data_json)
-        output_file_path = os.path.join(save_dir, journal_id + "_api.json")
-        
-        with open(output_file_path, 'w', encoding='utf-8') as f:
-            json.dump(parsed_data, f, indent=2, ensure_ascii=False)
-    # Делаем скриншот
+        api_ref = {"api_file": os.path.join("save", os.path.basename(ctx.save_dir), journal_id + "_api.json")}
+    
+    fingerprint = compute_api_fingerprint(records, journal_id, ctx.probe_templates or None)
+    if fingerprint:
+        api_ref["fingerprint"] = fingerprint
+    return api_ref
+
+
+def open_journal_page(driver, url, journal_id, ctx, timer):
+    """
+    Открывает страницу журнала, внедряет скрипт, ждет загрузки и сохраняет ответы API.
+    Время этапов записывается в timer.
+    Возвращает (загрузилась ли страница, ссылка на данные API)
+    """
+    network = ctx.get_network_capture(driver)
+    if network:
+        network.start(os.path.join(ctx.save_dir, journal_id + "_api.json"))
+    
+    with timer.stage("navigation"):
+        driver.get(url)
+    
+    # Внедряем скрипт сразу после загрузки страницы
+    if ctx.external_script:
+        with timer.stage("script_injection"):
+            inject_script_to_page(driver, ctx.external_script)
+    
+    # Ждем загрузки страницы
+    with timer.stage("readiness_wait"):
+        page_loaded = wait_for_page_load(driver, network=network)
+    
+    with timer.stage("api_extraction"):
+        if network:
+            api_ref = save_network_capture_data(network, journal_id, ctx)
+        else:
+            api_ref = save_api_monitor_data(driver, journal_id, ctx)
+    return page_loaded, api_ref
+
+
+def wait_for_first_journal(driver, url, ctx, timer):
+    """Ожидание подтверждения для первого журнала"""
+    print(f"Открываю первый журнал: {url}")
     
-    screenshot_path = take_screenshot(driver, journal_id, save_dir)
+    journal_id = url.split('/')[-1]  # Извлекаем ID журнала из URL
+    page_loaded, api_ref = open_journal_page(driver, url, journal_id, ctx, timer)
+
+    # Делаем скриншот
+    with timer.stage("screenshot"):
+        screenshot = take_screenshot(driver, journal_id, page_loaded, ctx)
     
     print("Первый журнал загружен!")
     print("Убедитесь, что страница загрузилась корректно...")
@@ -214,204 +545,806 @@ def wait_for_first_journal(driver, url, external_script, save_dir):
     input("Нажмите Enter для продолжения...")
     
     print("Первый журнал подтвержден, продолжаю автоматическую работу...")
-    return driver.page_source, page_loaded, screenshot_path
+    with timer.stage("html_capture"):
+        page_html, capture = capture_page_html(driver, ctx)
+    return page_html, capture, page_loaded, screenshot, api_ref
+
+
+def download_journal(driver, url, journal_id, ctx, timer):
+    """
+    Автоматически загружает журнал: открывает страницу, внедряет скрипт,
+    сохраняет данные API и скриншот.
+    Возвращает (HTML страницы, что сохранено: "page" или "table", загрузилась ли страница,
+    Future записи скриншота или None, ссылка на данные API)
+    """
+    page_loaded, api_ref = open_journal_page(driver, url, journal_id, ctx, timer)
 
+    # Делаем скриншот
+    with timer.stage("screenshot"):
+        screenshot = take_screenshot(driver, journal_id, page_loaded, ctx)
+    
+    with timer.stage("html_capture"):
+        page_html, capture = capture_page_html(driver, ctx)
+    
+    if page_loaded:
+        print(f"  ✓ Страница загружена автоматически")
+    else:
+        print(f"  ⚠ Страница загружена не полностью")
+    
+    return page_html, capture, page_loaded, screenshot, api_ref
+
+
+def journal_needs_processing(journal, run_date=None):
+    """
+    Нужно ли обрабатывать журнал.
+    Без run_date - если у журнала нет сохранений, с run_date - если нет сохранения за эту дату
+    """
+    saves = journal.get("save") or []
+    if run_date is None:
+        return not saves
+    return not any(save.get("date", "").startswith(run_date) for save in saves)
 
-def find_next_journal_to_process(data):
+
+def find_next_journal_to_process(data, run_date=None):
     """Находит следующий журнал для обработки (без сохраненной страницы)"""
     for class_idx, class_item in enumerate(data.get("classes", [])):
         for journal_idx, journal in enumerate(class_item.get("journals", [])):
             # Если у журнала нет сохраненных данных или массив save пустой
-            if "save" not in journal or not journal["save"]:
+            if journal_needs_processing(journal, run_date):
                 return class_idx, journal_idx, class_item, journal
     return None, None, None, None
 
 
-def process_journals(driver, data, external_script):
-    """Обработка журналов с продолжением с места остановки"""
-    current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    save_dir = ensure_save_directory()
+def collect_pending_journals(data, run_date=None, catalog=None):
+    """
+    Возвращает список (индекс класса, индекс журнала) всех необработанных журналов в порядке обхода.
+    С каталогом (catalog.py) журналы ищутся по индексу, без обхода дерева
+    """
+    if catalog:
+        return catalog.pending_journals(run_date)
+    pending = []
+    for class_idx, class_item in enumerate(data.get("classes", [])):
+        for journal_idx, journal in enumerate(class_item.get("journals", [])):
+            if journal_needs_processing(journal, run_date):
+                pending.append((class_idx, journal_idx))
+    return pending
+
+
+def find_last_snapshot(journal, catalog=None):
+    """
+    Последнее успешное сохранение журнала со снимком страницы или ответов API.
+    С каталогом (catalog.py) сохранение ищется по индексу
+    """
+    if catalog:
+        return catalog.last_snapshot(journal)
+    for save in reversed(journal.get("save") or []):
+        if save.get("error") or save.get("unchanged"):
+            continue
+        if save.get("file") or save.get("blob") or save.get("api_file") or save.get("api_blob"):
+            return save
+    return None
+
+
+def get_snapshot_fingerprint(save, journal_id, templates):
+    """
+    Отпечаток сохранения по шаблонам легкой проверки: из записи save, если он посчитан
+    по тем же шаблонам, иначе заново по сохраненным ответам API
+    """
+    fingerprint = save.get("fingerprint")
+    if fingerprint and fingerprint.get("templates") == sorted(templates):
+        return fingerprint
+    api_content = read_save_api(save)
+    if api_content is None:
+        return None
+    return compute_api_fingerprint(json.loads(api_content), journal_id, templates)
+
+
+def setup_api_session(driver, ctx, journal, pool_size=1):
+    """
+    Создает сессию requests с cookies браузера по ответам API, сохраненным для journal,
+    и заголовкам запросов, перехваченным в этом запуске (ctx.request_headers).
+    Возвращает (сессия, шаблоны запросов) или (None, []), если ответов API нет
+    """
+    api_content = read_save_api(journal["save"][-1]) if journal.get("save") else None
+    if api_content is None:
+        print("✗ Не найдены ответы API первого журнала")
+        return None, []
     
-    print(f"HTML файлы и скриншоты сохраняются в: {save_dir}")
+    api_records = json.loads(api_content)
+    templates = build_endpoint_templates(api_records, journal["ID"])
+    if not templates:
+        print("✗ Не удалось определить запросы к API для журналов")
+        return None, []
     
-    # Находим первый необработанный журнал
-    class_idx, journal_idx, class_item, journal = find_next_journal_to_process(data)
+    session = create_api_session(
+        driver.get_cookies(),
+        # Старые снимки могли сохранить заголовки в файле
+        headers=ctx.request_headers or collect_request_headers(api_records),
+        user_agent=driver.execute_script("return navigator.userAgent;"),
+        pool_size=pool_size
+    )
+    return session, templates
+
+
+def record_if_unchanged(ctx, journal):
+    """
+    Инкрементальный режим: легким запросом к API проверяет, менялся ли журнал
+    с последнего снимка. Если нет - добавляет запись "без изменений" со ссылкой
+    на этот снимок и возвращает True
+    """
+    if not ctx.probe_session or not ctx.probe_templates:
+        return False
     
-    if class_idx is None:
+    last_snapshot = find_last_snapshot(journal, ctx.catalog)
+    if last_snapshot is None:
+        return False
+    
+    try:
+        last_fingerprint = get_snapshot_fingerprint(last_snapshot, journal["ID"], ctx.probe_templates)
+        if last_fingerprint is None:
+            return False
+        
+        records = fetch_journal_api(ctx.probe_session, ctx.probe_templates, journal["ID"],
+                                    rate_limiter=ctx.rate_limiter)
+        if ctx.rate_limiter:
+            ctx.rate_limiter.observe(records)
+        if any(record["status"] != 200 for record in records):
+            return False
+        
+        if compute_api_fingerprint(records, journal["ID"], ctx.probe_templates) != last_fingerprint:
+            return False
+    except Exception as e:
+        print(f"  ⚠ Не удалось проверить изменения журнала: {e}")
+        return False
+    
+    save_entry = {
+        "date": ctx.current_date,
+        "unchanged": True,
+        "unchanged_since": last_snapshot.get("date"),
+        "fingerprint": last_fingerprint
+    }
+    # Ссылка на снимок, которому соответствует журнал
+    for key in ("file", "blob", "api_file", "api_blob"):
+        if last_snapshot.get(key):
+            save_entry["same_as_" + key] = last_snapshot[key]
+    
+    ctx.progress.append(journal, save_entry)
+    print(f"  ✓ Журнал не изменился с {last_snapshot.get('date')}, снимок не нужен")
+    return True
+
+
+class HostLimiter:
+    """Ограничивает число одновременных загрузок страниц с одного хоста"""
+
+    def __init__(self, max_per_host):
+        self.max_per_host = max_per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+            semaphore = self._semaphores[host]
+        with semaphore:
+            yield
+
+
+def setup_worker_driver(worker_idx, cookies, url, ctx):
+    """Создает драйвер рабочего потока и переносит в него cookies авторизации"""
+    driver = setup_driver(
+        profile_name=f"chrome_profile_worker_{worker_idx}",
+        headless=ctx.headless,
+        block_resources=ctx.block_resources,
+        blocked_urls=ctx.blocked_urls,
+        capture_network=ctx.api_capture == "cdp"
+    )
+    
+    # Cookies можно добавить только находясь на странице нужного домена
+    driver.get(url)
+    copied = 0
+    for cookie in cookies:
+        try:
+            driver.add_cookie(cookie)
+            copied += 1
+        except Exception:
+            # Cookies других доменов (например, страницы входа) пропускаем
+            pass
+    
+    print(f"[Поток {worker_idx}] Перенесено cookies: {copied} из {len(cookies)}")
+    return driver
+
+
+def commit_save_entry(ctx, journal, save_entry, screenshot=None):
+    """
+    Дописывает запись о сохранении в журнал прогресса сразу.
+    Если скриншот еще записывается в фоне, путь к нему дописывается
+    отдельной записью журнала после завершения записи файла
+    """
+    ctx.progress.append(journal, save_entry)
+    print(f"  ✓ Запись добавлена в журнал прогресса")
+    if screenshot is None:
+        return
+    
+    def on_screenshot_written(future):
+        try:
+            ctx.progress.update(journal, save_entry, {"screenshot": future.result()})
+        except Exception as e:
+            print(f"  ✗ Ошибка сохранения скриншота журнала {journal['ID']}: {e}")
+    
+    screenshot.add_done_callback(on_screenshot_written)
+
+
+def process_journal(driver, ctx, journal, first_journal=False):
+    """
+    Обрабатывает один журнал: загружает страницу, сохраняет HTML и
+    добавляет запись о сохранении в журнал прогресса.
+    Время этапов попадает в запись save и в ctx.metrics (первый журнал с ручной
+    авторизацией в сводку не входит).
+    Возвращает True, если страница загрузилась и запись сохранена
+    """
+    timer = StageTimer()
+    success = False
+    try:
+        success = load_and_save_journal(driver, ctx, journal, timer, first_journal)
+        return success
+    finally:
+        ctx.metrics.record(journal["ID"], timer, success, manual=first_journal)
+
+
+def load_and_save_journal(driver, ctx, journal, timer, first_journal=False):
+    """Загрузка и сохранение одного журнала (см. process_journal)"""
+    # Формируем целевую ссылку
+    target_url = ctx.data["baseURL"] + journal["ID"]
+    print(f"  Журнал: {journal['name']}")
+    print(f"  URL: {target_url}")
+    print(f"  ID: {journal['ID']}")
+    
+    if ctx.incremental and not first_journal:
+        with timer.stage("change_check"):
+            unchanged = record_if_unchanged(ctx, journal)
+        if unchanged:
+            return True
+    
+    try:
+        if first_journal:
+            # Для первого журнала ждем подтверждения; его загрузка тоже расходует токен
+            if ctx.rate_limiter:
+                ctx.rate_limiter.wait()
+            page_html, capture, page_loaded, screenshot, api_ref = wait_for_first_journal(
+                driver, target_url, ctx, timer
+            )
+        elif ctx.host_limiter:
+            with ctx.host_limiter.slot(target_url):
+                page_html, capture, page_loaded, screenshot, api_ref = download_journal(
+                    driver, target_url, journal["ID"], ctx, timer
+                )
+        else:
+            # Для остальных журналов работаем автоматически
+            page_html, capture, page_loaded, screenshot, api_ref = download_journal(
+                driver, target_url, journal["ID"], ctx, timer
+            )
+        
+        # Сохраняем HTML в файл или хранилище снимков
+        with timer.stage("html_write"):
+            html_ref = save_snapshot(ctx, page_html, journal["ID"], "html")
+        
+        if not html_ref:
+            print("  ✗ Не удалось сохранить HTML файл")
+            return False
+        
+        # Создаем запись о сохранении со ссылкой на снимок
+        save_entry = {
+            "date": ctx.current_date,
+            **html_ref,  # Путь к файлу или ID снимка вместо HTML
+            **api_ref,  # Ссылка на сохраненные ответы API
+            "script_injected": ctx.external_script is not None,  # Отмечаем факт внедрения скрипта
+            "screenshot": None  # Путь к скриншоту (заполняется после записи файла)
+        }
+        if capture == "table":
+            save_entry["capture"] = "table"  # Сохранена только таблица журнала
+        
+        # Добавляем ошибку если страница не загрузилась
+        if not page_loaded:
+            save_entry["error"] = "не загрузилась страница"
+            print(f"  ⚠ Добавлена ошибка: страница не загрузилась полностью")
+        
+        print(f"  ✓ HTML сохранен: {list(html_ref.values())[0]}")
+        
+        # Время этапов до записи в журнал прогресса
+        save_entry["timings"] = timer.rounded()
+        
+        # Дописываем запись в журнал прогресса (data.json пересобирается периодически)
+        try:
+            with timer.stage("progress_save"):
+                commit_save_entry(ctx, journal, save_entry, screenshot)
+            return page_loaded
+        except Exception as e:
+            print(f"  ✗ Ошибка сохранения данных: {e}")
+            return False
+        
+    except Exception as e:
+        print(f"  ✗ Ошибка при обработке журнала: {e}")
+        return False
+
+
+def journal_worker(worker_idx, cookies, ctx, work):
+    """Рабочий поток пула: забирает журналы из очереди работы, пока она не опустеет"""
+    try:
+        driver = setup_worker_driver(worker_idx, cookies, ctx.data["baseURL"], ctx)
+    except Exception as e:
+        print(f"[Поток {worker_idx}] Не удалось запустить драйвер: {e}")
+        return
+    
+    def handle(item):
+        class_item, journal = get_journal(ctx.data, item)
+        print(f"[Поток {worker_idx}] Класс: {class_item['name']}")
+        return process_journal(driver, ctx, journal)
+    
+    try:
+        drain_work_queue(ctx, work, handle)
+    finally:
+        driver.quit()
+        print(f"[Поток {worker_idx}] Драйвер закрыт")
+
+
+def run_worker_pool(driver, ctx, work, workers):
+    """
+    Обрабатывает журналы из очереди работы пулом из нескольких драйверов.
+    Все драйверы используют cookies авторизации основного драйвера
+    """
+    cookies = driver.get_cookies()
+    
+    print(f"Запускаю пул из {workers} драйверов...")
+    
+    threads = []
+    for worker_idx in range(1, workers + 1):
+        thread = threading.Thread(
+            target=journal_worker,
+            args=(worker_idx, cookies, ctx, work),
+            daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+    
+    for thread in threads:
+        thread.join()
+
+
+def run_orchestrated(driver, ctx, work, workers, use_worker_drivers):
+    """
+    Обрабатывает журналы из очереди работы асинхронным оркестратором
+    с общим ограничением частоты загрузок ctx.rate_limiter
+    """
+    drivers = []
+    try:
+        if use_worker_drivers:
+            cookies = driver.get_cookies()
+            for worker_idx in range(1, workers + 1):
+                try:
+                    drivers.append(setup_worker_driver(worker_idx, cookies, ctx.data["baseURL"], ctx))
+                except Exception as e:
+                    print(f"[Поток {worker_idx}] Не удалось запустить драйвер: {e}")
+            if not drivers:
+                return
+        else:
+            drivers = [driver]
+        
+        limiter = ctx.rate_limiter
+        print(f"Асинхронная загрузка: драйверов {len(drivers)}, "
+              f"не больше {limiter.rate:g} загрузок в секунду (подряд до {limiter.burst})")
+        CrawlOrchestrator(ctx, drivers, limiter, process_journal).run(work, get_journal)
+    finally:
+        if use_worker_drivers:
+            for worker_driver in drivers:
+                worker_driver.quit()
+
+
+def get_journal(data, item):
+    """Класс и журнал по паре (индекс класса, индекс журнала)"""
+    class_idx, journal_idx = item
+    class_item = data["classes"][class_idx]
+    return class_item, class_item["journals"][journal_idx]
+
+
+def create_work_queue(ctx, pending_journals):
+    """Очередь работы с повторами для списка (индекс класса, индекс журнала)"""
+    items = [(get_journal(ctx.data, item)[1]["ID"], item) for item in pending_journals]
+    return RetryQueue(
+        items,
+        max_attempts=ctx.max_attempts,
+        base_delay=ctx.retry_delay,
+        interleave=not ctx.retry_at_end
+    )
+
+
+def drain_work_queue(ctx, work, handler):
+    """
+    Обрабатывает задачи очереди, пока работа не закончится.
+    handler(item) возвращает True при успешной загрузке журнала
+    """
+    while True:
+        task = work.get()
+        if task is None:
+            break
+        
+        key, item = task
+        success = False
+        try:
+            success = handler(item)
+        except Exception as e:
+            print(f"  ✗ Ошибка при обработке журнала {key}: {e}")
+        finally:
+            work.task_done(key, item, success)
+        
+        if success:
+            ctx.count_processed()
+        
+        # Необязательная пауза между запросами
+        if ctx.pause:
+            time.sleep(ctx.pause)
+
+
+def print_run_summary(work):
+    """Печатает итоги запуска и возвращает их"""
+    summary = work.summary()
+    print(f"Журналов: {summary['journals']}, успешно: {summary['succeeded']}, "
+          f"с ошибкой: {summary['failed']}, не обработано: {summary['pending']}, "
+          f"восстановлено повтором: {summary['recovered_by_retry']}")
+    print(f"Доля успешных загрузок: {summary['success_rate']:.1%}")
+    return summary
+
+
+def process_journals(driver, ctx, workers=1):
+    """
+    Обработка журналов с продолжением с места остановки
+
+    workers - количество одновременно работающих драйверов
+    """
+    data = ctx.data
+    print(f"HTML файлы и скриншоты сохраняются в: {ctx.save_dir}")
+    
+    # Находим все необработанные журналы
+    pending_journals = collect_pending_journals(data, ctx.run_date, ctx.catalog)
+    
+    if not pending_journals:
         print("Все журналы уже обработаны!")
         return data
     
+    first_item = pending_journals[0]
+    class_item, journal = get_journal(data, first_item)
     print(f"Начинаю обработку с класса '{class_item['name']}', журнал '{journal['name']}'")
     
-    first_journal = True
-    processed_count = 0
+    work = create_work_queue(ctx, pending_journals[1:])
+    
+    # Первый журнал всегда обрабатывается основным драйвером с подтверждением
+    print(f"Обрабатываю класс: {class_item['name']}")
+    first_loaded = process_journal(driver, ctx, journal, first_journal=True)
+    if first_loaded:
+        ctx.count_processed()
+    # При неудаче первый журнал уходит в очередь повторов как обычный
+    work.add_result(journal["ID"], first_item, first_loaded)
+    
+    if ctx.incremental:
+        # По ответам API первого журнала готовим легкие запросы для проверки изменений
+        session, templates = setup_api_session(driver, ctx, journal, pool_size=max(workers, 1))
+        ctx.probe_session = session
+        ctx.probe_templates = select_probe_templates(templates)
+        if not ctx.probe_templates:
+            print("⚠ Проверка изменений недоступна, все журналы будут загружены заново")
     
-    # Обрабатываем начиная с найденного журнала
-    for current_class_idx in range(class_idx, len(data.get("classes", []))):
-        current_class = data["classes"][current_class_idx]
+    # Для работы без окна или с блокировкой ресурсов нужны отдельные драйверы:
+    # основной драйвер остается обычным, в нем выполнялся вход
+    use_worker_drivers = workers > 1 or ctx.headless or ctx.block_resources
+    # Если первый журнал был единственным и загрузился, драйверы не запускаем
+    remaining = work.pending()
+    
+    if remaining and ctx.rate_limiter:
+        run_orchestrated(driver, ctx, work, min(workers, remaining), use_worker_drivers)
+    elif remaining and use_worker_drivers:
+        run_worker_pool(driver, ctx, work, min(workers, remaining))
+    else:
+        current_class = {"name": class_item["name"]}
         
-        # Определяем с какого журнала начинать в текущем классе
-        start_journal_idx = journal_idx if current_class_idx == class_idx else 0
+        def handle(item):
+            next_class, next_journal = get_journal(data, item)
+            if next_class["name"] != current_class["name"]:
+                print(f"Обрабатываю класс: {next_class['name']}")
+                current_class["name"] = next_class["name"]
+            return process_journal(driver, ctx, next_journal)
         
-        print(f"Обрабатываю класс: {current_class['name']}")
+        drain_work_queue(ctx, work, handle)
+    
+    print(f"Обработка завершена. Обработано журналов: {ctx.processed_count}")
+    print_run_summary(work)
+    ctx.metrics.print_summary()
+    return data
+
+
+def fetch_journal_via_api(session, templates, ctx, journal):
+    """
+    Загружает данные журнала напрямую через API (без браузера) и
+    добавляет запись о сохранении в журнал прогресса.
+    Время этапов попадает в запись save и в ctx.metrics.
+    Возвращает True, если данные получены без ошибок
+    """
+    timer = StageTimer()
+    success = False
+    try:
+        success = fetch_and_save_journal(session, templates, ctx, journal, timer)
+        return success
+    finally:
+        ctx.metrics.record(journal["ID"], timer, success, mode="api")
+
+
+def fetch_and_save_journal(session, templates, ctx, journal, timer):
+    """Загрузка и сохранение одного журнала через API (см. fetch_journal_via_api)"""
+    print(f"  Журнал (API): {journal['name']} ({journal['ID']})")
+    if ctx.incremental:
+        with timer.stage("change_check"):
+            unchanged = record_if_unchanged(ctx, journal)
+        if unchanged:
+            return True
+    
+    save_entry = {
+        "date": ctx.current_date,
+        "mode": "api"
+    }
+    
+    try:
+        with timer.stage("api_fetch"):
+            records = fetch_journal_api(session, templates, journal["ID"], rate_limiter=ctx.rate_limiter)
+        if ctx.rate_limiter:
+            ctx.rate_limiter.observe(records)
+        with timer.stage("api_write"):
+            content = json.dumps(records, indent=2, ensure_ascii=False)
+            save_entry.update(save_snapshot(ctx, content, journal["ID"], "api"))
+        fingerprint = compute_api_fingerprint(records, journal["ID"], ctx.probe_templates or None)
+        if fingerprint:
+            save_entry["fingerprint"] = fingerprint
         
-        for current_journal_idx in range(start_journal_idx, len(current_class.get("journals", []))):
-            current_journal = current_class["journals"][current_journal_idx]
-            
-            # Пропускаем уже обработанные журналы (на всякий случай)
-            if "save" in current_journal and current_journal["save"]:
-                print(f"  Пропускаю уже обработанный журнал: {current_journal['name']}")
-                continue
-            
-            # Формируем целевую ссылку
-            target_url = data["baseURL"] + current_journal["ID"]
-            print(f"  Журнал: {current_journal['name']}")
-            print(f"  URL: {target_url}")
-            print(f"  ID: {current_journal['ID']}")
-            
-            try:
-                if first_journal:
-                    # Для первого журнала ждем подтверждения
-                    driver.get(target_url)
-                    
-                    # Ждем загрузки, внедряем скрипт, делаем скриншот и ждем подтверждения
-                    page_html, page_loaded, screenshot_path = wait_for_first_journal(
-                        driver, target_url, external_script, save_dir
-                    )
-                    first_journal = False
-                    
-                else:
-                    # Для остальных журналов работаем автоматически
-                    driver.get(target_url)
-                    
-                    
-                    # Внедряем скрипт сразу после загрузки страницы
-                    script_injected = False
-                    if external_script:
-                        script_injected = inject_script_to_page(driver, external_script)
-                    
-                    # Ждем загрузки страницы
-                    page_loaded = wait_for_page_load(driver)
-                    # Ждем полсекунды после внедрения скрипта
-                    time.sleep(0.5)
-                    api_data_json = driver.execute_script("return window.apiMonitor ? window.apiMonitor.getJSON() : 'Monitor not found';")
-                    if api_data_json == 'Monitor not found':
-                        print("Ошибка: объект window.apiMonitor не найден на странице.")
-                    else:
-                        parsed_data = json.loads(api_data_json)
-                        output_file_path = os.path.join(save_dir, current_journal["ID"] + "_api.json")
-
-                        with open(output_file_path, 'w', encoding='utf-8') as f:
-                            json.dump(parsed_data, f, indent=2, ensure_ascii=False)
-    # Делаем скриншот
-                    # Делаем скриншот
-                    screenshot_path = take_screenshot(driver, current_journal["ID"], save_dir)
-                    
-                    page_html = driver.page_source
-                    
-                    if page_loaded:
-                        print(f"  ✓ Страница загружена автоматически")
-                    else:
-                        print(f"  ⚠ Страница загружена не полностью")
-                
-                # Сохраняем HTML в файл
-                file_path = save_html_to_file(page_html, current_journal["ID"], save_dir)
-                
-                if file_path:
-                    # Создаем запись о сохранении с путем к файлу
-                    save_entry = {
-                        "date": current_date,
-                        "file": file_path,  # Сохраняем путь к файлу вместо HTML
-                        "script_injected": external_script is not None,  # Отмечаем факт внедрения скрипта
-                        "screenshot": screenshot_path if screenshot_path else None  # Путь к скриншоту
-                    }
-                    
-                    # Добавляем ошибку если страница не загрузилась
-                    if not page_loaded:
-                        save_entry["error"] = "не загрузилась страница"
-                        print(f"  ⚠ Добавлена ошибка: страница не загрузилась полностью")
-                    
-                    # Добавляем в журнал
-                    if "save" not in current_journal:
-                        current_journal["save"] = []
-                    
-                    current_journal["save"].append(save_entry)
-                    print(f"  ✓ HTML сохранен в файл: {file_path}")
-                    
-                    # НЕМЕДЛЕННО СОХРАНЯЕМ В ИСХОДНЫЙ ФАЙЛ
-                    if save_json_data("data.json", data):
-                        print(f"  ✓ Данные сохранены в исходный файл")
-                        processed_count += 1
-                    else:
-                        print("  ✗ Ошибка сохранения данных")
-                else:
-                    print("  ✗ Не удалось сохранить HTML файл")
-                
-            except Exception as e:
-                print(f"  ✗ Ошибка при обработке журнала: {e}")
-                # При ошибке все равно сохраняем прогресс
-                try:
-                    save_json_data("data.json", data)
-                    print(f"  ✓ Прогресс сохранен несмотря на ошибку")
-                except:
-                    print("  ✗ Не удалось сохранить прогресс")
-            
-            # Небольшая пауза между запросами
-            time.sleep(2)
+        failed = [record for record in records if record["status"] != 200]
+        if failed:
+            save_entry["error"] = f"ошибка API: {failed[0]['status']} {failed[0]['url']}"
+    except Exception as e:
+        save_entry["error"] = f"ошибка API: {e}"
+    
+    if "error" in save_entry:
+        print(f"  ✗ {journal['ID']}: {save_entry['error']}")
+    
+    save_entry["timings"] = timer.rounded()
+    try:
+        with timer.stage("progress_save"):
+            ctx.progress.append(journal, save_entry)
+    except Exception as e:
+        print(f"  ✗ Ошибка сохранения данных: {e}")
+        return False
+    
+    return "error" not in save_entry
+
+
+def process_journals_via_api(driver, ctx, workers=1):
+    """
+    Обработка журналов через API без рендеринга страниц.
+    Первый журнал загружается браузером с подтверждением: по его _api.json
+    определяются шаблоны запросов и заголовки авторизации. Остальные журналы
+    запрашиваются напрямую через requests.Session с cookies браузера
+    """
+    data = ctx.data
+    pending_journals = collect_pending_journals(data, ctx.run_date, ctx.catalog)
+    
+    if not pending_journals:
+        print("Все журналы уже обработаны!")
+        return data
+    
+    first_item = pending_journals[0]
+    _, first_journal = get_journal(data, first_item)
+    
+    # Первый журнал загружаем браузером, чтобы перехватить запросы к API
+    first_loaded = process_journal(driver, ctx, first_journal, first_journal=True)
+    if first_loaded:
+        ctx.count_processed()
+    
+    session, templates = setup_api_session(driver, ctx, first_journal, pool_size=max(workers, 1))
+    if session is None:
+        print("✗ Загрузка через API невозможна")
+        return data
     
-    print(f"Обработка завершена. Обработано журналов: {processed_count}")
+    print(f"Найдено запросов к API на журнал: {len(templates)}")
+    ctx.probe_session = session
+    ctx.probe_templates = select_probe_templates(templates)
+    
+    work = create_work_queue(ctx, pending_journals[1:])
+    # При неудаче первый журнал повторяется уже через API
+    work.add_result(first_journal["ID"], first_item, first_loaded)
+    
+    def handle(item):
+        return fetch_journal_via_api(session, templates, ctx, get_journal(data, item)[1])
+    
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        for _ in range(max(workers, 1)):
+            executor.submit(drain_work_queue, ctx, work, handle)
+    
+    print(f"Обработка через API завершена. Обработано журналов: {ctx.processed_count}")
+    print_run_summary(work)
+    ctx.metrics.print_summary()
     return data
 
 
+def parse_args():
+    """Разбор параметров командной строки"""
+    parser = argparse.ArgumentParser(description="Загрузка журналов из classes_data.json")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="количество одновременно работающих драйверов (по умолчанию 1)")
+    parser.add_argument("--per-host-limit", type=int, default=None,
+                        help="максимум одновременных загрузок страниц с одного хоста")
+    parser.add_argument("--pause", type=float, default=0.0,
+                        help="пауза между журналами в секундах (по умолчанию без паузы)")
+    parser.add_argument("--quiet-window", type=float, default=0.5,
+                        help="сколько секунд без новых ответов API считать страницу загруженной")
+    parser.add_argument("--min-timeout", type=float, default=5.0,
+                        help="нижняя граница адаптивного таймаута загрузки страницы")
+    parser.add_argument("--max-timeout", type=float, default=15.0,
+                        help="верхняя граница адаптивного таймаута загрузки страницы")
+    parser.add_argument("--store", action="store_true",
+                        help="сохранять HTML и ответы API в сжатое хранилище снимков save/blobs")
+    parser.add_argument("--incremental", action="store_true",
+                        help="загружать только журналы без сохранения за сегодня и пропускать не изменившиеся")
+    parser.add_argument("--screenshots", choices=SCREENSHOT_POLICIES, default="always",
+                        help="когда делать скриншоты: always, on-error, never или sampled")
+    parser.add_argument("--screenshot-sample-rate", type=float, default=0.1,
+                        help="доля журналов со скриншотом для политики sampled")
+    parser.add_argument("--screenshot-format", choices=["webp", "png"], default="webp",
+                        help="формат скриншотов (webp требует Pillow, без него - png)")
+    parser.add_argument("--headless", action="store_true",
+                        help="после входа загружать журналы драйверами без окна")
+    parser.add_argument("--block-resources", action="store_true",
+                        help="после входа блокировать картинки, шрифты, медиа и сторонние счетчики")
+    parser.add_argument("--block-url", action="append", default=[],
+                        help="дополнительный шаблон блокируемых URL (можно указать несколько раз)")
+    parser.add_argument("--capture", choices=["page", "table"], default="page",
+                        help="что сохранять: page - всю страницу, table - только таблицу журнала")
+    parser.add_argument("--api-capture", choices=["monitor", "cdp"], default="monitor",
+                        help="откуда брать ответы API: monitor - window.apiMonitor, cdp - события Network Chrome")
+    parser.add_argument("--capture-url", action="append", default=[],
+                        help="регулярное выражение URL ответов API для сохранения в режиме cdp "
+                             "(можно указать несколько раз, по умолчанию - /api/ authedu и /graphql)")
+    parser.add_argument("--max-attempts", type=int, default=3,
+                        help="максимум попыток загрузки одного журнала")
+    parser.add_argument("--retry-delay", type=float, default=30.0,
+                        help="задержка перед первым повтором в секундах (дальше удваивается)")
+    parser.add_argument("--retry-at-end", action="store_true",
+                        help="повторять неудачные журналы только после всех новых")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="не больше указанного числа обращений к серверу в секунду на все драйверы: "
+                             "загрузок страниц журналов в браузере и отдельных запросов к API "
+                             "(в режиме api и при проверке изменений); включает асинхронную загрузку "
+                             "с паузами при ответах 429/5xx")
+    parser.add_argument("--burst", type=int, default=1,
+                        help="сколько обращений можно сделать подряд без ожидания при ограничении --rate")
+    parser.add_argument("--metrics-file", default=None,
+                        help="дописывать время этапов каждого журнала в указанный JSONL-файл")
+    parser.add_argument("--catalog", default=None,
+                        help="вести каталог классов, журналов и сохранений в указанном файле SQLite (catalog.py) "
+                             "и искать по нему необработанные журналы и последние снимки")
+    parser.add_argument("--mode", choices=["browser", "api"], default="browser",
+                        help="browser - загрузка страниц в Chrome, api - прямые запросы к API после входа")
+    return parser.parse_args()
+
+
 def main():
-    # Загружаем данные из исходного JSON файла
-    json_filename = "classes_data.json"
+    global API_QUIET_WINDOW
+    args = parse_args()
+    
+    # Настройки ожидания загрузки страниц
+    API_QUIET_WINDOW = args.quiet_window
+    page_load_timeout.min_timeout = args.min_timeout
+    page_load_timeout.max_timeout = args.max_timeout
+    
+    # Продолжаем с data.json, если он уже есть: в нем сохранения прошлых запусков,
+    # перенесенные туда при пересборке. Исходный classes_data.json - только для первого запуска
+    json_filename = "data.json" if os.path.exists("data.json") else "classes_data.json"
     data = load_json_data(json_filename)
     
     if not data:
         print("Не удалось загрузить JSON файл")
         return
+    print(f"Данные загружены из {json_filename}")
+    
+    # Восстанавливаем записи, которые не успели попасть в data.json при прошлом запуске
+    restored = replay_progress_log(data, "data.json")
+    if restored:
+        print(f"Восстановлено записей из журнала прогресса: {restored}")
     
     # Загружаем внешний JavaScript код
-    external_script = get_external_script()
+    # При сборе ответов через CDP перехватчик fetch на странице не нужен
+    external_script = get_external_script(include_interceptor=args.api_capture != "cdp")
     if not external_script:
         print("Предупреждение: внешний скрипт не загружен, продолжение без него")
     
     print("Настраиваю драйвер...")
     
     try:
-        driver = setup_driver()
+        driver = setup_driver(capture_network=args.api_capture == "cdp")
     except Exception as e:
         print(f"Не удалось запустить драйвер: {e}")
         return
     
+    catalog = None
+    if args.catalog:
+        # Каталог пересобирается, только если data.json изменился после прошлого запуска
+        catalog = Catalog(args.catalog)
+        if catalog.sync_data(data, "data.json"):
+            print(f"✓ Каталог {args.catalog} собран заново")
+    
+    progress = ProgressLog(data, "data.json", catalog=catalog)
+    ctx = CrawlContext(
+        data, external_script, progress,
+        host_limiter=HostLimiter(args.per_host_limit) if args.per_host_limit else None,
+        store=SnapshotStore() if args.store else None,
+        pause=args.pause,
+        incremental=args.incremental,
+        screenshots=ScreenshotWriter(
+            policy=args.screenshots,
+            sample_rate=args.screenshot_sample_rate,
+            image_format=args.screenshot_format
+        ),
+        headless=args.headless,
+        block_resources=args.block_resources,
+        blocked_urls=args.block_url,
+        capture=args.capture,
+        api_capture=args.api_capture,
+        capture_urls=args.capture_url,
+        max_attempts=args.max_attempts,
+        retry_delay=args.retry_delay,
+        retry_at_end=args.retry_at_end,
+        rate_limiter=TokenBucket(args.rate, args.burst) if args.rate else None,
+        metrics=CrawlMetrics(args.metrics_file),
+        catalog=catalog
+    )
+    
     try:
         # Проверяем, нужна ли авторизация (если есть необработанные журналы)
-        if find_next_journal_to_process(data)[0] is not None:
+        if find_next_journal_to_process(data, ctx.run_date)[0] is not None:
             # Шаг 1: Авторизация на главной странице
             main_url = "https://authedu.mosreg.ru/teacher/study-process/journal/grade/"
             wait_for_manual_authorization(driver, main_url, external_script)
         
         # Шаг 2: Обработка журналов с продолжением
         print("Начинаю обработку журналов...")
-        updated_data = process_journals(driver, data, external_script)
+        if args.mode == "api":
+            updated_data = process_journals_via_api(driver, ctx, workers=args.workers)
+        else:
+            updated_data = process_journals(driver, ctx, workers=args.workers)
         
         print("✓ Все журналы обработаны и сохранены в исходный файл!")
             
     except Exception as e:
         print(f"Произошла ошибка: {e}")
-        # Сохраняем прогресс даже при ошибке
-        try:
-            save_json_data("data.json", data)
-            print(f"✓ Прогресс сохранен в исходный файл")
-        except:
-            print("✗ Не удалось сохранить прогресс")
     
     finally:
+        # Дожидаемся записи скриншотов: после нее в журнал попадают последние записи
+        ctx.screenshots.close()
+        ctx.metrics.close()
+        
+        # Пересобираем data.json из журнала прогресса даже при ошибке
+        try:
+            progress.close()
+            print(f"✓ Прогресс сохранен в исходный файл")
+            # Все записи каталога уже есть в пересобранном data.json
+            if catalog:
+                catalog.mark_synced("data.json")
+        except Exception as e:
+            print(f"✗ Не удалось сохранить прогресс: {e}")
+        if catalog:
+            catalog.close()
+        
         if driver:
             driver.quit()
             print("Драйвер закрыт")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,253 @@
+import array
+
+from chesk import check_final_grade_correctness, check_last_grade_before_final
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Компактная матрица оценок журнала: ученики x уроки.
+# Каждая ячейка - один байт с кодом значения, признак "несколько оценок в ячейке"
+# хранится отдельной битовой маской. Правила проверок считаются сразу по всей
+# матрице (с numpy - векторно, без него - по плоским массивам).
+# Совпадение с функциями анализаторов и с rule_engine.py: python rules_parity.py
+#
+# Строки короче ширины матрицы дополняются кодом PAD - такие ячейки правила
+# не видят, как не видят ячейки за концом grades_details
+
+EMPTY = 0  # пустая ячейка (value None)
+SPECIAL_SEEN = 6  # См
+SPECIAL_ABSENT = 7  # НВ
+OTHER = 8  # любое другое значение
+PAD = 9  # ячейки нет в строке ученика
+
+CODES = {'2': 2, '3': 3, '4': 4, '5': 5, 'См': SPECIAL_SEEN, 'НВ': SPECIAL_ABSENT}
+VALUES = {2: '2', 3: '3', 4: '4', 5: '5'}
+VALID_CODES = (2, 3, 4, 5)
+SPECIAL_CODES = (SPECIAL_SEEN, SPECIAL_ABSENT)
+
+
+def encode_value(value):
+    if value is None:
+        return EMPTY
+    return CODES.get(value, OTHER)
+
+
+def violation_type(has_multiple, has_special):
+    """Тип нарушения для цепочки, как analyze_sequence в check_journal_chain.py"""
+    if has_multiple and has_special:
+        return 'combined'
+    if has_multiple:
+        return 'multiple_grades'
+    if has_special:
+        return 'special_values'
+    return 'simple_sequence'
+
+
+class GradeMatrix:
+    """Матрица кодов оценок (array 'B', по строкам) и битовая маска "несколько оценок" """
+
+    def __init__(self, codes, multiple, rows, width, students=None):
+        self.codes = codes
+        self.multiple = multiple
+        self.rows = rows
+        self.width = width
+        # Данные учеников без оценок по урокам: имя, итоговая и средняя оценка
+        self.students = students or [{} for _ in range(rows)]
+
+    @classmethod
+    def from_students(cls, students):
+        """Матрица по строкам учеников модели журнала (формат extract_grades)"""
+        rows = len(students)
+        width = max((len(student['grades_details']) for student in students), default=0)
+        codes = array.array('B', bytes([PAD]) * (rows * width))
+        multiple = bytearray((rows * width + 7) // 8)
+
+        for row, student in enumerate(students):
+            base = row * width
+            for col, grade_info in enumerate(student['grades_details']):
+                codes[base + col] = encode_value(grade_info['value'])
+                if grade_info['multiple_grades']:
+                    index = base + col
+                    multiple[index >> 3] |= 1 << (index & 7)
+
+        summaries = [
+            {key: student.get(key) for key in ('student_name', 'final_grade', 'average_grade')}
+            for student in students
+        ]
+        return cls(codes, multiple, rows, width, summaries)
+
+    @classmethod
+    def from_model(cls, model):
+        return cls.from_students(model['students'])
+
+    def is_multiple(self, row, col):
+        index = row * self.width + col
+        return bool(self.multiple[index >> 3] >> (index & 7) & 1)
+
+    def row_codes(self, row):
+        return self.codes[row * self.width:(row + 1) * self.width]
+
+    def as_numpy(self):
+        """(коды rows x width, маска "несколько оценок" rows x width) для numpy"""
+        codes = np.frombuffer(self.codes, dtype=np.uint8).reshape(self.rows, self.width)
+        multiple = np.unpackbits(
+            np.frombuffer(bytes(self.multiple), dtype=np.uint8), bitorder='little'
+        )[:self.rows * self.width].reshape(self.rows, self.width).astype(bool)
+        return codes, multiple
+
+    def valid_counts(self):
+        """Количество оценок 2-5 у каждого ученика (См и НВ не считаются)"""
+        if np is not None and self.width:
+            codes, _ = self.as_numpy()
+            return ((codes >= 2) & (codes <= 5)).sum(axis=1).tolist()
+        return [sum(1 for code in self.row_codes(row) if 2 <= code <= 5) for row in range(self.rows)]
+
+    def multiple_in_valid(self):
+        """Есть ли у ученика ячейка с оценкой 2-5 и несколькими оценками"""
+        if np is not None and self.width:
+            codes, multiple = self.as_numpy()
+            return (((codes >= 2) & (codes <= 5)) & multiple).any(axis=1).tolist()
+        return [
+            any(2 <= code <= 5 and self.is_multiple(row, col) for col, code in enumerate(self.row_codes(row)))
+            for row in range(self.rows)
+        ]
+
+    def last_valid_grades(self):
+        """Последняя оценка 2-5 у каждого ученика или None"""
+        if np is not None and self.width:
+            codes, _ = self.as_numpy()
+            valid = (codes >= 2) & (codes <= 5)
+            # Индекс последней валидной ячейки: ищем первую с конца
+            last_col = self.width - 1 - np.argmax(valid[:, ::-1], axis=1)
+            last_codes = codes[np.arange(self.rows), last_col]
+            return [VALUES[int(code)] if has_valid else None
+                    for code, has_valid in zip(last_codes, valid.any(axis=1))]
+
+        result = []
+        for row in range(self.rows):
+            last = None
+            for code in self.row_codes(row):
+                if 2 <= code <= 5:
+                    last = VALUES[code]
+            result.append(last)
+        return result
+
+    def chain_hits(self, grade='2', length=3):
+        """
+        Цепочки из length оценок grade подряд (пустые ячейки пропускаются,
+        после каждой найденной цепочки счет начинается заново).
+        Возвращает список (строка, столбец начала цепочки) в порядке строк
+        """
+        code = CODES[grade]
+        if np is not None and self.width:
+            return self._chain_hits_numpy(code, length)
+
+        hits = []
+        for row in range(self.rows):
+            count = 0
+            start = -1
+            for col, value in enumerate(self.row_codes(row)):
+                if value == code:
+                    if count == 0:
+                        start = col
+                    count += 1
+                    if count >= length:
+                        hits.append((row, start))
+                        count = 0
+                        start = -1
+                elif value == EMPTY or value == PAD:
+                    continue
+                else:
+                    count = 0
+                    start = -1
+        return hits
+
+    def _chain_hits_numpy(self, code, length):
+        codes, _ = self.as_numpy()
+        # Непустые ячейки всех строк подряд, по строкам
+        rows, cols = np.nonzero((codes != EMPTY) & (codes != PAD))
+        if not len(rows):
+            return []
+        is_grade = codes[rows, cols] == code
+
+        # Начало серии: ячейка с нужной оценкой, перед которой в той же строке нет такой же
+        previous_same = np.zeros(len(rows), dtype=bool)
+        previous_same[1:] = is_grade[:-1] & (rows[1:] == rows[:-1])
+        run_start = is_grade & ~previous_same
+        start_index = np.maximum.accumulate(np.where(run_start, np.arange(len(rows)), 0))
+        offset = np.arange(len(rows)) - start_index
+
+        # Каждая length-я ячейка серии завершает цепочку; начало цепочки - на length-1 ячеек раньше
+        ends = np.nonzero(is_grade & (offset % length == length - 1))[0]
+        return list(zip(rows[ends].tolist(), cols[ends - (length - 1)].tolist()))
+
+    def chain_violations(self, grade='2', length=3):
+        """
+        Типы нарушений для каждого ученика, как has_three_consecutive_twos_with_types:
+        для найденной цепочки проверяются length ячеек подряд с ее начала
+        """
+        result = [[] for _ in range(self.rows)]
+        for row, start in self.chain_hits(grade, length):
+            window = range(start, min(start + length, self.width))
+            row_codes = self.row_codes(row)
+            has_multiple = any(self.is_multiple(row, col) for col in window)
+            has_special = any(row_codes[col] in SPECIAL_CODES for col in window)
+            found = violation_type(has_multiple, has_special)
+            if found not in result[row]:
+                result[row].append(found)
+        return result
+
+
+def chain_rule_results(matrix, grade='2', length=3):
+    """Цепочки двоек по всей матрице. Возвращает (типы нарушений, количество) как check_chain_rules"""
+    violations = {}
+    count = 0
+    for student_violations in matrix.chain_violations(grade, length):
+        for found in student_violations:
+            violations[found] = True
+            count += 1
+    return list(violations), count
+
+
+def grade_rule_results(matrix, journal_name, min_grades_required):
+    """
+    Количество оценок, итоговая оценка и последняя оценка перед итоговой
+    по всей матрице. Возвращает (типы нарушений, количество) как check_grade_rules
+    """
+    valid_counts = matrix.valid_counts()
+    multiple_in_valid = matrix.multiple_in_valid()
+    last_grades = matrix.last_valid_grades()
+    violations = {}
+    count = 0
+
+    for row, student in enumerate(matrix.students):
+        final_grade = student.get('final_grade') or ''
+        final_lower = final_grade.lower()
+        if final_grade and final_lower in ['б/о', 'бо']:
+            continue
+
+        has_az = final_lower in ['а/з', 'аз']
+        sufficient = valid_counts[row] >= min_grades_required
+        # Как check_student_grades_count в chesk.py
+        if has_az:
+            found = ['az_with_sufficient_grades' if sufficient else None]
+        elif sufficient:
+            found = [None]
+        else:
+            found = ['possibly_insufficient_grades' if multiple_in_valid[row] else 'insufficient_grades']
+
+        if not has_az:
+            found.append(check_final_grade_correctness(student, journal_name))
+        found.append(check_last_grade_before_final({
+            'final_grade': student.get('final_grade'),
+            'last_grade_before_final': last_grades[row]
+        }))
+
+        for violation in found:
+            if violation:
+                violations[violation] = True
+                count += 1
+
+    return list(violations), count
@@ -1,8 +1,13 @@
 window.apiMonitor = {
     responses: [],
+    pending: 0,
+    lastActivity: Date.now(),
     clear: function() {
         this.responses = [];
     },
+    touch: function() {
+        this.lastActivity = Date.now();
+    },
     getJSON: function() {
         return JSON.stringify(this.responses, null, 2);
     },
@@ -12,6 +17,27 @@ window.apiMonitor = {
         );
     }
 };
+function getRequestHeaders(args) {
+    try {
+        const init = args[1] || {};
+        let headers = init.headers;
+        if (!headers && typeof Request !== 'undefined' && args[0] instanceof Request) {
+            headers = args[0].headers;
+        }
+        if (!headers) {
+            return {};
+        }
+        if (typeof Headers !== 'undefined' && headers instanceof Headers) {
+            return Object.fromEntries(headers.entries());
+        }
+        if (Array.isArray(headers)) {
+            return Object.fromEntries(headers);
+        }
+        return Object.assign({}, headers);
+    } catch (e) {
+        return {};
+    }
+}
 const originalFetch = window.fetch;
 window.fetch = function(...args) {
     const url = args[0];
@@ -29,6 +55,14 @@ window.fetch = function(...args) {
         (fullUrl.includes('/api/') || fullUrl.includes('/graphql'))) {
 
         const requestId = Date.now() + Math.random().toString(36).substr(2, 9);
+        const requestHeaders = getRequestHeaders(args);
+        window.apiMonitor.pending++;
+        window.apiMonitor.touch();
+
+        const finish = () => {
+            window.apiMonitor.pending--;
+            window.apiMonitor.touch();
+        };
 
         return originalFetch.apply(this, args).then(response => {
             return response.clone().json().then(data => {
@@ -39,7 +73,8 @@ window.fetch = function(...args) {
                     timestamp: new Date().toISOString(),
                     response: data,
                     status: response.status,
-                    headers: Object.fromEntries(response.headers.entries())
+                    headers: Object.fromEntries(response.headers.entries()),
+                    request_headers: requestHeaders
                 });
 
                 return response;
@@ -51,11 +86,15 @@ window.fetch = function(...args) {
                     timestamp: new Date().toISOString(),
                     response: text,
                     status: response.status,
-                    headers: Object.fromEntries(response.headers.entries())
+                    headers: Object.fromEntries(response.headers.entries()),
+                    request_headers: requestHeaders
                 });
 
                 return response;
-            }));
+            })).finally(finish);
+        }, error => {
+            finish();
+            throw error;
         });
     }
     return originalFetch.apply(this, args);
@@ -0,0 +1,709 @@
+import argparse
+import json
+import re
+from bs4 import BeautifulSoup
+from chesk import extract_grades
+from progress_log import load_progress_data
+from snapshot_store import read_save_html, read_save_api, open_save_html
+from parse_cache import content_hash
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:
+    etree = None
+
+# Модель журнала для анализаторов: снимок страницы разбирается один раз,
+# дальше все проверки работают со словарями, а не с HTML.
+#
+# Модель журнала:
+#   lessons       - уроки из шапки таблицы по порядку: {'id': ..., 'status': ...}
+#   lesson_count  - количество уникальных уроков
+#   students      - строки учеников в формате extract_grades из chesk.py
+#                   (student_name, grades_details, final_grade, average_grade,
+#                   last_grade_before_final, all_grades). Ячейка grades_details
+#                   хранит номер своего столбца (column): ячейки без оценки и
+#                   итоговая оценка в grades_details не попадают, поэтому урок
+#                   ячейки - lessons[column], а не урок с ее номером в списке
+#                   (см. cell_lesson_id)
+#
+# Разбор возможен тремя способами: bs4 - BeautifulSoup с html.parser (как в
+# анализаторах), lxml - lxml.html с заранее скомпилированными XPath-выражениями,
+# stream - потоковый разбор lxml, который строит только первую таблицу страницы
+# по одной строке и останавливается на ее конце.
+# Все дают одинаковую модель; проверить это на сохраненных снимках можно командой
+#   python journal_model.py --parity
+#
+# Способ api строит модель не из HTML, а из перехваченных ответов API (<ID>_api.json):
+# расписание, оценки, итоговые оценки и пропуски. Он не зависит от классов CSS
+# страницы, но статусов уроков в ответах API нет - отчет statuses по нему пустой.
+# Среднего балла в ответах API тоже нет: он считается по оценкам (api_average) и
+# может отличаться от балла на странице, а с ним и проверки итоговых оценок.
+# Сверить его с разбором HTML: python journal_model.py --api-parity
+
+# Версия разбора: увеличивается при любом изменении модели или извлечения оценок,
+# чтобы кэш разбора (parse_cache.py) не отдавал устаревшие модели
+EXTRACTOR_VERSION = 2
+
+LESSON_CELL_PATTERN = re.compile(r'scheduleLessonCell-\d+-(.+)')
+
+
+def parse_lesson(data_test):
+    """Урок по атрибуту data-test-component ячейки шапки: scheduleLessonCell-<ID>-<статус>"""
+    parts = data_test.split('-')
+    match = LESSON_CELL_PATTERN.search(data_test)
+    return {
+        'id': parts[1] if len(parts) >= 2 else None,
+        'status': match.group(1) if match else None
+    }
+
+
+def count_lessons(lessons):
+    """Количество уникальных уроков (как has_many_lessons в chesk.py)"""
+    return len({lesson['id'] for lesson in lessons if lesson['id'] is not None})
+
+
+def build_journal_model(lessons, students, lesson_count=None):
+    return {
+        'lessons': lessons,
+        'lesson_count': count_lessons(lessons) if lesson_count is None else lesson_count,
+        'students': students
+    }
+
+
+def parse_journal_html(html_content):
+    """
+    Разбирает HTML снимка журнала (BeautifulSoup, html.parser).
+    Возвращает модель журнала или None, если на странице нет таблицы
+    """
+    soup = BeautifulSoup(html_content, 'html.parser')
+    table = soup.find('table')
+    if not table:
+        return None
+
+    is_lesson_cell = lambda x: x and x.startswith('scheduleLessonCell')
+    
+    # Статусы уроков берутся из шапки (как в che.py), количество уроков - по всей таблице
+    thead = table.find('thead')
+    lesson_cells = thead.find_all(attrs={'data-test-component': is_lesson_cell}) if thead else []
+    lessons = [parse_lesson(cell.get('data-test-component', '')) for cell in lesson_cells]
+    all_lessons = [parse_lesson(cell.get('data-test-component', ''))
+                   for cell in table.find_all(attrs={'data-test-component': is_lesson_cell})]
+
+    students = []
+    tbody = table.find('tbody')
+    if tbody:
+        for row in tbody.find_all(recursive=False)[1:]:  # пропускаем первого ребенка
+            students.append(extract_grades(row))
+
+    return build_journal_model(lessons, students, count_lessons(all_lessons))
+
+
+def cell_lesson_id(lessons, cell):
+    """ID урока шапки над ячейкой ученика (по номеру столбца) или None"""
+    column = cell['column']
+    if 0 <= column < len(lessons):
+        return lessons[column]['id']
+    return None
+
+
+def lesson_statuses(model):
+    """Статусы уроков (HOMEWORK, DIGITAL, WARNING, DEFAULT) в порядке шапки, как в che.py"""
+    return [lesson['status'] for lesson in model['lessons'] if lesson['status']]
+
+
+# Классы элементов страницы журнала
+GRADE_CLASS = 'R4p7ZXgwQ59R96TEeVm3'  # значение оценки
+STACK_ICON_CLASS = 'reW5yKeh505HpxGYfGSw'  # иконка стопки (несколько оценок в ячейке)
+AVERAGE_CLASS = 'DSXOGdoSiFGKohRuaDDx'  # средний балл
+
+
+def has_class(class_name):
+    """Условие XPath: у элемента есть класс class_name (как class_= в BeautifulSoup)"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+
+if etree is not None:
+    XPATH_TABLE = etree.XPath('(//table)[1]')
+    XPATH_THEAD = etree.XPath('(.//thead)[1]')
+    XPATH_TBODY = etree.XPath('(.//tbody)[1]')
+    XPATH_LESSON_CELLS = etree.XPath(".//*[starts-with(@data-test-component, 'scheduleLessonCell')]")
+    XPATH_CELLS = etree.XPath('.//td')
+    XPATH_NAME_SPAN = etree.XPath('(.//span[@title])[1]')
+    XPATH_MARK_CELL = etree.XPath("(.//div[contains(@data-test-component, 'markCell')])[1]")
+    XPATH_GRADE_SPAN = etree.XPath(f'(.//span[{has_class(GRADE_CLASS)}])[1]')
+    XPATH_STACK_ICON = etree.XPath(f'(.//div[{has_class(STACK_ICON_CLASS)}])[1]')
+    XPATH_AVERAGE_SPAN = etree.XPath(f'(.//span[{has_class(AVERAGE_CLASS)}])[1]')
+
+
+def first(nodes):
+    return nodes[0] if nodes else None
+
+
+def element_text(element):
+    """Текст элемента как get_text(strip=True) в BeautifulSoup"""
+    return ''.join(text.strip() for text in element.itertext())
+
+
+def extract_grades_lxml(tr_element):
+    """
+    Извлекает оценки из строки таблицы (элемент lxml).
+    Результат совпадает с extract_grades из chesk.py
+    """
+    result = {
+        'all_grades': [],
+        'grades_details': [],
+        'final_grade': None,
+        'average_grade': None,
+        'student_name': None,
+        'last_grade_before_final': None
+    }
+    
+    try:
+        all_td = XPATH_CELLS(tr_element)
+        
+        # Имя ученика из первого td
+        if all_td:
+            name_span = first(XPATH_NAME_SPAN(all_td[0]))
+            if name_span is not None:
+                result['student_name'] = name_span.get('title', '').strip()
+        
+        valid_grades_before_final = []
+        
+        # Все td кроме первого (имя) и последнего (средний балл)
+        for column, td in enumerate(all_td[1:-1]):
+            grade_div = first(XPATH_MARK_CELL(td))
+            if grade_div is None:
+                continue
+            
+            grade_span = first(XPATH_GRADE_SPAN(grade_div))
+            grade_value = element_text(grade_span) if grade_span is not None else ''
+            
+            if 'finalResult' in grade_div.get('data-test-component', ''):
+                if grade_value:
+                    result['final_grade'] = grade_value
+                continue
+            
+            if grade_value:
+                result['all_grades'].append(grade_value)
+                result['grades_details'].append({
+                    'value': grade_value,
+                    'multiple_grades': bool(XPATH_STACK_ICON(grade_div)),
+                    'column': column
+                })
+                if grade_value in ['2', '3', '4', '5']:
+                    valid_grades_before_final.append(grade_value)
+            else:
+                result['all_grades'].append(None)
+                result['grades_details'].append({
+                    'value': None,
+                    'multiple_grades': False,
+                    'column': column
+                })
+        
+        if valid_grades_before_final:
+            result['last_grade_before_final'] = valid_grades_before_final[-1]
+        
+        # Средний балл из последнего td
+        if all_td:
+            avg_span = first(XPATH_AVERAGE_SPAN(all_td[-1]))
+            if avg_span is not None:
+                avg_text = element_text(avg_span).replace(',', '.')
+                try:
+                    result['average_grade'] = float(avg_text)
+                except ValueError:
+                    result['average_grade'] = avg_text
+    
+    except Exception as e:
+        print(f"Ошибка при извлечении оценок: {e}")
+    
+    return result
+
+
+def parse_journal_html_lxml(html_content):
+    """
+    Разбирает HTML снимка журнала через lxml.html.
+    Возвращает модель журнала или None, если на странице нет таблицы
+    """
+    if etree is None:
+        raise ValueError("Для разбора через lxml нужен пакет lxml")
+    if not html_content.strip():
+        return None
+    
+    table = first(XPATH_TABLE(lxml_html.document_fromstring(html_content)))
+    if table is None:
+        return None
+    
+    thead = first(XPATH_THEAD(table))
+    lesson_cells = XPATH_LESSON_CELLS(thead) if thead is not None else []
+    lessons = [parse_lesson(cell.get('data-test-component', '')) for cell in lesson_cells]
+    all_lessons = [parse_lesson(cell.get('data-test-component', '')) for cell in XPATH_LESSON_CELLS(table)]
+    
+    students = []
+    tbody = first(XPATH_TBODY(table))
+    if tbody is not None:
+        # Дочерние элементы tbody без комментариев, первый пропускаем
+        rows = [child for child in tbody if isinstance(child.tag, str)]
+        for row in rows[1:]:
+            students.append(extract_grades_lxml(row))
+    
+    return build_journal_model(lessons, students, count_lessons(all_lessons))
+
+
+# Размер порции текста для потокового разбора
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class TableStreamTarget:
+    """
+    Приемник событий HTMLParser для потокового разбора: все до первой таблицы
+    пропускается, элементы таблицы строятся через TreeBuilder, а каждая строка
+    tbody разбирается сразу после закрытия и удаляется из дерева.
+    Когда таблица закрывается, done становится True и события больше не обрабатываются
+    """
+
+    def __init__(self, on_lesson=None, on_student=None):
+        self.on_lesson = on_lesson
+        self.on_student = on_student
+        self.lessons = []  # уроки из шапки
+        self.all_lessons = []  # уроки из всей таблицы
+        self.students = []
+        self.found = False
+        self.done = False
+        
+        self._builder = None
+        self._depth = 0  # глубина вложенности внутри таблицы
+        self._table_depth = 0  # сколько таблиц открыто (вложенные таблицы)
+        self._thead_depth = None  # глубина первого thead, пока он открыт
+        self._thead_seen = False
+        self._tbody = None
+        self._tbody_depth = None
+        self._rows = 0
+
+    def start(self, tag, attrib):
+        if self.done:
+            return
+        if not self.found:
+            if tag != 'table':
+                return
+            self.found = True
+            self._builder = etree.TreeBuilder()
+        
+        self._depth += 1
+        if tag == 'table':
+            self._table_depth += 1
+        element = self._builder.start(tag, attrib)
+        
+        if tag == 'thead' and not self._thead_seen:
+            self._thead_seen = True
+            self._thead_depth = self._depth
+        elif tag == 'tbody' and self._tbody is None:
+            self._tbody = element
+            self._tbody_depth = self._depth
+        
+        data_test = attrib.get('data-test-component') or ''
+        if data_test.startswith('scheduleLessonCell'):
+            lesson = parse_lesson(data_test)
+            self.all_lessons.append(lesson)
+            if self._thead_depth is not None:
+                self.lessons.append(lesson)
+                if self.on_lesson:
+                    self.on_lesson(lesson)
+
+    def end(self, tag):
+        if self.done or not self.found:
+            return
+        element = self._builder.end(tag)
+        
+        if self._depth == self._thead_depth:
+            self._thead_depth = None
+        elif self._tbody_depth is not None and self._depth == self._tbody_depth + 1:
+            # Закрылась строка tbody: разбираем ее и убираем из дерева
+            if self._rows:
+                student = extract_grades_lxml(element)
+                self.students.append(student)
+                if self.on_student:
+                    self.on_student(student)
+            self._rows += 1
+            self._tbody.remove(element)
+        elif self._depth == self._tbody_depth:
+            self._tbody_depth = None
+        
+        self._depth -= 1
+        if tag == 'table':
+            self._table_depth -= 1
+            if self._table_depth == 0:
+                self.done = True
+
+    def data(self, text):
+        if self.found and not self.done:
+            self._builder.data(text)
+
+    def close(self):
+        return None
+
+
+def parse_journal_stream(chunks, on_lesson=None, on_student=None):
+    """
+    Потоковый разбор снимка журнала из порций текста chunks.
+    Строится только первая таблица, по одной строке за раз; чтение останавливается
+    на конце таблицы. on_lesson/on_student вызываются для каждого урока шапки и
+    каждого ученика по мере разбора.
+    Возвращает модель журнала или None, если таблицы нет
+    """
+    if etree is None:
+        raise ValueError("Для потокового разбора нужен пакет lxml")
+    
+    target = TableStreamTarget(on_lesson, on_student)
+    parser = etree.HTMLParser(target=target)
+    for chunk in chunks:
+        if chunk:
+            parser.feed(chunk)
+        if target.done:
+            break
+    try:
+        parser.close()
+    except etree.XMLSyntaxError:
+        pass
+    
+    if not target.found:
+        return None
+    return build_journal_model(target.lessons, target.students, count_lessons(target.all_lessons))
+
+
+def iter_text_chunks(text, chunk_size=STREAM_CHUNK_SIZE):
+    for start in range(0, len(text), chunk_size):
+        yield text[start:start + chunk_size]
+
+
+def iter_file_chunks(file, chunk_size=STREAM_CHUNK_SIZE):
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def parse_journal_html_stream(html_content):
+    """Потоковый разбор уже прочитанного HTML снимка (см. parse_journal_stream)"""
+    if not html_content.strip():
+        return None
+    return parse_journal_stream(iter_text_chunks(html_content))
+
+
+def parse_save_stream(save):
+    """
+    Потоковый разбор снимка сохранения прямо из файла или хранилища снимков:
+    снимок читается порциями только до конца таблицы.
+    None, если снимка нет или на странице нет таблицы
+    """
+    file = open_save_html(save)
+    if file is None:
+        return None
+    with file:
+        return parse_journal_stream(iter_file_chunks(file))
+
+
+# Эндпоинты API журнала (шаблоны URL как в api_fetcher.py)
+API_SCHEDULE_PATTERN = re.compile(r'^https://authedu\.mosreg\.ru/api/ej/plan/teacher/v1/schedule_items')
+API_MARKS_PATTERN = re.compile(r'^https://authedu\.mosreg\.ru/api/ej/core/teacher/v1/marks')
+API_FINAL_MARKS_PATTERN = re.compile(r'^https://authedu\.mosreg\.ru/api/ej/core/teacher/v1/final_marks')
+API_ATTENDANCES_PATTERN = re.compile(r'^https://authedu\.mosreg\.ru/api/ej/core/teacher/v1/attendances')
+API_STUDENTS_PATTERN = re.compile(r'^https://authedu\.mosreg\.ru/api/ej/core/teacher/v1/student_profiles')
+
+# Имена полей в ответах API: берется первое найденное
+API_FIELDS = {
+    'id': ('id',),
+    'lesson_id': ('schedule_lesson_id', 'schedule_item_id', 'lesson_id'),
+    'student_id': ('student_profile_id', 'student_id'),
+    'value': ('value', 'name', 'grade'),
+    'weight': ('weight',),
+    'date': ('iso_date_time', 'date'),
+}
+ABSENT_VALUE = 'НВ'
+
+
+def api_field(item, name):
+    for key in API_FIELDS[name]:
+        if item.get(key) is not None:
+            return item[key]
+    return None
+
+
+def api_items(records, pattern):
+    """Элементы ответов API, URL которых подходит под pattern (ответ - список или {'items': [...]})"""
+    items = []
+    for record in records:
+        if record.get('status', 200) != 200 or not pattern.match(record.get('url', '')):
+            continue
+        response = record.get('response')
+        if isinstance(response, dict):
+            response = response.get('items') or response.get('data') or []
+        if isinstance(response, list):
+            items.extend(item for item in response if isinstance(item, dict))
+    return items
+
+
+def api_student_name(profile):
+    parts = [profile.get(key) for key in ('last_name', 'first_name', 'middle_name')]
+    if any(parts):
+        return ' '.join(part for part in parts if part)
+    return profile.get('short_name') or profile.get('user_name')
+
+
+def api_average(marks):
+    """Средневзвешенный балл по оценкам 2-5 (вес по умолчанию 1) или None"""
+    total = weights = 0
+    for mark in marks:
+        value = str(api_field(mark, 'value'))
+        if value in ['2', '3', '4', '5']:
+            weight = api_field(mark, 'weight') or 1
+            total += int(value) * weight
+            weights += weight
+    return round(total / weights, 2) if weights else None
+
+
+def parse_journal_api(api_content):
+    """
+    Строит модель журнала по тексту <ID>_api.json (JSON-массив записей window.apiMonitor).
+    Ячейки учеников идут по урокам расписания в порядке времени урока. В ячейке -
+    первая оценка за урок (несколько оценок - multiple_grades), без оценки - "НВ"
+    при пропуске или None. None, если в ответах нет расписания или ни одного ученика
+    """
+    records = json.loads(api_content) if api_content.strip() else []
+    if not isinstance(records, list):
+        return None
+    
+    schedule = {}
+    for item in api_items(records, API_SCHEDULE_PATTERN):
+        lesson_id = api_field(item, 'id')
+        if lesson_id is not None:
+            schedule.setdefault(str(lesson_id), str(api_field(item, 'date') or ''))
+    if not schedule:
+        print("  ✗ В ответах API нет расписания уроков")
+        return None
+    lesson_ids = sorted(schedule, key=lambda lesson_id: schedule[lesson_id])
+    lessons = [{'id': lesson_id, 'status': None} for lesson_id in lesson_ids]
+    
+    # Оценки и пропуски по (ученик, урок)
+    marks = {}
+    student_marks = {}
+    for mark in api_items(records, API_MARKS_PATTERN):
+        student_id = api_field(mark, 'student_id')
+        lesson_id = api_field(mark, 'lesson_id')
+        if student_id is None or api_field(mark, 'value') is None:
+            continue
+        student_marks.setdefault(str(student_id), []).append(mark)
+        if lesson_id is not None:
+            marks.setdefault((str(student_id), str(lesson_id)), []).append(mark)
+    
+    absences = set()
+    for attendance in api_items(records, API_ATTENDANCES_PATTERN):
+        student_id = api_field(attendance, 'student_id')
+        lesson_id = api_field(attendance, 'lesson_id')
+        if student_id is not None and lesson_id is not None:
+            absences.add((str(student_id), str(lesson_id)))
+    
+    final_marks = {}
+    for mark in api_items(records, API_FINAL_MARKS_PATTERN):
+        student_id = api_field(mark, 'student_id')
+        value = api_field(mark, 'value')
+        if student_id is not None and value is not None:
+            final_marks[str(student_id)] = str(value)
+    
+    # Ученики в порядке ответа student_profiles, без него - все, у кого есть оценки
+    profiles = {}
+    for profile in api_items(records, API_STUDENTS_PATTERN):
+        if api_field(profile, 'id') is not None:
+            profiles.setdefault(str(api_field(profile, 'id')), profile)
+    student_ids = list(profiles) or sorted(set(student_marks) | set(final_marks))
+    if not student_ids:
+        print("  ✗ В ответах API нет ни учеников, ни оценок")
+        return None
+    
+    students = []
+    for student_id in student_ids:
+        result = {
+            'all_grades': [],
+            'grades_details': [],
+            'final_grade': final_marks.get(student_id),
+            'average_grade': api_average(student_marks.get(student_id, [])),
+            'student_name': api_student_name(profiles.get(student_id, {})),
+            'last_grade_before_final': None
+        }
+        for column, lesson_id in enumerate(lesson_ids):
+            cell_marks = marks.get((student_id, lesson_id), [])
+            if cell_marks:
+                value = str(api_field(cell_marks[0], 'value'))
+            elif (student_id, lesson_id) in absences:
+                value = ABSENT_VALUE
+            else:
+                value = None
+            result['all_grades'].append(value)
+            result['grades_details'].append({'value': value, 'multiple_grades': len(cell_marks) > 1,
+                                             'column': column})
+            if value in ['2', '3', '4', '5']:
+                result['last_grade_before_final'] = value
+        students.append(result)
+    
+    return build_journal_model(lessons, students)
+
+
+# Способы разбора HTML снимка; api разбирает _api.json сохранения
+HTML_PARSERS = ('bs4', 'lxml', 'stream')
+
+PARSERS = {
+    'bs4': parse_journal_html,
+    'lxml': parse_journal_html_lxml,
+    'stream': parse_journal_html_stream,
+    'api': parse_journal_api,
+}
+
+
+def read_save_source(save, parser='bs4'):
+    """Текст снимка, который разбирает способ parser: _api.json для api, иначе HTML"""
+    return read_save_api(save) if parser == 'api' else read_save_html(save)
+
+
+def source_blob(save, parser='bs4'):
+    """ID снимка в хранилище для способа parser"""
+    return save.get('api_blob') if parser == 'api' else save.get('blob')
+
+
+def get_journal_parser(name='bs4'):
+    """Функция разбора снимка по имени способа: bs4, lxml, stream или api"""
+    if name not in PARSERS:
+        raise ValueError(f"Неизвестный способ разбора: {name}")
+    return PARSERS[name]
+
+
+def find_cached_model(save, parser, cache):
+    """
+    Ищет модель сохранения save в кэше разбора.
+    Возвращает (модель или None, хэш снимка, HTML снимка, если его пришлось прочитать)
+    """
+    # ID снимка в хранилище - уже хэш содержимого: при попадании в кэш снимок даже не читается
+    snapshot_hash = source_blob(save, parser)
+    if snapshot_hash:
+        return cache.get(snapshot_hash, parser), snapshot_hash, None
+    
+    html_content = read_save_source(save, parser)
+    if html_content is None:
+        return None, None, None
+    snapshot_hash = content_hash(html_content)
+    return cache.get(snapshot_hash, parser), snapshot_hash, html_content
+
+
+def load_journal_model(save, parser='bs4', cache=None):
+    """
+    Модель журнала для сохранения save: из кэша разбора (ParseCache) или разбором снимка.
+    None, если снимка нет или на странице нет таблицы
+    """
+    snapshot_hash = html_content = None
+    if cache:
+        model, snapshot_hash, html_content = find_cached_model(save, parser, cache)
+        if model is not None:
+            return model
+    
+    if parser == 'stream' and html_content is None:
+        # Снимок не читался целиком - разбираем его прямо из файла
+        model = parse_save_stream(save)
+        if cache and model is not None and snapshot_hash:
+            cache.put(snapshot_hash, parser, model)
+        return model
+    
+    if html_content is None:
+        html_content = read_save_source(save, parser)
+        if html_content is None:
+            return None
+    
+    model = get_journal_parser(parser)(html_content)
+    if cache and model is not None:
+        cache.put(snapshot_hash or content_hash(html_content), parser, model)
+    return model
+
+
+def check_parity(json_file_path="data.json", limit=None):
+    """
+    Разбирает сохраненные снимки всеми способами и сравнивает модели с разбором BeautifulSoup.
+    Возвращает список (ID журнала, снимок) с расхождениями
+    """
+    data = load_progress_data(json_file_path)
+    checked = 0
+    mismatches = []
+    
+    for class_info in data.get('classes', []):
+        for journal in class_info.get('journals', []):
+            for save in journal.get('save', []):
+                if save.get('error') or (limit is not None and checked >= limit):
+                    continue
+                html_content = read_save_html(save)
+                if html_content is None:
+                    continue
+                
+                checked += 1
+                reference = parse_journal_html(html_content)
+                if any(PARSERS[name](html_content) != reference for name in HTML_PARSERS if name != 'bs4'):
+                    snapshot = save.get('file') or save.get('blob', '')
+                    mismatches.append((journal.get('ID'), snapshot))
+                    print(f"✗ Расхождение: журнал {journal.get('ID')}, снимок {snapshot}")
+    
+    print(f"Проверено снимков: {checked}, расхождений: {len(mismatches)}")
+    return mismatches
+
+
+def grade_summary(model):
+    """Оценки 2-5 по порядку и итоговая оценка каждого ученика - то, что проверяют анализаторы"""
+    return [
+        ([value for value in student['all_grades'] if value in ['2', '3', '4', '5']], student['final_grade'])
+        for student in model['students']
+    ]
+
+
+def check_api_parity(json_file_path="data.json", limit=None):
+    """
+    Сравнивает модели из _api.json с разбором HTML тех же сохранений по оценкам
+    и итоговым оценкам учеников. Возвращает список (ID журнала, снимок) с расхождениями
+    """
+    data = load_progress_data(json_file_path)
+    checked = 0
+    mismatches = []
+    
+    for class_info in data.get('classes', []):
+        for journal in class_info.get('journals', []):
+            for save in journal.get('save', []):
+                if save.get('error') or (limit is not None and checked >= limit):
+                    continue
+                html_content = read_save_html(save)
+                api_content = read_save_api(save)
+                if html_content is None or api_content is None:
+                    continue
+                
+                checked += 1
+                reference = parse_journal_html(html_content)
+                model = parse_journal_api(api_content)
+                if reference is None or model is None or grade_summary(model) != grade_summary(reference):
+                    snapshot = save.get('api_file') or save.get('api_blob', '')
+                    mismatches.append((journal.get('ID'), snapshot))
+                    print(f"✗ Расхождение: журнал {journal.get('ID')}, снимок {snapshot}")
+    
+    print(f"Проверено сохранений: {checked}, расхождений: {len(mismatches)}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Модель журнала по сохраненным снимкам")
+    parser.add_argument("--data", default="data.json", help="файл с данными журналов")
+    parser.add_argument("--parity", action="store_true",
+                        help="сравнить разбор через BeautifulSoup, lxml и потоковый на сохраненных снимках")
+    parser.add_argument("--api-parity", action="store_true",
+                        help="сравнить модели из _api.json с разбором HTML тех же сохранений")
+    parser.add_argument("--limit", type=int, default=None, help="проверить не больше указанного числа снимков")
+    args = parser.parse_args()
+    
+    if args.parity:
+        check_parity(args.data, args.limit)
+    elif args.api_parity:
+        check_api_parity(args.data, args.limit)
+    else:
+        parser.print_help()
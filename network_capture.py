@@ -0,0 +1,171 @@
+import base64
+import json
+import re
+import time
+from datetime import datetime
+
+from api_fetcher import collect_request_headers, strip_credential_headers
+
+# Перехват ответов API на уровне сети через Chrome DevTools Protocol.
+# Драйвер запускается с журналом производительности (goog:loggingPrefs), из
+# которого читаются события домена Network. Тела ответов запрашиваются через
+# Network.getResponseBody только для URL из списка разрешенных и сразу
+# дописываются в _api.json. В отличие от interceptor.js видны и XHR-запросы,
+# а в памяти страницы ничего не накапливается
+
+DEFAULT_URL_ALLOWLIST = [
+    r'^https://authedu\.mosreg\.ru/api/',
+    r'/graphql',
+]
+
+
+def enable_performance_logging(chrome_options):
+    """Включает журнал производительности Chrome, из которого читаются события Network"""
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+
+class ApiRecordWriter:
+    """Потоковая запись JSON-массива записей API (формат window.apiMonitor) в файл"""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.count = 0
+        self._file = open(file_path, 'w', encoding='utf-8')
+        self._file.write("[")
+
+    def write(self, record):
+        if self.count:
+            self._file.write(",")
+        self._file.write("\n")
+        self._file.write(json.dumps(record, indent=2, ensure_ascii=False))
+        self._file.flush()
+        self.count += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.write("\n]")
+            self._file.close()
+
+
+class NetworkCapture:
+    """
+    Сбор ответов API одного драйвера из событий Network домена CDP.
+
+    start() начинает новый журнал, poll() разбирает накопившиеся события и
+    дописывает завершенные ответы, finish() закрывает файл журнала.
+    """
+
+    def __init__(self, driver, url_allowlist=None):
+        self.driver = driver
+        self.url_patterns = [re.compile(pattern) for pattern in (url_allowlist or DEFAULT_URL_ALLOWLIST)]
+        self.writer = None
+        self.records = []
+        # Заголовки запросов (авторизация, профиль) - только в памяти, в файл не пишутся
+        self.request_headers = {}
+        self._requests = {}
+        self.last_activity = time.monotonic()
+
+    def is_allowed(self, url):
+        return any(pattern.search(url) for pattern in self.url_patterns)
+
+    @property
+    def pending(self):
+        """Количество отслеживаемых запросов, ответ на которые еще не получен"""
+        return len(self._requests)
+
+    def is_quiet(self, quiet_window):
+        """Нет незавершенных запросов и новых событий в течение quiet_window секунд"""
+        return not self._requests and time.monotonic() - self.last_activity >= quiet_window
+
+    def drain(self):
+        """Отбрасывает накопившиеся события (например, от предыдущей страницы)"""
+        self.driver.get_log('performance')
+        self._requests = {}
+
+    def start(self, file_path):
+        """Начинает сбор ответов для нового журнала с записью в file_path"""
+        self.drain()
+        self.records = []
+        self.writer = ApiRecordWriter(file_path)
+        self.last_activity = time.monotonic()
+
+    def poll(self):
+        """Разбирает новые события Network и дописывает завершенные ответы"""
+        for entry in self.driver.get_log('performance'):
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            self._handle_event(message.get('method', ''), message.get('params', {}))
+
+    def _handle_event(self, method, params):
+        request_id = params.get('requestId')
+
+        if method == 'Network.requestWillBeSent':
+            request = params.get('request', {})
+            url = request.get('url', '')
+            if request.get('method') == 'OPTIONS' or not self.is_allowed(url):
+                return
+            self._requests[request_id] = {
+                'url': url,
+                'method': request.get('method', 'GET'),
+                'request_headers': request.get('headers', {}),
+                'status': None,
+                'headers': {}
+            }
+            self.last_activity = time.monotonic()
+
+        elif method == 'Network.responseReceived' and request_id in self._requests:
+            response = params.get('response', {})
+            self._requests[request_id]['status'] = response.get('status')
+            self._requests[request_id]['headers'] = response.get('headers', {})
+            self.last_activity = time.monotonic()
+
+        elif method == 'Network.loadingFinished' and request_id in self._requests:
+            request = self._requests.pop(request_id)
+            self._record(request_id, request)
+            self.last_activity = time.monotonic()
+
+        elif method == 'Network.loadingFailed' and request_id in self._requests:
+            self._requests.pop(request_id)
+            self.last_activity = time.monotonic()
+
+    def _record(self, request_id, request):
+        try:
+            body = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+        except Exception:
+            # Тело ответа уже недоступно (например, страница ушла дальше)
+            return
+
+        text = body.get('body', '')
+        if body.get('base64Encoded'):
+            text = base64.b64decode(text).decode('utf-8', errors='replace')
+        try:
+            response = json.loads(text)
+        except ValueError:
+            response = text
+
+        self.request_headers.update(collect_request_headers([request]))
+        record = {
+            'id': request_id,
+            'url': request['url'],
+            'method': request['method'],
+            'timestamp': datetime.now().isoformat(),
+            'response': response,
+            'status': request['status'],
+            'headers': strip_credential_headers(request['headers'])
+        }
+        self.records.append(record)
+        if self.writer:
+            self.writer.write(record)
+
+    def finish(self):
+        """
+        Забирает оставшиеся события и закрывает файл журнала.
+        Возвращает список собранных записей
+        """
+        self.poll()
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+        return self.records
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# Кэш разобранных снимков журналов: модель журнала (journal_model.py) хранится
+# в SQLite под хэшем содержимого снимка, версией разбора и способом разбора.
+# При повторном анализе тех же снимков HTML не разбирается вовсе - это ускоряет
+# работу над правилами проверок. Размер кэша ограничен: при превышении
+# удаляются давно не использованные модели
+
+CACHE_PATH = os.path.join("save", "parse_cache.sqlite")
+
+
+def content_hash(content):
+    """Хэш содержимого снимка в формате ID хранилища снимков (sha256:<hex>)"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return "sha256:" + hashlib.sha256(content).hexdigest()
+
+
+class ParseCache:
+    """Кэш моделей журналов в SQLite с ограничением размера (max_size_mb)"""
+
+    def __init__(self, path=CACHE_PATH, version=1, max_size_mb=200, commit_every=500):
+        self.path = path
+        self.version = version
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.commit_every = commit_every
+        self.hits = 0
+        self.misses = 0
+        self._pending = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS models (
+                content_hash TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                parser TEXT NOT NULL,
+                model TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (content_hash, version, parser)
+            )
+        """)
+        self._connection.execute("CREATE INDEX IF NOT EXISTS models_last_used ON models (last_used)")
+        # Модели старых версий разбора больше не понадобятся
+        self._connection.execute("DELETE FROM models WHERE version != ?", (version,))
+        self._connection.commit()
+
+    def get(self, content_hash, parser):
+        """Модель журнала из кэша или None"""
+        row = self._connection.execute(
+            "SELECT model FROM models WHERE content_hash = ? AND version = ? AND parser = ?",
+            (content_hash, self.version, parser)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._connection.execute(
+            "UPDATE models SET last_used = ? WHERE content_hash = ? AND version = ? AND parser = ?",
+            (time.time(), content_hash, self.version, parser)
+        )
+        self._changed()
+        return json.loads(row[0])
+
+    def put(self, content_hash, parser, model):
+        text = json.dumps(model, ensure_ascii=False, separators=(',', ':'))
+        self._connection.execute(
+            "INSERT OR REPLACE INTO models VALUES (?, ?, ?, ?, ?, ?)",
+            (content_hash, self.version, parser, text, len(text.encode('utf-8')), time.time())
+        )
+        self._changed()
+
+    def _changed(self):
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self._connection.commit()
+            self._pending = 0
+
+    def clear(self):
+        """Удаляет все модели (пересборка кэша)"""
+        self._connection.execute("DELETE FROM models")
+        self._connection.commit()
+
+    def size(self):
+        return self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM models").fetchone()[0]
+
+    def evict(self):
+        """Удаляет давно не использованные модели, пока размер кэша больше max_size. Возвращает число удаленных"""
+        total = self.size()
+        if total <= self.max_size:
+            return 0
+
+        removed = 0
+        rows = self._connection.execute(
+            "SELECT content_hash, version, parser, size FROM models ORDER BY last_used"
+        ).fetchall()
+        for content_hash, version, parser, size in rows:
+            if total <= self.max_size:
+                break
+            self._connection.execute(
+                "DELETE FROM models WHERE content_hash = ? AND version = ? AND parser = ?",
+                (content_hash, version, parser)
+            )
+            total -= size
+            removed += 1
+        self._connection.commit()
+        return removed
+
+    def close(self):
+        self._connection.commit()
+        self.evict()
+        self._connection.close()
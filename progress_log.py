@@ -0,0 +1,227 @@
+import json
+import os
+import threading
+import time
+
+# Журнал прогресса загрузки: записи о сохранениях журналов дописываются в
+# data.progress.jsonl, а data.json периодически атомарно пересобирается из памяти.
+# Актуальное состояние = data.json + хвост журнала прогресса
+
+
+def get_log_path(data_path):
+    """Путь к журналу прогресса для файла данных (data.json -> data.progress.jsonl)"""
+    base, _ = os.path.splitext(data_path)
+    return base + ".progress.jsonl"
+
+
+def index_journals(data):
+    """Словарь ID журнала -> объект журнала из дерева classes/journals"""
+    journals = {}
+    for class_item in data.get("classes", []):
+        for journal in class_item.get("journals", []):
+            journals[journal.get("ID")] = journal
+    return journals
+
+
+def read_log_entries(log_path):
+    """
+    Читает записи журнала прогресса.
+    Оборванная последняя строка (процесс упал во время записи) пропускается
+    """
+    entries = []
+    if not os.path.exists(log_path):
+        return entries
+
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"⚠ Пропущена поврежденная запись журнала прогресса в {log_path}")
+    return entries
+
+
+# Поля записи о сохранении, которые дописываются позже отдельной записью журнала
+DEFERRED_SAVE_FIELDS = ("screenshot",)
+
+
+def same_save(first, second):
+    """Одна и та же запись о сохранении (без учета дописываемых позже полей)"""
+    strip = lambda save: {key: value for key, value in save.items() if key not in DEFERRED_SAVE_FIELDS}
+    return strip(first) == strip(second)
+
+
+def find_logged_save(saves, entry):
+    """
+    Сохранение, к которому относится запись-дополнение: по номеру save_index,
+    а для журналов старого формата (без номера) - последнее сохранение за save_date
+    """
+    index = entry.get("save_index")
+    if index is not None:
+        if 0 <= index < len(saves) and saves[index].get("date") == entry.get("save_date"):
+            return saves[index]
+        return None
+    for save in reversed(saves):
+        if save.get("date") == entry.get("save_date"):
+            return save
+    return None
+
+
+def apply_log_entries(data, entries):
+    """
+    Применяет записи журнала прогресса к данным.
+    Записи, которые уже есть в data.json (упали между пересборкой и очисткой журнала), не дублируются.
+    Запись {"journal_id", "save_index", "save_date", "update"} дописывает поля в сохранение
+    журнала с номером save_index (повторы в одном запуске имеют одну и ту же дату).
+    Возвращает количество примененных записей
+    """
+    journals = index_journals(data)
+    applied = 0
+
+    for entry in entries:
+        journal = journals.get(entry.get("journal_id"))
+        if journal is None:
+            continue
+
+        saves = journal.setdefault("save", [])
+        if "update" in entry:
+            save = find_logged_save(saves, entry)
+            if save is not None:
+                save.update(entry["update"])
+                applied += 1
+        elif not any(same_save(entry["save"], save) for save in saves):
+            saves.append(entry["save"])
+            applied += 1
+    return applied
+
+
+def replay_progress_log(data, data_path="data.json"):
+    """Дописывает в данные хвост журнала прогресса для data_path"""
+    return apply_log_entries(data, read_log_entries(get_log_path(data_path)))
+
+
+def load_progress_data(data_path="data.json"):
+    """Загружает data.json вместе с еще не перенесенным в него хвостом журнала прогресса"""
+    with open(data_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    replay_progress_log(data, data_path)
+    return data
+
+
+def write_json_atomic(filename, data):
+    """Записывает JSON во временный файл и атомарно подменяет им исходный"""
+    directory = os.path.dirname(os.path.abspath(filename))
+    tmp_path = filename + ".tmp"
+
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, filename)
+
+    # Фиксируем переименование на диске (на Windows каталог открыть нельзя)
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class ProgressLog:
+    """
+    Журнал прогресса загрузки журналов.
+
+    append() добавляет запись о сохранении в дерево данных и дописывает одну
+    строку в журнал. fsync выполняется группами: раз в fsync_every записей или
+    раз в fsync_interval секунд. Раз в compact_every записей data.json
+    атомарно пересобирается, а журнал очищается. Если передан каталог
+    (catalog.py), записи о сохранениях дублируются в него.
+    """
+
+    def __init__(self, data, data_path="data.json", fsync_every=10, fsync_interval=5.0,
+                 compact_every=100, catalog=None):
+        self.data = data
+        self.catalog = catalog  # каталог в SQLite (Catalog) или None
+        self.data_path = data_path
+        self.log_path = get_log_path(data_path)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+
+        self.lock = threading.RLock()
+        self._file = open(self.log_path, 'a', encoding='utf-8')
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._since_compact = 0
+
+    def append(self, journal, save_entry):
+        """Добавляет запись о сохранении журнала"""
+        with self.lock:
+            if "save" not in journal:
+                journal["save"] = []
+            journal["save"].append(save_entry)
+            save_index = len(journal["save"]) - 1
+
+            self._write({"journal_id": journal["ID"], "save_index": save_index, "save": save_entry})
+            if self.catalog:
+                self.catalog.add_save(journal, save_index, save_entry)
+
+    def update(self, journal, save_entry, fields):
+        """
+        Дописывает поля (например, путь к скриншоту) в уже добавленную запись о сохранении
+        отдельной записью журнала. Запись о сохранении ищется по объекту, а не по дате:
+        у повторов одного журнала в одном запуске дата совпадает
+        """
+        with self.lock:
+            save_index = next(index for index, save in enumerate(journal["save"]) if save is save_entry)
+            save_entry.update(fields)
+            self._write({"journal_id": journal["ID"], "save_index": save_index,
+                         "save_date": save_entry.get("date"), "update": fields})
+            if self.catalog:
+                self.catalog.add_save(journal, save_index, save_entry)
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        self._since_compact += 1
+
+        if (self._unsynced >= self.fsync_every
+                or time.monotonic() - self._last_sync >= self.fsync_interval):
+            self.sync()
+
+        if self._since_compact >= self.compact_every:
+            self.compact()
+
+    def sync(self):
+        """Сбрасывает накопленные записи журнала на диск"""
+        with self.lock:
+            if self._unsynced:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def compact(self):
+        """Атомарно пересобирает data.json и очищает журнал прогресса"""
+        with self.lock:
+            self.sync()
+            write_json_atomic(self.data_path, self.data)
+
+            # Все записи уже в data.json - начинаем журнал заново
+            self._file.close()
+            self._file = open(self.log_path, 'w', encoding='utf-8')
+            self._since_compact = 0
+
+    def close(self):
+        """Финальная пересборка data.json и закрытие журнала"""
+        with self.lock:
+            if self._file.closed:
+                return
+            self.compact()
+            self._file.close()
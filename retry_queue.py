@@ -0,0 +1,123 @@
+import heapq
+import itertools
+import threading
+import time
+
+# Очередь работы загрузчика с повторами: журналы, которые не удалось загрузить,
+# возвращаются в очередь с экспоненциально растущей задержкой и ограниченным
+# числом попыток
+
+
+class RetryQueue:
+    """
+    Потокобезопасная очередь журналов с повторами.
+
+    get() выдает следующую задачу (ключ, элемент) или None, когда работа закончилась.
+    После обработки задачи нужно вызвать task_done(): при неудаче журнал
+    вернется в очередь через base_delay * 2^(попытка-1) секунд (не больше max_delay),
+    пока не исчерпано max_attempts попыток.
+    interleave=True - наступившие повторы выдаются раньше новых журналов,
+    False - повторы выдаются только после всех новых журналов.
+    """
+
+    def __init__(self, items=(), max_attempts=3, base_delay=30.0, max_delay=600.0, interleave=True):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.interleave = interleave
+
+        self._fresh = list(items)
+        self.keys = {key for key, _ in self._fresh}  # все журналы, попавшие в очередь
+        self._fresh.reverse()  # выдаем с конца списка - в исходном порядке
+        self._retries = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+        self.attempts = {}
+        self.succeeded = set()
+        self.failed = set()
+
+    def get(self):
+        """Следующая задача (ключ, элемент) или None, если работы больше нет"""
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                retry_due = bool(self._retries) and self._retries[0][0] <= now
+
+                if retry_due and (self.interleave or not self._fresh):
+                    _, _, key, item = heapq.heappop(self._retries)
+                    return self._start(key, item)
+
+                if self._fresh:
+                    key, item = self._fresh.pop()
+                    return self._start(key, item)
+
+                if self._retries:
+                    # Ждем наступления ближайшего повтора
+                    self._condition.wait(timeout=self._retries[0][0] - now)
+                elif self._in_flight:
+                    # Задачи в работе могут вернуться в очередь повторов
+                    self._condition.wait()
+                else:
+                    return None
+
+    def pending(self):
+        """Сколько задач ждет выдачи: новые журналы и запланированные повторы"""
+        with self._condition:
+            return len(self._fresh) + len(self._retries)
+
+    def _start(self, key, item):
+        self._in_flight += 1
+        self.attempts[key] = self.attempts.get(key, 0) + 1
+        return key, item
+
+    def task_done(self, key, item, success):
+        """Отмечает завершение задачи; неудачная задача планируется на повтор"""
+        with self._condition:
+            self._in_flight -= 1
+            self._finish(key, item, success)
+            self._condition.notify_all()
+
+    def add_result(self, key, item, success):
+        """Учитывает задачу, выполненную вне очереди (например, первый журнал с подтверждением)"""
+        with self._condition:
+            self.keys.add(key)
+            self.attempts[key] = self.attempts.get(key, 0) + 1
+            self._finish(key, item, success)
+            self._condition.notify_all()
+
+    def _finish(self, key, item, success):
+        if success:
+            self.succeeded.add(key)
+            self.failed.discard(key)
+            return
+
+        attempt = self.attempts.get(key, 1)
+        if attempt >= self.max_attempts:
+            self.failed.add(key)
+            print(f"  ✗ {key}: попытки исчерпаны ({attempt})")
+            return
+
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        heapq.heappush(self._retries, (time.monotonic() + delay, next(self._sequence), key, item))
+        print(f"  ↻ {key}: повтор через {delay:.0f} с (попытка {attempt + 1} из {self.max_attempts})")
+
+    def summary(self):
+        """
+        Итоги работы очереди. pending - журналы без итога: ни разу не выданные
+        (например, драйверы не запустились) или ждущие повтора
+        """
+        with self._condition:
+            total = len(self.keys)
+            retried = sum(1 for attempts in self.attempts.values() if attempts > 1)
+            recovered = sum(1 for key in self.succeeded if self.attempts.get(key, 0) > 1)
+            return {
+                'journals': total,
+                'succeeded': len(self.succeeded),
+                'failed': len(self.failed),
+                'pending': len(self.keys - self.succeeded - self.failed),
+                'retried': retried,
+                'recovered_by_retry': recovered,
+                'success_rate': len(self.succeeded) / total if total else 1.0
+            }
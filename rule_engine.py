@@ -0,0 +1,285 @@
+import copy
+import json
+
+# Декларативные правила проверок журналов. Каждое правило - накопитель состояния
+# по строке ученика: start() заводит состояние, step() получает очередную ячейку,
+# finish() возвращает найденные нарушения. RuleSet проходит строку ученика один
+# раз и кормит ячейками сразу все включенные правила, поэтому новое правило не
+# добавляет еще один проход по оценкам. Пороги (длина цепочки, граница в 15 уроков,
+# таблицы округления итоговой оценки) задаются конфигурацией, а не кодом
+
+DEFAULT_CONFIG = {
+    'chain': {
+        'grade': '2',  # какая оценка образует цепочку
+        'length': 3,  # сколько оценок подряд считается цепочкой
+        'special_values': ['См', 'НВ'],
+    },
+    'grade_count': {
+        'lesson_threshold': 15,  # больше стольких уроков - журнал с большим числом уроков
+        'many_lessons_min': 5,
+        'few_lessons_min': 3,
+    },
+    'final_grade': {
+        'special_subjects': ['изобразительное искусство', 'музыка', 'технология', 'физическая культура'],
+        # Пороги среднего балла по убыванию: [нижняя граница, оценка]; ниже всех - lowest_grade
+        'special_thresholds': [[4.5, '5'], [3.5, '4'], [2.5, '3']],
+        'default_thresholds': [[4.65, '5'], [3.6, '4'], [2.6, '3']],
+        'lowest_grade': '2',
+    },
+    'last_grade': {
+        'grade': '2',  # последняя оценка, недопустимая перед положительной итоговой
+        'final_grades': ['3', '4', '5'],
+    },
+}
+
+VALID_GRADES = ['2', '3', '4', '5']
+EXEMPT_FINAL_GRADES = ['б/о', 'бо']
+CERTIFICATION_FINAL_GRADES = ['а/з', 'аз']
+
+RULES = {}
+
+
+def register_rule(name):
+    """Регистрирует класс правила под именем name"""
+    def decorator(rule_class):
+        rule_class.name = name
+        RULES[name] = rule_class
+        return rule_class
+    return decorator
+
+
+def load_rule_config(file_path=None):
+    """
+    Конфигурация правил: значения по умолчанию, переопределенные из JSON-файла
+    (по разделам, например {"chain": {"length": 4}})
+    """
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    if file_path:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            overrides = json.load(f)
+        for section, values in overrides.items():
+            config.setdefault(section, {}).update(values)
+    return config
+
+
+def final_grade_of(student):
+    final_grade = student.get('final_grade') or ''
+    return final_grade, final_grade.lower()
+
+
+class Rule:
+    """
+    Базовое правило. report - в какой отчет попадают нарушения (chain или grades),
+    per_cell - нужен ли правилу проход по ячейкам
+    """
+    report = None
+    per_cell = True
+
+    def __init__(self, config):
+        self.config = config
+
+    def start(self, student, context):
+        """Состояние правила для ученика; None - правило к ученику не применяется"""
+        return {}
+
+    def step(self, state, index, cell, cells):
+        pass
+
+    def finish(self, state, student, context):
+        """Список нарушений ученика"""
+        return []
+
+
+@register_rule('chain')
+class ChainRule(Rule):
+    """Цепочки из length оценок grade подряд (пустые ячейки пропускаются), как в check_journal_chain.py"""
+    report = 'chain'
+
+    def __init__(self, config):
+        super().__init__(config)
+        settings = config['chain']
+        self.grade = settings['grade']
+        self.length = settings['length']
+        self.special_values = set(settings['special_values'])
+
+    def start(self, student, context):
+        return {'count': 0, 'start': -1, 'types': {}}
+
+    def step(self, state, index, cell, cells):
+        value = cell['value']
+        if value == self.grade:
+            if state['count'] == 0:
+                state['start'] = index
+            state['count'] += 1
+            if state['count'] >= self.length:
+                state['types'][self.sequence_type(cells, state['start'])] = True
+                state['count'] = 0
+                state['start'] = -1
+        elif value is not None:
+            state['count'] = 0
+            state['start'] = -1
+
+    def sequence_type(self, cells, start):
+        """Тип цепочки по length ячейкам с ее начала, как analyze_sequence"""
+        window = cells[start:start + self.length]
+        has_multiple = any(cell['multiple_grades'] for cell in window)
+        has_special = any(cell['value'] in self.special_values for cell in window)
+        if has_multiple and has_special:
+            return 'combined'
+        if has_multiple:
+            return 'multiple_grades'
+        if has_special:
+            return 'special_values'
+        return 'simple_sequence'
+
+    def finish(self, state, student, context):
+        return list(state['types'])
+
+
+class FinalGradeRule(Rule):
+    """Правило отчета grades: не применяется к ученикам с итоговой "б/о" """
+    report = 'grades'
+
+    def start(self, student, context):
+        final_grade, final_lower = final_grade_of(student)
+        if final_grade and final_lower in EXEMPT_FINAL_GRADES:
+            return None
+        return self.start_student(student, context, final_grade, final_lower in CERTIFICATION_FINAL_GRADES)
+
+    def start_student(self, student, context, final_grade, has_az):
+        return {}
+
+
+@register_rule('grade_count')
+class GradeCountRule(FinalGradeRule):
+    """Достаточность оценок (См и НВ не считаются), как check_student_grades_count"""
+
+    def start_student(self, student, context, final_grade, has_az):
+        settings = self.config['grade_count']
+        many_lessons = context['lesson_count'] > settings['lesson_threshold']
+        return {
+            'required': settings['many_lessons_min'] if many_lessons else settings['few_lessons_min'],
+            'has_az': has_az,
+            'valid': 0,
+            'multiple': False
+        }
+
+    def step(self, state, index, cell, cells):
+        if cell['value'] in VALID_GRADES:
+            state['valid'] += 1
+            if cell['multiple_grades']:
+                state['multiple'] = True
+
+    def finish(self, state, student, context):
+        sufficient = state['valid'] >= state['required']
+        if state['has_az']:
+            return ['az_with_sufficient_grades'] if sufficient else []
+        if sufficient:
+            return []
+        return ['possibly_insufficient_grades' if state['multiple'] else 'insufficient_grades']
+
+
+@register_rule('final_grade')
+class FinalGradeCorrectnessRule(FinalGradeRule):
+    """Итоговая оценка по среднему баллу с таблицами округления, как check_final_grade_correctness"""
+    per_cell = False
+
+    def start_student(self, student, context, final_grade, has_az):
+        # "а/з" проверяется правилом количества оценок
+        if not final_grade or has_az:
+            return None
+        return {}
+
+    def expected_grade(self, average_grade, subject_name):
+        settings = self.config['final_grade']
+        subject_lower = subject_name.lower()
+        is_special = any(subject in subject_lower for subject in settings['special_subjects'])
+        thresholds = settings['special_thresholds'] if is_special else settings['default_thresholds']
+        for border, grade in thresholds:
+            if average_grade >= border:
+                return grade
+        return settings['lowest_grade']
+
+    def finish(self, state, student, context):
+        average_grade = student.get('average_grade')
+        if average_grade is None or not isinstance(average_grade, (int, float)) or average_grade == 0.0:
+            return []
+
+        final_grade = student['final_grade']
+        expected_grade = self.expected_grade(average_grade, context['journal_name'])
+        if final_grade != expected_grade:
+            return [f'incorrect_final_grade_{final_grade}_expected_{expected_grade}']
+        return []
+
+
+@register_rule('last_grade')
+class LastGradeBeforeFinalRule(FinalGradeRule):
+    """Последняя оценка перед положительной итоговой, как check_last_grade_before_final"""
+
+    def start_student(self, student, context, final_grade, has_az):
+        if not final_grade or has_az:
+            return None
+        return {'last': None}
+
+    def step(self, state, index, cell, cells):
+        if cell['value'] in VALID_GRADES:
+            state['last'] = cell['value']
+
+    def finish(self, state, student, context):
+        settings = self.config['last_grade']
+        final_grade = student['final_grade']
+        if state['last'] == settings['grade'] and final_grade in settings['final_grades']:
+            return [f'last_grade_{state["last"]}_final_{final_grade}']
+        return []
+
+
+class RuleSet:
+    """
+    Набор включенных правил, проверяющий строку ученика за один проход.
+    names - имена правил из RULES (по умолчанию все в порядке регистрации)
+    """
+
+    def __init__(self, names=None, config=None):
+        self.config = config or load_rule_config()
+        names = list(RULES) if names is None else names
+        unknown = [name for name in names if name not in RULES]
+        if unknown:
+            raise ValueError(f"Неизвестные правила: {', '.join(unknown)}")
+        self.rules = [RULES[name](self.config) for name in names]
+
+    def evaluate_student(self, student, context):
+        """Нарушения одного ученика: список (отчет, тип нарушения)"""
+        active = []
+        for rule in self.rules:
+            state = rule.start(student, context)
+            if state is not None:
+                active.append((rule, state))
+
+        steps = [(rule.step, state) for rule, state in active if rule.per_cell]
+        if steps:
+            cells = student['grades_details']
+            for index, cell in enumerate(cells):
+                for step, state in steps:
+                    step(state, index, cell, cells)
+
+        violations = []
+        for rule, state in active:
+            violations.extend((rule.report, found) for found in rule.finish(state, student, context))
+        return violations
+
+    def evaluate(self, model, journal_name, reports):
+        """
+        Проверяет все строки модели журнала.
+        Возвращает {отчет: (типы нарушений, количество)} для отчетов из reports
+        """
+        context = {'journal_name': journal_name, 'lesson_count': model['lesson_count']}
+        found = {report: {} for report in reports}
+        counts = {report: 0 for report in reports}
+
+        for student in model['students']:
+            for report, violation in self.evaluate_student(student, context):
+                if report in found:
+                    found[report][violation] = True
+                    counts[report] += 1
+
+        return {report: (list(found[report]), counts[report]) for report in reports}
@@ -0,0 +1,139 @@
+import argparse
+import random
+
+import grade_matrix
+from journal_model import PARSERS, load_journal_model
+from progress_log import load_progress_data
+from analysis_engine import LegacyRules, MatrixRules, RULE_REPORTS, iter_journal_saves
+from rule_engine import RuleSet
+
+# Сверка способов проверки оценок: функции анализаторов (legacy), матрица оценок
+# (matrix, grade_matrix.py) и набор правил (compiled, rule_engine.py) должны давать
+# одинаковые типы нарушений и количество по каждому отчету.
+#
+#   python rules_parity.py                    - 3000 случайных журналов
+#   python rules_parity.py --random 4000 --no-numpy
+#   python rules_parity.py --data data.json   - сохраненные снимки журналов
+#
+# Случайные строки учеников содержат то, на чем способы чаще всего расходятся:
+# пустые ячейки внутри цепочек, См/НВ, ячейки с несколькими оценками, строки
+# разной длины, итоговые "а/з" и "б/о", нечисловой средний балл
+
+SAMPLE_VALUES = ['2', '2', '2', '3', '4', '5', None, 'См', 'НВ', 'Н']
+SAMPLE_FINAL_GRADES = ['2', '3', '4', '5', 'а/з', 'Аз', 'б/о', None]
+SAMPLE_AVERAGES = [2.55, 3.4, 4.7, 0.0, 'x', None]
+SAMPLE_JOURNALS = ['Математика', 'Музыка', 'Физическая культура']
+
+
+def random_student(rng, max_cells=12):
+    """Строка ученика в формате extract_grades со случайными оценками"""
+    grades_details = [
+        {'value': rng.choice(SAMPLE_VALUES), 'multiple_grades': rng.random() < 0.2, 'column': column}
+        for column in range(rng.randint(0, max_cells))
+    ]
+    all_grades = [cell['value'] for cell in grades_details]
+    valid = [value for value in all_grades if value in ['2', '3', '4', '5']]
+    return {
+        'all_grades': all_grades,
+        'grades_details': grades_details,
+        'final_grade': rng.choice(SAMPLE_FINAL_GRADES),
+        'average_grade': rng.choice(SAMPLE_AVERAGES),
+        'student_name': f"Ученик {rng.randint(1, 30)}",
+        'last_grade_before_final': valid[-1] if valid else None
+    }
+
+
+def random_model(rng, max_students=6):
+    return {
+        'lessons': [],
+        'lesson_count': rng.choice([10, 15, 16, 20]),
+        'students': [random_student(rng) for _ in range(rng.randint(0, max_students))]
+    }
+
+
+def create_evaluators():
+    """(имя, способ проверки); первый - эталон"""
+    return [('legacy', LegacyRules()), ('matrix', MatrixRules()), ('compiled', RuleSet())]
+
+
+def normalize(result):
+    """Результат evaluate без учета порядка типов нарушений"""
+    return {report: (sorted(types), count) for report, (types, count) in result.items()}
+
+
+def compare_rules(model, journal_name, evaluators):
+    """Имена способов, результат которых отличается от эталона"""
+    reference = None
+    mismatched = []
+    for name, rules in evaluators:
+        result = normalize(rules.evaluate(model, journal_name, RULE_REPORTS))
+        if reference is None:
+            reference = result
+        elif result != reference:
+            mismatched.append(name)
+    return mismatched
+
+
+def check_random(count=3000, seed=0):
+    """Сверка на count случайных журналах. Возвращает количество расхождений"""
+    rng = random.Random(seed)
+    evaluators = create_evaluators()
+    mismatches = 0
+    for index in range(count):
+        model = random_model(rng)
+        journal_name = rng.choice(SAMPLE_JOURNALS)
+        mismatched = compare_rules(model, journal_name, evaluators)
+        if mismatched:
+            mismatches += 1
+            print(f"✗ Расхождение: случайный журнал {index} ({journal_name}), способы: {', '.join(mismatched)}")
+
+    mode = "numpy" if grade_matrix.np is not None else "без numpy"
+    print(f"Проверено случайных журналов: {count} (матрица {mode}), расхождений: {mismatches}")
+    return mismatches
+
+
+def check_saved(json_file_path="data.json", parser="bs4", limit=None):
+    """Сверка на сохраненных снимках журналов. Возвращает количество расхождений"""
+    data = load_progress_data(json_file_path)
+    evaluators = create_evaluators()
+    checked = 0
+    mismatches = 0
+    for _, journal, saves in iter_journal_saves(data):
+        for save in saves:
+            if limit is not None and checked >= limit:
+                break
+            model = load_journal_model(save, parser)
+            if model is None:
+                continue
+
+            checked += 1
+            mismatched = compare_rules(model, journal.get('name', ''), evaluators)
+            if mismatched:
+                mismatches += 1
+                snapshot = save.get('file') or save.get('blob', '')
+                print(f"✗ Расхождение: журнал {journal.get('ID')}, снимок {snapshot}, "
+                      f"способы: {', '.join(mismatched)}")
+
+    print(f"Проверено снимков: {checked}, расхождений: {mismatches}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сверка способов проверки оценок: legacy, matrix и compiled")
+    parser.add_argument("--random", type=int, default=3000, help="сколько случайных журналов проверить")
+    parser.add_argument("--seed", type=int, default=0, help="начальное значение генератора случайных журналов")
+    parser.add_argument("--no-numpy", action="store_true",
+                        help="считать матрицу оценок без numpy (плоскими массивами)")
+    parser.add_argument("--data", default=None,
+                        help="вместо случайных журналов проверить сохраненные снимки из файла данных")
+    parser.add_argument("--parser", choices=sorted(PARSERS), default="bs4", help="способ разбора снимков")
+    parser.add_argument("--limit", type=int, default=None, help="проверить не больше указанного числа снимков")
+    args = parser.parse_args()
+
+    if args.no_numpy:
+        grade_matrix.np = None
+
+    if args.data:
+        check_saved(args.data, args.parser, args.limit)
+    else:
+        check_random(args.random, args.seed)
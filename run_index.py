@@ -0,0 +1,77 @@
+import bisect
+
+from journal_model import cell_lesson_id
+
+# Индекс серий одинаковых оценок (кодирование длинами серий) по строкам учеников.
+# Строка ученика проходится один раз: соседние одинаковые значения сливаются в
+# серию, пустые ячейки (value None) пропускаются и серию не прерывают - как в
+# has_three_consecutive_twos_with_types. Дальше на вопрос "все серии оценки g
+# длиной не меньше N" индекс отвечает без повторного прохода по оценкам и без
+# разбора снимка, для любой оценки и любого N.
+#
+# Серия: {'row', 'student_name', 'grade', 'length', 'start', 'end', 'multiple_grades',
+#         'start_lesson_id', 'end_lesson_id'}
+#   start, end       - номера первой и последней ячейки серии в grades_details
+#   *_lesson_id      - ID уроков шапки над этими ячейками (по номеру столбца ячейки,
+#                      см. cell_lesson_id; None, если урока нет)
+#
+# Проверка цепочек в анализаторах после каждой найденной цепочки начинает счет
+# заново, поэтому серия длины L дает L // N цепочек.
+# Отчет по сериям с диапазонами уроков: python analysis_engine.py --report runs
+
+
+def build_runs(grades_details):
+    """Серии одинаковых значений строки ученика: список [значение, длина, начало, конец, несколько оценок]"""
+    runs = []
+    current = None
+    for index, cell in enumerate(grades_details):
+        value = cell['value']
+        if value is None:
+            continue
+        if current is not None and current[0] == value:
+            current[1] += 1
+            current[3] = index
+            current[4] = current[4] or cell['multiple_grades']
+        else:
+            current = [value, 1, index, index, cell['multiple_grades']]
+            runs.append(current)
+    return runs
+
+
+class RunIndex:
+    """Серии оценок всех учеников журнала, сгруппированные по значению и упорядоченные по длине"""
+
+    def __init__(self, model):
+        self.lessons = model.get('lessons', [])
+        self.students = [student.get('student_name') for student in model['students']]
+        self.cells = [student['grades_details'] for student in model['students']]
+        self.by_grade = {}
+        for row, student in enumerate(model['students']):
+            for value, length, start, end, multiple in build_runs(student['grades_details']):
+                self.by_grade.setdefault(value, []).append((length, row, start, end, multiple))
+
+        # Длины по возрастанию - для поиска серий длиной не меньше N делением пополам
+        self.lengths = {}
+        for value, runs in self.by_grade.items():
+            runs.sort(key=lambda run: (run[0], run[1], run[2]))
+            self.lengths[value] = [run[0] for run in runs]
+
+    def lesson_id(self, row, index):
+        return cell_lesson_id(self.lessons, self.cells[row][index])
+
+    def runs(self, grade='2', min_length=3):
+        """Все серии оценки grade длиной не меньше min_length, по строкам учеников и позициям"""
+        runs = self.by_grade.get(grade, [])
+        first = bisect.bisect_left(self.lengths.get(grade, []), min_length)
+        found = sorted(runs[first:], key=lambda run: (run[1], run[2]))
+        return [{
+            'row': row,
+            'student_name': self.students[row],
+            'grade': grade,
+            'length': length,
+            'start': start,
+            'end': end,
+            'multiple_grades': multiple,
+            'start_lesson_id': self.lesson_id(row, start),
+            'end_lesson_id': self.lesson_id(row, end)
+        } for length, row, start, end, multiple in found]
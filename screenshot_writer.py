@@ -0,0 +1,86 @@
+import io
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Фоновая запись скриншотов: драйвер только снимает PNG в память, а
+# перекодирование и запись на диск идут в отдельном потоке.
+# Без Pillow скриншоты пишутся как есть, в PNG
+
+POLICIES = ("always", "on-error", "never", "sampled")
+
+
+class ScreenshotWriter:
+    """
+    Политика и фоновая запись скриншотов.
+
+    policy: always - каждый журнал, on-error - только если страница не загрузилась,
+    never - никогда, sampled - случайная доля sample_rate журналов (и все ошибки)
+    """
+
+    def __init__(self, policy="always", sample_rate=0.1, image_format="webp", max_width=1280):
+        if policy not in POLICIES:
+            raise ValueError(f"Неизвестная политика скриншотов: {policy}")
+        self.policy = policy
+        self.sample_rate = sample_rate
+        # Без Pillow перекодировать не во что - оставляем PNG
+        self.image_format = image_format if Image else "png"
+        self.max_width = max_width
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="screenshot")
+
+    def should_capture(self, page_loaded):
+        """Нужен ли скриншот для журнала"""
+        if self.policy == "always":
+            return True
+        if self.policy == "never":
+            return False
+        if not page_loaded:
+            return True
+        return self.policy == "sampled" and random.random() < self.sample_rate
+
+    def submit(self, png_data, journal_id, save_dir):
+        """
+        Ставит скриншот в очередь на запись.
+        Возвращает Future с относительным путем к файлу (None при ошибке)
+        """
+        return self._executor.submit(self._write, png_data, journal_id, save_dir)
+
+    def _encode(self, png_data):
+        if not Image:
+            return png_data
+
+        image = Image.open(io.BytesIO(png_data))
+        if self.max_width and image.width > self.max_width:
+            height = round(image.height * self.max_width / image.width)
+            image = image.resize((self.max_width, height), Image.LANCZOS)
+
+        output = io.BytesIO()
+        if self.image_format == "webp":
+            image.save(output, format="WEBP", quality=80, method=4)
+        else:
+            image.save(output, format="PNG", optimize=True)
+        return output.getvalue()
+
+    def _write(self, png_data, journal_id, save_dir):
+        try:
+            filename = f"{journal_id}.{self.image_format}"
+            filepath = os.path.join(save_dir, filename)
+            with open(filepath, 'wb') as f:
+                f.write(self._encode(png_data))
+
+            # Возвращаем относительный путь для JSON
+            relative_path = os.path.join("save", os.path.basename(save_dir), filename)
+            print(f"  ✓ Скриншот сохранен: {filename}")
+            return relative_path
+        except Exception as e:
+            print(f"  ✗ Ошибка при сохранении скриншота {journal_id}: {e}")
+            return None
+
+    def close(self):
+        """Дожидается записи всех скриншотов из очереди"""
+        self._executor.shutdown(wait=True)
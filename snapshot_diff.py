@@ -0,0 +1,215 @@
+import argparse
+import datetime
+
+from progress_log import load_progress_data
+from snapshot_store import parse_save_date
+from journal_model import PARSERS, EXTRACTOR_VERSION, load_journal_model, cell_lesson_id
+from parse_cache import ParseCache, CACHE_PATH
+from analysis_engine import iter_journal_saves, write_report
+
+# Сравнение снимков одного журнала за разные даты. Снимки берутся из кэша разбора
+# (parse_cache.py) - при повторных сравнениях HTML не разбирается. Ячейки снимков
+# сопоставляются по ID урока из шапки (scheduleLessonCell-<ID>-<статус>) и имени
+# ученика, в отчет попадают только изменившиеся ячейки и итоговые оценки.
+# По тем же снимкам строятся ряды по датам для каждого ученика и для журнала.
+#
+# Урок ячейки ученика определяется по номеру ее столбца (cell_lesson_id);
+# ячейки без урока в шапке получают ключ "#<номер столбца>"
+
+VALID_GRADES = ['2', '3', '4', '5']
+
+
+def lesson_key(lessons, cell):
+    lesson_id = cell_lesson_id(lessons, cell)
+    return lesson_id if lesson_id is not None else f"#{cell['column']}"
+
+
+def align_model(model):
+    """
+    Модель журнала по ученикам: {имя ученика: {'cells': {ID урока: значение},
+    'final_grade', 'average_grade'}}. Пустые ячейки не попадают в cells
+    """
+    students = {}
+    for row, student in enumerate(model['students']):
+        name = student.get('student_name') or f"#{row}"
+        if name in students:
+            # Однофамильцы с одинаковым ФИО различаются номером строки
+            name = f"{name} #{row}"
+        cells = {}
+        for cell in student['grades_details']:
+            if cell['value'] is not None:
+                cells[lesson_key(model['lessons'], cell)] = cell['value']
+        students[name] = {
+            'cells': cells,
+            'final_grade': student.get('final_grade'),
+            'average_grade': student.get('average_grade')
+        }
+    return students
+
+
+def diff_snapshots(old, new, date=None):
+    """
+    Изменения между двумя выровненными снимками (align_model).
+    Типы: new_student, removed_student, new_grade, changed_grade, removed_grade,
+    new_final, changed_final, removed_final
+    """
+    changes = []
+
+    def change(change_type, student, lesson_id=None, old_value=None, new_value=None):
+        changes.append({
+            'date': date,
+            'type': change_type,
+            'student_name': student,
+            'lesson_id': lesson_id,
+            'old': old_value,
+            'new': new_value
+        })
+
+    for student, current in new.items():
+        previous = old.get(student)
+        if previous is None:
+            change('new_student', student)
+            previous = {'cells': {}, 'final_grade': None}
+
+        for lesson_id, value in current['cells'].items():
+            old_value = previous['cells'].get(lesson_id)
+            if old_value is None:
+                change('new_grade', student, lesson_id, None, value)
+            elif old_value != value:
+                change('changed_grade', student, lesson_id, old_value, value)
+        for lesson_id, old_value in previous['cells'].items():
+            if lesson_id not in current['cells']:
+                change('removed_grade', student, lesson_id, old_value, None)
+
+        old_final, new_final = previous['final_grade'], current['final_grade']
+        if old_final != new_final:
+            if old_final is None:
+                change('new_final', student, None, None, new_final)
+            elif new_final is None:
+                change('removed_final', student, None, old_final, None)
+            else:
+                change('changed_final', student, None, old_final, new_final)
+
+    for student in old:
+        if student not in new:
+            change('removed_student', student)
+    return changes
+
+
+def student_point(date, student):
+    grades = [value for value in student['cells'].values() if value in VALID_GRADES]
+    return {
+        'date': date,
+        'grades': len(grades),
+        'twos': grades.count('2'),
+        'average_grade': student['average_grade'],
+        'final_grade': student['final_grade']
+    }
+
+
+def journal_point(date, students):
+    grades = [value for student in students.values() for value in student['cells'].values()
+              if value in VALID_GRADES]
+    averages = [student['average_grade'] for student in students.values()
+                if isinstance(student['average_grade'], (int, float)) and student['average_grade']]
+    return {
+        'date': date,
+        'students': len(students),
+        'grades': len(grades),
+        'twos': grades.count('2'),
+        'finals': sum(1 for student in students.values() if student['final_grade']),
+        'average_grade': round(sum(averages) / len(averages), 2) if averages else None
+    }
+
+
+def journal_timeline(saves, parser='bs4', cache=None):
+    """
+    Изменения и ряды по датам для снимков одного журнала.
+    Возвращает {'snapshots', 'changes', 'journal_series', 'student_series'}
+    """
+    dated = sorted(
+        (save for save in saves if parse_save_date(save) is not None),
+        key=parse_save_date
+    )
+    snapshots = []
+    changes = []
+    journal_series = []
+    student_series = {}
+    previous = None
+
+    for save in dated:
+        try:
+            model = load_journal_model(save, parser, cache)
+        except Exception as e:
+            print(f"    ✗ Ошибка при чтении снимка {save.get('blob') or save.get('file')}: {e}")
+            continue
+        if model is None:
+            continue
+        date = save['date']
+        students = align_model(model)
+        snapshots.append(date)
+        if previous is not None:
+            changes.extend(diff_snapshots(previous, students, date))
+        journal_series.append(journal_point(date, students))
+        for name, student in students.items():
+            student_series.setdefault(name, []).append(student_point(date, student))
+        previous = students
+
+    return {
+        'snapshots': snapshots,
+        'changes': changes,
+        'journal_series': journal_series,
+        'student_series': student_series
+    }
+
+
+def diff_journals(json_file_path="data.json", journal_ids=None, parser='bs4', cache=None):
+    """Изменения и ряды по датам для всех журналов (или только journal_ids)"""
+    data = load_progress_data(json_file_path)
+    report = []
+    for class_info, journal, saves in iter_journal_saves(data):
+        journal_id = journal.get('ID', 'Без ID')
+        if journal_ids and journal_id not in journal_ids:
+            continue
+        timeline = journal_timeline(saves, parser, cache)
+        if not timeline['snapshots']:
+            continue
+        report.append(dict({
+            'journal_id': journal_id,
+            'journal_name': f"{class_info.get('name', 'Неизвестный класс')} - {journal.get('name', 'Неизвестный журнал')}"
+        }, **timeline))
+    return report
+
+
+def print_diff_summary(report):
+    for journal in report:
+        counts = {}
+        for change in journal['changes']:
+            counts[change['type']] = counts.get(change['type'], 0) + 1
+        details = ", ".join(f"{change_type} {count}" for change_type, count in counts.items()) or "без изменений"
+        print(f"{journal['journal_name']}: снимков {len(journal['snapshots'])}, {details}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Изменения журналов между снимками за разные даты")
+    parser.add_argument("--data", default="data.json", help="файл с данными журналов")
+    parser.add_argument("--journal", action="append", default=None,
+                        help="ID журнала (можно указать несколько раз, по умолчанию все)")
+    parser.add_argument("--parser", choices=sorted(PARSERS), default="bs4", help="способ разбора снимков")
+    parser.add_argument("--no-cache", action="store_true", help="не использовать кэш разобранных снимков")
+    parser.add_argument("--cache-path", default=CACHE_PATH, help="файл кэша разобранных снимков")
+    parser.add_argument("--output", default=None,
+                        help="файл отчета (по умолчанию snapshot_diff_report_<дата>.json)")
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else ParseCache(args.cache_path, version=EXTRACTOR_VERSION)
+    try:
+        report = diff_journals(args.data, args.journal, args.parser, cache)
+    finally:
+        if cache:
+            cache.close()
+
+    output_file = args.output or f"snapshot_diff_report_{datetime.date.today()}.json"
+    write_report(output_file, report)
+    print_diff_summary(report)
+    print(f"Отчет сохранен в файл: {output_file}")
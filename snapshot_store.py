@@ -0,0 +1,336 @@
+import argparse
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from progress_log import load_progress_data, write_json_atomic, get_log_path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Хранилище снимков журналов: каждый HTML/_api.json хранится один раз под
+# своим SHA-256 в сжатом виде (zstd, если установлен zstandard, иначе gzip).
+# Записи save в data.json ссылаются на снимки по ID вида "sha256:<hex>".
+# Запись "без изменений" (инкрементальный режим) своего снимка не имеет и
+# ссылается на снимок прежнего сохранения ключами same_as_<ключ снимка>
+
+STORE_DIR = os.path.join("save", "blobs")
+
+# (ключ пути к файлу, ключ ID снимка) в записях save
+SNAPSHOT_KEYS = (('file', 'blob'), ('api_file', 'api_blob'))
+SAME_AS_PREFIX = "same_as_"
+
+EXTENSIONS = {
+    'zstd': '.zst',
+    'gzip': '.gz',
+}
+
+
+class SnapshotStore:
+    """Контентно-адресуемое хранилище сжатых снимков"""
+
+    def __init__(self, root=STORE_DIR, compression=None):
+        self.root = root
+        if compression is None:
+            compression = 'zstd' if zstandard else 'gzip'
+        if compression == 'zstd' and not zstandard:
+            raise ValueError("Для сжатия zstd нужен пакет zstandard")
+        self.compression = compression
+
+    def _base_path(self, blob_id):
+        algorithm, digest = blob_id.split(':', 1)
+        if algorithm != 'sha256':
+            raise ValueError(f"Неизвестный тип снимка: {blob_id}")
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _find_path(self, blob_id):
+        """Путь к файлу снимка с любым из поддерживаемых сжатий или None"""
+        base_path = self._base_path(blob_id)
+        for extension in EXTENSIONS.values():
+            if os.path.exists(base_path + extension):
+                return base_path + extension
+        return None
+
+    def exists(self, blob_id):
+        return self._find_path(blob_id) is not None
+
+    def put(self, content):
+        """Сохраняет содержимое (str или bytes) и возвращает ID снимка"""
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+
+        blob_id = "sha256:" + hashlib.sha256(content).hexdigest()
+        if self.exists(blob_id):
+            return blob_id
+
+        if self.compression == 'zstd':
+            compressed = zstandard.ZstdCompressor(level=10).compress(content)
+        else:
+            compressed = gzip.compress(content, compresslevel=6)
+
+        path = self._base_path(blob_id) + EXTENSIONS[self.compression]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Пишем во временный файл, чтобы не оставить оборванный снимок.
+        # Имя временного файла уникально: один снимок могут записывать несколько потоков
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".tmp", delete=False) as f:
+            f.write(compressed)
+        os.replace(f.name, path)
+        return blob_id
+
+    def get(self, blob_id):
+        """Возвращает содержимое снимка в байтах"""
+        path = self._find_path(blob_id)
+        if path is None:
+            raise FileNotFoundError(f"Снимок {blob_id} не найден")
+
+        with open(path, 'rb') as f:
+            compressed = f.read()
+
+        if path.endswith(EXTENSIONS['zstd']):
+            if not zstandard:
+                raise ValueError("Для чтения снимков zstd нужен пакет zstandard")
+            return zstandard.ZstdDecompressor().decompress(compressed)
+        return gzip.decompress(compressed)
+
+    def get_text(self, blob_id):
+        """Возвращает содержимое снимка как строку"""
+        return self.get(blob_id).decode('utf-8')
+
+    def open_text(self, blob_id):
+        """Открывает снимок для последовательного чтения текста без распаковки целиком"""
+        path = self._find_path(blob_id)
+        if path is None:
+            raise FileNotFoundError(f"Снимок {blob_id} не найден")
+
+        if path.endswith(EXTENSIONS['zstd']):
+            if not zstandard:
+                raise ValueError("Для чтения снимков zstd нужен пакет zstandard")
+            reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+            return io.TextIOWrapper(reader, encoding='utf-8')
+        return gzip.open(path, 'rt', encoding='utf-8')
+
+    def iter_blob_ids(self):
+        """Перебирает ID всех снимков хранилища"""
+        if not os.path.isdir(self.root):
+            return
+        for prefix in sorted(os.listdir(self.root)):
+            prefix_dir = os.path.join(self.root, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for filename in sorted(os.listdir(prefix_dir)):
+                digest, extension = os.path.splitext(filename)
+                if extension in EXTENSIONS.values():
+                    yield "sha256:" + digest
+
+    def delete(self, blob_id):
+        path = self._find_path(blob_id)
+        if path:
+            os.remove(path)
+
+
+_default_store = None
+
+
+def get_default_store():
+    """Хранилище по умолчанию (save/blobs)"""
+    global _default_store
+    if _default_store is None:
+        _default_store = SnapshotStore()
+    return _default_store
+
+
+def read_save_html(save, store=None):
+    """
+    Возвращает HTML сохранения журнала: из хранилища по save['blob']
+    или из файла save['file']. Если снимок недоступен - None
+    """
+    return _read_reference(save.get('blob'), save.get('file'), store)
+
+
+def read_save_api(save, store=None):
+    """Возвращает текст _api.json сохранения (save['api_blob'] или save['api_file']) или None"""
+    return _read_reference(save.get('api_blob'), save.get('api_file'), store)
+
+
+def open_save_html(save, store=None):
+    """
+    Открывает HTML сохранения журнала для последовательного чтения
+    (из хранилища или файла). None, если снимок недоступен
+    """
+    blob_id = save.get('blob')
+    if blob_id:
+        store = store or get_default_store()
+        return store.open_text(blob_id) if store.exists(blob_id) else None
+
+    file_path = save.get('file')
+    if file_path and os.path.exists(file_path):
+        return open(file_path, 'r', encoding='utf-8')
+    return None
+
+
+def _read_reference(blob_id, file_path, store):
+    if blob_id:
+        store = store or get_default_store()
+        if store.exists(blob_id):
+            return store.get_text(blob_id)
+        return None
+
+    if file_path and os.path.exists(file_path):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    return None
+
+
+def parse_save_date(save):
+    """Дата сохранения из записи save (формат '%Y-%m-%d %H:%M:%S')"""
+    try:
+        return datetime.strptime(save.get('date', ''), "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+def import_files(data, store):
+    """
+    Переносит HTML и _api.json из save/<дата>/ в хранилище.
+    В записях save путь к файлу заменяется ID снимка, в записях "без изменений"
+    same_as_file/same_as_api_file заменяются на same_as_blob/same_as_api_blob.
+    Возвращает пути перенесенных файлов (сами файлы не удаляются)
+    """
+    imported = []
+    blob_ids = {}  # путь к файлу -> ID снимка
+
+    def import_file(file_path):
+        if file_path not in blob_ids:
+            if not os.path.exists(file_path):
+                return None
+            with open(file_path, 'rb') as f:
+                blob_ids[file_path] = store.put(f.read())
+            imported.append(file_path)
+        return blob_ids[file_path]
+
+    for class_item in data.get("classes", []):
+        for journal in class_item.get("journals", []):
+            for save in journal.get("save", []):
+                for prefix in ("", SAME_AS_PREFIX):
+                    for file_key, blob_key in SNAPSHOT_KEYS:
+                        file_key, blob_key = prefix + file_key, prefix + blob_key
+                        file_path = save.get(file_key)
+                        if not file_path or save.get(blob_key):
+                            continue
+
+                        blob_id = import_file(file_path)
+                        if blob_id:
+                            save[blob_key] = blob_id
+                            del save[file_key]
+    return imported
+
+
+def apply_retention(data, keep_days):
+    """
+    Удаляет записи save старше keep_days дней.
+    Последнее успешное сохранение каждого журнала сохраняется всегда, как и
+    сохранения, на снимки которых ссылаются оставшиеся записи "без изменений"
+    """
+    border = datetime.now() - timedelta(days=keep_days)
+    removed = 0
+
+    for class_item in data.get("classes", []):
+        for journal in class_item.get("journals", []):
+            saves = journal.get("save", [])
+            successful = [save for save in saves if not save.get('error')]
+            latest = successful[-1] if successful else None
+
+            recent = [
+                save for save in saves
+                if save is latest or parse_save_date(save) is None or parse_save_date(save) >= border
+            ]
+            # Снимки, на которые ссылаются оставшиеся записи "без изменений": (ключ, значение)
+            referenced = {
+                (key, save[SAME_AS_PREFIX + key])
+                for save in recent for keys in SNAPSHOT_KEYS for key in keys
+                if save.get(SAME_AS_PREFIX + key)
+            }
+            recent_ids = {id(save) for save in recent}
+            kept = [
+                save for save in saves
+                if id(save) in recent_ids
+                or any((key, save.get(key)) in referenced for keys in SNAPSHOT_KEYS for key in keys)
+            ]
+            removed += len(saves) - len(kept)
+            journal["save"] = kept
+    return removed
+
+
+def collect_referenced_blobs(data):
+    """Множество ID снимков, на которые ссылаются записи save (в том числе через same_as_*)"""
+    referenced = set()
+    for class_item in data.get("classes", []):
+        for journal in class_item.get("journals", []):
+            for save in journal.get("save", []):
+                for key in ('blob', 'api_blob', SAME_AS_PREFIX + 'blob', SAME_AS_PREFIX + 'api_blob'):
+                    if save.get(key):
+                        referenced.add(save[key])
+    return referenced
+
+
+def collect_garbage(data, store):
+    """Удаляет снимки, на которые не ссылается ни одна запись save"""
+    referenced = collect_referenced_blobs(data)
+    removed = 0
+    for blob_id in list(store.iter_blob_ids()):
+        if blob_id not in referenced:
+            store.delete(blob_id)
+            removed += 1
+    return removed
+
+
+def compact(json_file_path="data.json", keep_days=None, import_legacy=False, delete_files=False):
+    """
+    Обслуживание хранилища: перенос старых файлов, удаление старых сохранений
+    и неиспользуемых снимков. Загрузчик в это время запускать нельзя
+    """
+    data = load_progress_data(json_file_path)
+    store = get_default_store()
+
+    imported = []
+    if import_legacy:
+        imported = import_files(data, store)
+        print(f"Перенесено файлов в хранилище: {len(imported)}")
+
+    if keep_days is not None:
+        removed_saves = apply_retention(data, keep_days)
+        print(f"Удалено старых сохранений: {removed_saves}")
+
+    # data.json уже содержит хвост журнала прогресса - журнал очищаем
+    write_json_atomic(json_file_path, data)
+    open(get_log_path(json_file_path), 'w', encoding='utf-8').close()
+
+    # Перенесенные файлы удаляются только после записи data.json со ссылками на снимки
+    if delete_files:
+        for file_path in imported:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    removed_blobs = collect_garbage(data, store)
+    print(f"Удалено неиспользуемых снимков: {removed_blobs}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обслуживание хранилища снимков журналов")
+    parser.add_argument("--data", default="data.json", help="файл с данными журналов")
+    parser.add_argument("--keep-days", type=int, default=None,
+                        help="хранить сохранения не старше указанного числа дней")
+    parser.add_argument("--import-files", action="store_true",
+                        help="перенести HTML и _api.json из save/<дата>/ в хранилище")
+    parser.add_argument("--delete-files", action="store_true",
+                        help="удалить перенесенные файлы")
+    args = parser.parse_args()
+
+    compact(args.data, keep_days=args.keep_days, import_legacy=args.import_files,
+            delete_files=args.delete_files)